@@ -3,19 +3,32 @@ from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional, List
 from pathlib import Path
 import json
+import os
+import threading
+import time
 from datetime import datetime
 
 import logging
 from typing import Dict
 
 from .routers import student, admin, exam  
-from .services.pdf_service import PDFService
+from .services.pdf_service import PDFService, shutdown_extraction_pools
 from .services.vector_store import VectorStore
-from .services.llm_service import LLMService
+from .services.llm_service import get_llm_service
+from .services.answer_cache import ANSWER_CACHE_ENABLED
+from .services.context_packer import pack_context
+from .utils.streaming import STREAM_FORMAT_PATTERN, answer_events, streaming_response
+from .services.embedding_registry import EMBEDDING_STARTUP_BENCHMARK, embedding_registry
+from .services.ingestion_jobs import create_ingestion_queue, index_chunks_folder, upload_dedupe_key
+from .services.chunk_store import ChunkStore
+from .services.reranker import RERANKER_PRELOAD, get_reranker
 
 # Initialize services
 pdf_service = PDFService()
 vector_store = VectorStore()
+ingestion_jobs = create_ingestion_queue(pdf_service, vector_store)
+
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", 256))
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -39,6 +52,32 @@ app.include_router(admin.router, prefix="/admin", tags=["admin"])
 # Include the Exam router with prefix /api/admin/exams
 app.include_router(exam.router, prefix="/api/admin/exams", tags=["exams"])
 
+@app.on_event("startup")
+async def benchmark_encoder_runtimes():
+    """Log encoder latency/throughput per runtime without holding up startup."""
+    if EMBEDDING_STARTUP_BENCHMARK:
+        threading.Thread(
+            target=embedding_registry.benchmark_runtimes,
+            name="encoder-benchmark",
+            daemon=True
+        ).start()
+
+@app.on_event("startup")
+async def preload_reranker():
+    """Load the cross-encoder before the first reranked query needs it."""
+    if RERANKER_PRELOAD:
+        get_reranker().preload()
+
+@app.on_event("shutdown")
+async def stop_pdf_extraction_workers():
+    """Stop the long-lived PDF extraction processes."""
+    shutdown_extraction_pools(wait=False)
+
+@app.on_event("startup")
+async def resume_ingestion_jobs():
+    """Pick up ingestion jobs interrupted by the last shutdown."""
+    ingestion_jobs.resume()
+
 @app.get("/health")
 async def health_check():
     """
@@ -51,7 +90,16 @@ async def chunk_document(
     file: UploadFile = File(...),
     subject: Optional[str] = Form(None),
     grade: Optional[str] = Form(None),
+    background: bool = Form(True),
+    index: bool = Form(False),
+    force: bool = Form(False)
 ):
+    """
+    Chunk an uploaded PDF. By default this returns a job straight away and the
+    work runs in the background (poll /api/admin/jobs/{job_id}); set index to
+    also embed and store the chunks. Uploading the same file with the same
+    options returns the existing job unless force is set.
+    """
     try:
 
         metadata = {
@@ -71,6 +119,21 @@ async def chunk_document(
             content = await file.read()
             buffer.write(content)
 
+        if background:
+            job = ingestion_jobs.submit(
+                "upload",
+                ["extract", "index"] if index else ["extract"],
+                {"file_path": str(upload_path), "filename": file.filename, "subject": subject, "grade": grade},
+                dedupe_key=upload_dedupe_key(content, subject, grade, index),
+                force=force
+            )
+            return {
+                "status": "accepted",
+                "message": f"Processing {file.filename} in the background",
+                "job_id": job["id"],
+                "job": job
+            }
+
 
         #pdf_path = "/mnt/c/CursTest/Production/Books/Biology-Student-Textbook-Grade-9.pdf"
         
@@ -110,14 +173,15 @@ async def get_chunks():
         chunks_dir = Path("/mnt/c/CursTest/Production/Extract")
         all_chunks = []
         
-        # Look for all JSON files containing chunks
-        for json_file in chunks_dir.glob("**/chunks/*.json"):
-            with open(json_file, 'r', encoding='utf-8') as f:
-                chunks_data = json.load(f)
-                # Add source file information
-                for chunk in chunks_data:
-                    chunk['source_file'] = json_file.parent.parent.name
-                all_chunks.extend(chunks_data)
+        # Read every extraction folder's chunk store
+        for folder in chunks_dir.glob("pdf_extraction_*"):
+            if not ChunkStore.exists(folder):
+                continue
+            chunks_data = ChunkStore(folder).read()
+            # Add source file information
+            for chunk in chunks_data:
+                chunk['source_file'] = folder.name
+            all_chunks.extend(chunks_data)
 
         return {
             "status": "success",
@@ -138,7 +202,8 @@ async def get_folders():
                 folders.append({
                     "name": folder.name,
                     "created_at": folder.stat().st_mtime,
-                    "path": str(folder)
+                    "path": str(folder),
+                    "total_chunks": ChunkStore(folder).count() if ChunkStore.exists(folder) else 0
                 })
         
         # Sort folders by creation time, newest first
@@ -163,20 +228,17 @@ async def get_chunks_for_folder(
         if not folder_path.exists():
             raise HTTPException(status_code=404, detail="Folder not found")
             
-        chunks_file = folder_path / "all_chunks.json"
-        if not chunks_file.exists():
+        if not ChunkStore.exists(folder_path):
             raise HTTPException(status_code=404, detail="Chunks file not found")
             
-        with open(chunks_file, 'r', encoding='utf-8') as f:
-            all_chunks = json.load(f)
-            
-        # Calculate pagination
-        total_chunks = len(all_chunks)
+        # Only the requested page is read from disk
+        store = ChunkStore(folder_path)
+        total_chunks = store.count()
         total_pages = (total_chunks + page_size - 1) // page_size
         start_idx = (page - 1) * page_size
         end_idx = start_idx + page_size
         
-        chunks_page = all_chunks[start_idx:end_idx]
+        chunks_page = store.read(start_idx, end_idx)
             
         return {
             "status": "success",
@@ -194,9 +256,26 @@ async def get_chunks_for_folder(
         logger.error(f"Error fetching chunks: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/admin/documents/chunks/{folder_name}/{chunk_index}")
+async def get_chunk(folder_name: str, chunk_index: int):
+    folder_path = Path("/mnt/c/CursTest/Production/Extract") / folder_name
+    if not ChunkStore.exists(folder_path):
+        raise HTTPException(status_code=404, detail="Folder not found")
+
+    chunk = ChunkStore(folder_path).get(chunk_index)
+    if chunk is None:
+        raise HTTPException(status_code=404, detail="Chunk not found")
+    return {"status": "success", "chunk": chunk}
+
 @app.post("/api/admin/documents/index/{folder_name}")
-async def index_document_chunks(folder_name: str):
-    logger.info(f"Received indexing request for folder: {folder_name}")
+async def index_document_chunks(
+    folder_name: str,
+    batch_size: Optional[int] = Query(None, ge=1, le=5000),
+    mode: str = Query("full", pattern="^(full|incremental)$"),
+    background: bool = Query(False),
+    force: bool = Query(False)
+):
+    logger.info(f"Received indexing request for folder: {folder_name} (mode: {mode})")
     try:
         folder_path = Path("/mnt/c/CursTest/Production/Extract") / folder_name
         logger.info(f"Checking folder path: {folder_path}")
@@ -205,79 +284,70 @@ async def index_document_chunks(folder_name: str):
             logger.error(f"Folder not found: {folder_path}")
             raise HTTPException(status_code=404, detail="Folder not found")
             
-        chunks_file = folder_path / "all_chunks.json"
-        logger.info(f"Looking for chunks file: {chunks_file}")
-        
-        if not chunks_file.exists():
-            logger.error(f"Chunks file not found: {chunks_file}")
+        if not ChunkStore.exists(folder_path):
+            logger.error(f"No chunks found in: {folder_path}")
             raise HTTPException(status_code=404, detail="Chunks file not found")
-            
-        with open(chunks_file, 'r', encoding='utf-8') as f:
-            chunks = json.load(f)
-            
-        if not chunks:
-            raise HTTPException(status_code=400, detail="No chunks found in file")
-            
-        # Ensure all chunks have proper metadata
-        for chunk in chunks:
-            if 'metadata' not in chunk:
-                chunk['metadata'] = {}
-            
-            chunk['metadata'] = {
-                'subject': str(chunk.get('metadata', {}).get('subject', 'unknown')),
-                'grade': str(chunk.get('metadata', {}).get('grade', 'unknown')),
-                'chapter_title': str(chunk.get('metadata', {}).get('chapter_title', 'unknown')),
-                'chapter_number': str(chunk.get('metadata', {}).get('chapter_number', '0')),
-                'page_number': str(chunk.get('metadata', {}).get('page_number', '0')),
-                'source': folder_name
-            }
 
-        metadata = {
-            "subject": str(chunks[0]['metadata']['subject']),
-            "grade": str(chunks[0]['metadata']['grade']),
-            "source": str(folder_name)
-        }
-        
-        logger.info(f"Using metadata for vector store: {metadata}")
-
-        # Add chunks to vector store and get embedding IDs
-        embedding_ids = await vector_store.add_documents(chunks, metadata)
-        
-        logger.info(f"Generated embedding IDs: {embedding_ids}")
-
-        # Update chunks with indexing status and embedding IDs
-        for chunk, embedding_id in zip(chunks, embedding_ids):
-            chunk["vector_store_status"] = {
-                "indexed": True,
-                "indexed_at": datetime.now().isoformat(),
-                "embedding_id": embedding_id
+        if background:
+            job = ingestion_jobs.submit(
+                "index",
+                ["index"],
+                {"folder_path": str(folder_path), "mode": mode, "batch_size": batch_size},
+                dedupe_key=f"index:{folder_path}:{mode}",
+                force=force
+            )
+            return {
+                "status": "accepted",
+                "message": f"Indexing {folder_name} in the background",
+                "job_id": job["id"],
+                "job": job
             }
 
-        # Save updated chunks back to file
-        with open(chunks_file, 'w', encoding='utf-8') as f:
-            json.dump(chunks, f, indent=2, ensure_ascii=False)
-            
+        result = await index_chunks_folder(vector_store, folder_path, mode=mode, batch_size=batch_size)
+        logger.info(f"Generated embedding IDs: {result['embedding_ids']}")
+
         return {
             "status": "success",
-            "message": f"Successfully indexed {len(chunks)} chunks",
-            "chunks_indexed": len(chunks),
-            "embedding_ids": embedding_ids
+            "message": f"Successfully indexed {result['chunks_indexed']} chunks",
+            **result
         }
         
     except Exception as e:
         logger.error(f"Error indexing document chunks: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/admin/jobs")
+async def list_ingestion_jobs(limit: int = Query(50, ge=1, le=1000)):
+    """Recent ingestion jobs, newest first."""
+    return {"jobs": ingestion_jobs.list(limit)}
+
+@app.get("/api/admin/jobs/{job_id}")
+async def get_ingestion_job(job_id: str):
+    """Status, per-stage progress and timings of an ingestion job."""
+    job = ingestion_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @app.post("/api/query")
 async def query_documents(
     query: str = Body(...),
     subject: Optional[str] = Body(None),
     grade: Optional[str] = Body(None),
     n_results: int = Body(10),
-    content_types: Optional[List[str]] = Body(None)
+    content_types: Optional[List[str]] = Body(None),
+    hybrid: bool = Body(False),
+    rerank: bool = Body(False),
+    use_cache: bool = Body(True),
+    token_budget: Optional[int] = Body(None, ge=1)
 ):
     """
-    Query the vector database for relevant documents
+    Query the vector database for relevant documents.
+    Set hybrid to fuse keyword (BM25) and semantic results, and rerank to
+    rescore a larger candidate pool with a cross-encoder. Retrieved chunks are
+    deduplicated and packed into token_budget (CONTEXT_TOKEN_BUDGET by default)
+    before generation. Answers to similar questions over the same chunks are
+    served from the answer cache.
     """
     try:
         # Prepare filters based on subject and grade
@@ -296,18 +366,36 @@ async def query_documents(
             query_text=query,
             filters=filters if filters else None,
             n_results=n_results,
-            content_types=content_types           
+            content_types=content_types,
+            hybrid=hybrid,
+            rerank=rerank
         )
 
-        # Initialize LLM service
-        llm_service = LLMService()
-
-        # Generate response using LLM
-        llm_response = await llm_service.generate_response(
-            question=query,
-            contexts=results["documents"]
+        # Drop overlapping text and keep the best chunks within the token budget
+        packed = pack_context(
+            results["documents"],
+            results["metadatas"],
+            results["normalized_scores"],
+            results["chunk_ids"],
+            token_budget=token_budget
         )
 
+        # Reuse the answer to a paraphrase that was given the same chunks
+        llm_service = get_llm_service()
+        cache = vector_store.answer_cache if ANSWER_CACHE_ENABLED and use_cache else None
+        namespace = f"{vector_store.collection.name}:{llm_service.model_name()}"
+        query_embedding = await vector_store.embed_query(query) if cache else None
+        llm_response = cache.get(query_embedding, packed["chunk_ids"], namespace) if cache else None
+
+        if llm_response is None:
+            # Generate response using the shared LLM client
+            llm_response = await llm_service.generate_response(
+                question=query,
+                contexts=packed["contexts"]
+            )
+            if cache:
+                cache.put(query_embedding, packed["chunk_ids"], llm_response, namespace)
+
         return {
             "status": "success",
             "query_results": {
@@ -319,13 +407,151 @@ async def query_documents(
                 "textbook_results": results["textbook_results"],
                 "exam_results": results["exam_results"]
             },
-            "llm_response": llm_response["response"]
+            "llm_response": llm_response["response"],
+            "cached": llm_response.get("cached", False),
+            "context": {key: value for key, value in packed.items() if key != "contexts"}
         }
 
     except Exception as e:
         logger.error(f"Error querying documents: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/query/stream")
+async def query_documents_stream(
+    query: str = Body(...),
+    subject: Optional[str] = Body(None),
+    grade: Optional[str] = Body(None),
+    n_results: int = Body(10),
+    content_types: Optional[List[str]] = Body(None),
+    hybrid: bool = Body(False),
+    rerank: bool = Body(False),
+    use_cache: bool = Body(True),
+    token_budget: Optional[int] = Body(None, ge=1),
+    format: str = Body("sse", pattern=STREAM_FORMAT_PATTERN)
+):
+    """
+    Streaming variant of /api/query: sends the retrieved sources as soon as
+    they are ready, then the answer token by token (Server-Sent Events or NDJSON).
+    """
+    started_at = time.perf_counter()
+    try:
+        filters = {}
+        if subject:
+            filters["subject"] = subject
+        if grade:
+            filters["grade"] = grade
+
+        if not content_types:
+            content_types = ["textbook", "exam_question"]
+
+        results = await vector_store.query(
+            query_text=query,
+            filters=filters if filters else None,
+            n_results=n_results,
+            content_types=content_types,
+            hybrid=hybrid,
+            rerank=rerank
+        )
+
+        packed = pack_context(
+            results["documents"],
+            results["metadatas"],
+            results["normalized_scores"],
+            results["chunk_ids"],
+            token_budget=token_budget
+        )
+
+        llm_service = get_llm_service()
+        cache = vector_store.answer_cache if ANSWER_CACHE_ENABLED and use_cache else None
+        namespace = f"{vector_store.collection.name}:{llm_service.model_name()}"
+        query_embedding = await vector_store.embed_query(query) if cache else None
+        cached = cache.get(query_embedding, packed["chunk_ids"], namespace) if cache else None
+    except Exception as e:
+        logger.error(f"Error querying documents: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    on_complete = None
+    if cached is not None:
+        async def cached_tokens():
+            yield cached["response"]
+        tokens = cached_tokens()
+    else:
+        tokens = llm_service.stream_response(question=query, contexts=packed["contexts"])
+        if cache:
+            def on_complete(answer: str) -> None:
+                cache.put(query_embedding, packed["chunk_ids"], {"response": answer, "model": llm_service.model_name()}, namespace)
+
+    sources = {
+        "query_results": {
+            "documents": results["documents"],
+            "metadatas": results["metadatas"],
+            "distances": results["distances"],
+            "normalized_scores": results["normalized_scores"],
+            "chunk_ids": results["chunk_ids"],
+            "textbook_results": results["textbook_results"],
+            "exam_results": results["exam_results"]
+        },
+        "context": {key: value for key, value in packed.items() if key != "contexts"}
+    }
+    return streaming_response(
+        answer_events(
+            sources,
+            tokens,
+            format,
+            started_at=started_at,
+            on_complete=on_complete,
+            extra={"cached": cached is not None}
+        ),
+        format
+    )
+
+@app.post("/api/query/batch")
+async def query_documents_batch(
+    queries: List[str] = Body(...),
+    subject: Optional[str] = Body(None),
+    grade: Optional[str] = Body(None),
+    n_results: int = Body(10),
+    content_types: Optional[List[str]] = Body(None),
+    hybrid: bool = Body(False),
+    rerank: bool = Body(False)
+):
+    """
+    Retrieve documents for many queries in one call (no LLM answers).
+    Queries are embedded in one batch and searched with a single collection query.
+    """
+    if len(queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    try:
+        filters = {}
+        if subject:
+            filters["subject"] = subject
+        if grade:
+            filters["grade"] = grade
+
+        if not content_types:
+            content_types = ["textbook", "exam_question"]
+
+        results = await vector_store.query_many(
+            query_texts=queries,
+            filters=filters if filters else None,
+            n_results=n_results,
+            content_types=content_types,
+            hybrid=hybrid,
+            rerank=rerank
+        )
+
+        return {
+            "status": "success",
+            "results": [
+                {"query": query, "query_results": result}
+                for query, result in zip(queries, results)
+            ]
+        }
+
+    except Exception as e:
+        logger.error(f"Error running batch query: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/admin/debug/embeddings")
 async def debug_embeddings():
     """Debug endpoint to check embeddings in the vector store"""
@@ -397,6 +623,8 @@ async def update_textbook_type_field():
                     documents=[document],
                     embeddings=[embedding]
                 )
+                vector_store.lexical_index.update_metadata([embedding_id], [metadata])
+                vector_store.answer_cache.invalidate([embedding_id])
                 count += 1
         
         return {
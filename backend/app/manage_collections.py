@@ -1,25 +1,62 @@
 import asyncio
+import json
 from pathlib import Path
 from .services.vector_store import VectorStore
+from .services.vector_quantization import quantization_report
+from .services.partitioned_collection import get_partitioned_collection
+from .services.embedding_registry import embedding_registry
 
-async def main(action: str, collection_name: str = "textbook_content"):
-    vs = VectorStore(collection_name=collection_name)
+async def main(
+    action: str,
+    collection_name: str = "textbook_content",
+    k: int = 10,
+    sample_size: int = 200,
+    path: str = None,
+    batch_size: int = None
+):
+    if action == "benchmark-encoders":
+        # Doesn't need a collection; builds each runtime from one reference model
+        print(json.dumps(embedding_registry.benchmark_runtimes(), indent=2))
+        return
+    if action == "select-encoder-runtime":
+        # Saves the fastest runtime within tolerance for workers running with EMBEDDING_RUNTIME=auto
+        print(json.dumps(embedding_registry.select_runtime(), indent=2))
+        return
+
+    # "partition" reads the existing single collection and writes its partitions
+    vs = VectorStore(collection_name=collection_name, partitioned=False if action == "partition" else None)
     
     if action == "export":
-        output_path = Path(f"chroma_{collection_name}_backup.json")
-        vs.export_collection(output_path)
-        print(f"Exported '{collection_name}' to {output_path}")
+        output_path = Path(path or f"chroma_{collection_name}_backup")
+        manifest = vs.export_collection(output_path)
+        print(f"Exported {manifest['count']} records from '{collection_name}' to {output_path}")
+    elif action == "restore":
+        input_path = Path(path or f"chroma_{collection_name}_backup")
+        restored = await vs.restore_collection(input_path, batch_size=batch_size)
+        print(f"Restored {restored} records into '{collection_name}' from {input_path}")
     elif action == "delete":
         vs.delete_collection()
         print(f"Deleted collection '{collection_name}'")
+    elif action == "partition":
+        partitions = get_partitioned_collection(vs.client, vs.backend, collection_name)
+        copied = partitions.import_from(vs.collection, page_size=batch_size or 1000)
+        print(f"Copied {copied} records from '{collection_name}' into partitions:")
+        print(json.dumps(partitions.stats(), indent=2))
+    elif action == "quantization-report":
+        report = quantization_report(vs.collection, k=k, sample_size=sample_size)
+        print(json.dumps(report, indent=2))
     else:
         raise ValueError(f"Unknown action: {action}")
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Manage ChromaDB collections")
-    parser.add_argument("action", choices=["export", "delete"])
+    parser.add_argument("action", choices=["export", "restore", "delete", "partition", "quantization-report", "benchmark-encoders", "select-encoder-runtime"])
     parser.add_argument("--collection", default="textbook_content")
+    parser.add_argument("--k", type=int, default=10, help="Recall cut-off for quantization-report")
+    parser.add_argument("--sample-size", type=int, default=200, help="Queries sampled for quantization-report")
+    parser.add_argument("--path", help="Backup directory for export/restore (default: chroma_<collection>_backup)")
+    parser.add_argument("--batch-size", type=int, help="Records per write when restoring or partitioning")
     args = parser.parse_args()
     
-    asyncio.run(main(args.action, args.collection)) 
\ No newline at end of file
+    asyncio.run(main(args.action, args.collection, args.k, args.sample_size, args.path, args.batch_size)) 
\ No newline at end of file
@@ -1,4 +1,12 @@
+import asyncio
 from fastapi import APIRouter, HTTPException
+from typing import Optional
+
+from ..services.embedding_registry import embedding_registry
+from ..services.query_cache import query_embedding_cache
+from ..services.answer_cache import answer_cache
+from ..services.embedding_cache import cache_stats, get_embedding_cache
+from ..utils.metrics import metrics
 
 router = APIRouter()
 
@@ -8,3 +16,49 @@ async def admin_health_check():
     Example admin endpoint - you can move your admin logic here.
     """
     return {"status": "Admin route healthy!"}
+
+@router.get("/embedding-models")
+async def get_embedding_models():
+    """
+    Load time and memory footprint of the embedding models loaded in this worker
+    """
+    return {"status": "success", "models": embedding_registry.stats()}
+
+@router.post("/embedding-models/select-runtime")
+async def select_embedding_runtime():
+    """
+    Benchmark the encoder runtimes and save the fastest one within tolerance;
+    workers running with EMBEDDING_RUNTIME=auto serve it after a restart
+    """
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(None, embedding_registry.select_runtime)
+        return {"status": "success", **result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    Counters and latency/size histograms recorded by the services in this worker
+    """
+    return {
+        "status": "success",
+        "metrics": metrics.snapshot(),
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "embedding_cache": cache_stats()
+    }
+
+@router.post("/embedding-cache/compact")
+async def compact_embedding_cache(max_rows: Optional[int] = None):
+    """
+    Drop stale and least recently used rows from the on-disk embedding cache
+    """
+    cache = get_embedding_cache()
+    if cache is None:
+        raise HTTPException(status_code=400, detail="Embedding cache is disabled")
+    try:
+        result = cache.compact(max_rows=max_rows)
+        return {"status": "success", **result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,18 +1,20 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, HTTPException, UploadFile, File, Query
 from typing import Optional, Dict
 from pathlib import Path
+import time
 
 # Import your services here
 from ..services.pdf_service import PDFService
 from ..services.vector_store import VectorStore
-from ..services.llm_service import LLMService
+from ..services.llm_service import get_llm_service
+from ..services.context_packer import pack_context
+from ..utils.streaming import STREAM_FORMAT_PATTERN, answer_events, streaming_response
 
 router = APIRouter()
 
 # Instantiate services as needed
 pdf_service = PDFService()
 vector_store = VectorStore()
-llm_service = LLMService()
 
 @router.post("/upload")
 async def upload_file(
@@ -51,14 +53,16 @@ async def query_document(
     """
     try:
         results = await vector_store.query(query, filters)
-        response = await llm_service.generate_response(
+        packed = pack_context(results["documents"], results["metadatas"], results["normalized_scores"])
+        response = await get_llm_service().generate_response(
             query,
-            results["documents"],
+            packed["contexts"],
             temperature=temperature
         )
 
         return {
             "response": response["response"],
+            "tokens_saved": packed["tokens_saved"],
             "sources": [
                 {"text": doc, "metadata": meta}
                 for doc, meta in zip(results["documents"], results["metadatas"])
@@ -66,3 +70,32 @@ async def query_document(
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/query/stream")
+async def query_document_stream(
+    query: str,
+    temperature: Optional[float] = 0.7,
+    filters: Optional[Dict] = None,
+    format: str = Query("sse", pattern=STREAM_FORMAT_PATTERN)
+):
+    """
+    Streaming variant of /query: sources first, then the answer token by token.
+    """
+    started_at = time.perf_counter()
+    try:
+        results = await vector_store.query(query, filters)
+        packed = pack_context(results["documents"], results["metadatas"], results["normalized_scores"])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    sources = {
+        "sources": [
+            {"text": doc, "metadata": meta}
+            for doc, meta in zip(results["documents"], results["metadatas"])
+        ]
+    }
+    tokens = get_llm_service().stream_response(query, packed["contexts"], temperature=temperature)
+    return streaming_response(
+        answer_events(sources, tokens, format, started_at=started_at, extra={"tokens_saved": packed["tokens_saved"]}),
+        format
+    )
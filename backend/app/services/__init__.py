@@ -1,3 +1,11 @@
-from .vector_store import VectorStore
-
+# VectorStore is imported on first access: importing it loads torch and the
+# encoders, which PDF extraction workers (spawned, so they re-import their
+# module's package) must not pay for.
 __all__ = ['VectorStore']
+
+
+def __getattr__(name):
+    if name == 'VectorStore':
+        from .vector_store import VectorStore
+        return VectorStore
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
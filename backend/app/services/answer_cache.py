@@ -0,0 +1,139 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from ..utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 5000))
+# Minimum cosine similarity between query embeddings for a cached answer to be reused
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95))
+
+BucketKey = Tuple[str, FrozenSet[str]]
+
+
+class SemanticAnswerCache:
+    """
+    LLM answers keyed by query meaning and the context they were generated from.
+
+    An entry is reused when a new question retrieved exactly the same set of
+    chunk IDs (in the same namespace, e.g. collection and model) and its
+    embedding is within the similarity threshold of the cached question, so
+    paraphrases share an answer but a question that pulls different context
+    never does. Entries are evicted least recently used, and dropped as soon
+    as any chunk they were built from is re-indexed or deleted.
+    """
+
+    def __init__(
+        self,
+        max_size: int = ANSWER_CACHE_SIZE,
+        threshold: float = ANSWER_CACHE_SIMILARITY,
+        name: str = "answer_cache"
+    ):
+        self.max_size = max_size
+        self.threshold = threshold
+        self._entries: "OrderedDict[int, Tuple[BucketKey, np.ndarray, Dict]]" = OrderedDict()
+        self._buckets: Dict[BucketKey, List[int]] = {}
+        self._by_chunk: Dict[str, Set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.hits = metrics.counter(f"{name}.hits")
+        self.misses = metrics.counter(f"{name}.misses")
+        self.evictions = metrics.counter(f"{name}.evictions")
+        self.invalidations = metrics.counter(f"{name}.invalidations")
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def get(self, query_embedding, chunk_ids: Iterable[str], namespace: str = "") -> Optional[Dict]:
+        """Return the cached answer for a similar question over the same chunks, if any."""
+        key = (namespace, frozenset(chunk_ids))
+        query = self._unit(query_embedding)
+        with self._lock:
+            best_id, best_similarity = None, self.threshold
+            for entry_id in self._buckets.get(key, ()):
+                similarity = float(np.dot(self._entries[entry_id][1], query))
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+            if best_id is None:
+                self.misses.inc()
+                return None
+            self._entries.move_to_end(best_id)
+            answer = self._entries[best_id][2]
+        self.hits.inc()
+        return {**answer, "cached": True, "similarity": round(best_similarity, 4)}
+
+    def put(self, query_embedding, chunk_ids: Iterable[str], answer: Dict, namespace: str = "") -> None:
+        if self.max_size <= 0:
+            return
+        key = (namespace, frozenset(chunk_ids))
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (key, self._unit(query_embedding), dict(answer))
+            self._buckets.setdefault(key, []).append(entry_id)
+            for chunk_id in key[1]:
+                self._by_chunk.setdefault(chunk_id, set()).add(entry_id)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions.inc()
+
+    def _remove(self, entry_id: int) -> None:
+        key, _, _ = self._entries.pop(entry_id)
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.remove(entry_id)
+            if not bucket:
+                del self._buckets[key]
+        for chunk_id in key[1]:
+            entries = self._by_chunk.get(chunk_id)
+            if entries is not None:
+                entries.discard(entry_id)
+                if not entries:
+                    del self._by_chunk[chunk_id]
+
+    def invalidate(self, chunk_ids: Iterable[str]) -> int:
+        """Drop every answer built from any of chunk_ids; returns how many were dropped."""
+        with self._lock:
+            stale = set()
+            for chunk_id in chunk_ids:
+                stale.update(self._by_chunk.get(chunk_id, ()))
+            for entry_id in stale:
+                self._remove(entry_id)
+        if stale:
+            self.invalidations.inc(len(stale))
+            logger.info(f"Invalidated {len(stale)} cached answers")
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._by_chunk.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits.value + self.misses.value
+        return {
+            "enabled": ANSWER_CACHE_ENABLED,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "hits": self.hits.value,
+            "misses": self.misses.value,
+            "evictions": self.evictions.value,
+            "invalidations": self.invalidations.value,
+            "hit_rate": round(self.hits.value / lookups, 4) if lookups else None
+        }
+
+
+# Shared by every VectorStore in the process so any write invalidates it
+answer_cache = SemanticAnswerCache()
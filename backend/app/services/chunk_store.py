@@ -0,0 +1,198 @@
+import os
+import json
+import struct
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OFFSET_SIZE = 8  # Little-endian uint64 byte offset per chunk
+
+# One lock per store directory; appends and truncation must not interleave
+_locks: Dict[str, threading.RLock] = {}
+_locks_guard = threading.Lock()
+
+# Status maps keyed by status file, with the byte size already read
+_status_cache: Dict[str, Tuple[int, Dict[int, Dict]]] = {}
+
+
+def _lock_for(folder: Path) -> threading.RLock:
+    with _locks_guard:
+        return _locks.setdefault(str(folder.resolve()), threading.RLock())
+
+
+class ChunkStore:
+    """
+    Append-only chunk storage for one extraction folder.
+
+    Chunks are JSON lines in chunks.jsonl. chunks.idx holds the byte offset of
+    each line as a fixed-width integer, so counting is a stat() and reading
+    chunks [start, stop) reads (stop - start + 1) offsets and one contiguous
+    byte range, however large the document. Per-chunk status such as
+    vector_store_status is appended to chunk_status.jsonl ({"index", "status"}
+    lines, later lines win) instead of rewriting the chunks.
+
+    Folders written before the store existed (a pretty-printed all_chunks.json)
+    are converted on first use; all_chunks.json is left in place.
+    """
+
+    CHUNKS_FILE = "chunks.jsonl"
+    INDEX_FILE = "chunks.idx"
+    STATUS_FILE = "chunk_status.jsonl"
+    LEGACY_FILE = "all_chunks.json"
+
+    def __init__(self, folder: Path):
+        self.folder = Path(folder)
+        self.chunks_path = self.folder / self.CHUNKS_FILE
+        self.index_path = self.folder / self.INDEX_FILE
+        self.status_path = self.folder / self.STATUS_FILE
+        self._lock = _lock_for(self.folder)
+        if not self.chunks_path.exists() and (self.folder / self.LEGACY_FILE).exists():
+            self._convert_legacy()
+
+    @classmethod
+    def exists(cls, folder: Path) -> bool:
+        folder = Path(folder)
+        return (folder / cls.CHUNKS_FILE).exists() or (folder / cls.LEGACY_FILE).exists()
+
+    def _convert_legacy(self) -> None:
+        with self._lock:
+            if self.chunks_path.exists():
+                return
+            with open(self.folder / self.LEGACY_FILE, "r", encoding="utf-8") as f:
+                chunks = json.load(f)
+            logger.info(f"Converting {self.folder / self.LEGACY_FILE} ({len(chunks)} chunks) to a chunk store")
+            statuses = {
+                i: chunk.pop("vector_store_status")
+                for i, chunk in enumerate(chunks)
+                if chunk.get("vector_store_status")
+            }
+            self.append(chunks)
+            if statuses:
+                self.set_status(statuses)
+
+    def count(self) -> int:
+        try:
+            return self.index_path.stat().st_size // OFFSET_SIZE
+        except FileNotFoundError:
+            return 0
+
+    def _offsets(self, start: int, stop: int) -> List[int]:
+        """Byte offsets of chunks [start, stop) plus the end of the last one."""
+        with open(self.index_path, "rb") as f:
+            f.seek(start * OFFSET_SIZE)
+            data = f.read((stop - start + 1) * OFFSET_SIZE)
+        offsets = list(struct.unpack(f"<{len(data) // OFFSET_SIZE}Q", data))
+        if len(offsets) == stop - start:
+            # No offset after the last chunk; its line ends at the next newline
+            with open(self.chunks_path, "rb") as f:
+                f.seek(offsets[-1])
+                offsets.append(offsets[-1] + len(f.readline()))
+        return offsets
+
+    def read(self, start: int = 0, stop: Optional[int] = None, with_status: bool = True) -> List[Dict]:
+        """Chunks [start, stop), with their status merged in unless with_status is False."""
+        with self._lock:
+            count = self.count()
+            start = max(0, start)
+            stop = count if stop is None else min(stop, count)
+            if start >= stop:
+                return []
+            offsets = self._offsets(start, stop)
+            with open(self.chunks_path, "rb") as f:
+                f.seek(offsets[0])
+                data = f.read(offsets[-1] - offsets[0])
+
+        base = offsets[0]
+        chunks = [
+            json.loads(data[begin - base:end - base])
+            for begin, end in zip(offsets, offsets[1:])
+        ]
+        if with_status:
+            statuses = self.statuses()
+            for index, chunk in enumerate(chunks, start):
+                if index in statuses:
+                    chunk["vector_store_status"] = statuses[index]
+        return chunks
+
+    def get(self, index: int) -> Optional[Dict]:
+        chunks = self.read(index, index + 1)
+        return chunks[0] if chunks else None
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.read())
+
+    def append(self, chunks: Iterable[Dict]) -> int:
+        """Append chunks and return the index of the first one."""
+        with self._lock:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            first = self.count()
+            # A crash can leave a partial offset or an unindexed line behind; drop them
+            if self.index_path.exists() and self.index_path.stat().st_size != first * OFFSET_SIZE:
+                os.truncate(self.index_path, first * OFFSET_SIZE)
+            end = self._offsets(first - 1, first)[-1] if first else 0
+            if self.chunks_path.exists() and self.chunks_path.stat().st_size != end:
+                os.truncate(self.chunks_path, end)
+
+            offsets = []
+            with open(self.chunks_path, "ab") as f:
+                for chunk in chunks:
+                    offsets.append(f.tell())
+                    f.write(json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.index_path, "ab") as f:
+                f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+            return first
+
+    def truncate(self, count: int = 0) -> None:
+        """Drop every chunk from index count on, and their statuses."""
+        with self._lock:
+            if count >= self.count():
+                return
+            if count == 0:
+                for path in (self.chunks_path, self.index_path, self.status_path):
+                    path.unlink(missing_ok=True)
+            else:
+                end = self._offsets(count, count)[0]
+                os.truncate(self.chunks_path, end)
+                os.truncate(self.index_path, count * OFFSET_SIZE)
+                kept = {i: status for i, status in self.statuses().items() if i < count}
+                self.status_path.unlink(missing_ok=True)
+                if kept:
+                    self.set_status(kept)
+            _status_cache.pop(str(self.status_path), None)
+
+    def set_status(self, statuses: Dict[int, Dict]) -> None:
+        """Record status for chunks by index, e.g. their vector_store_status after indexing."""
+        with self._lock:
+            with open(self.status_path, "a", encoding="utf-8") as f:
+                for index, status in statuses.items():
+                    f.write(json.dumps({"index": index, "status": status}, ensure_ascii=False) + "\n")
+
+    def statuses(self) -> Dict[int, Dict]:
+        """Latest status per chunk index. Only the part of the file appended since the last call is read."""
+        key = str(self.status_path)
+        with self._lock:
+            try:
+                size = self.status_path.stat().st_size
+            except FileNotFoundError:
+                _status_cache.pop(key, None)
+                return {}
+            read_size, statuses = _status_cache.get(key, (0, {}))
+            if size < read_size:
+                read_size, statuses = 0, {}
+            if size > read_size:
+                statuses = dict(statuses)
+                with open(self.status_path, "rb") as f:
+                    f.seek(read_size)
+                    data = f.read(size - read_size)
+                # Leave a line still being written for the next call
+                complete = data[:data.rfind(b"\n") + 1]
+                for line in complete.splitlines():
+                    entry = json.loads(line)
+                    statuses[entry["index"]] = entry["status"]
+                _status_cache[key] = (read_size + len(complete), statuses)
+            return statuses
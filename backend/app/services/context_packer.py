@@ -0,0 +1,117 @@
+import os
+import re
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from ..utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Most prompt tokens spent on retrieved context per answer
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+
+# create_chunks joins paragraphs with blank lines and carries whole paragraphs over as overlap
+PARAGRAPH_SPLIT = re.compile(r"\n\s*\n")
+
+tokens_saved = metrics.counter("context.tokens_saved")
+tokens_packed = metrics.histogram("context.tokens", buckets=(250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 16000))
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """Token count with the chunker's tokenizer; a character estimate if it can't be loaded."""
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                try:
+                    import tiktoken
+
+                    _encoder = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    logger.warning(f"tiktoken unavailable ({e}); estimating tokens from length")
+                    _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text))
+    return max(1, len(text) // 4) if text else 0
+
+
+def _normalize_paragraph(paragraph: str) -> str:
+    return re.sub(r"\s+", " ", paragraph).strip().lower()
+
+
+def pack_context(
+    documents: List[str],
+    metadatas: Optional[List[Dict]] = None,
+    scores: Optional[List[float]] = None,
+    chunk_ids: Optional[List[str]] = None,
+    token_budget: Optional[int] = None
+) -> Dict:
+    """
+    Assemble retrieved chunks into LLM context within a token budget.
+
+    Chunks are taken best score first. Paragraphs already included from an
+    earlier chunk (the overlap create_chunks adds between neighbours, or
+    repeats across pages) are removed. A chunk that no longer fits the budget is
+    skipped in favour of smaller, lower-scored ones. Token counts come from
+    the "tokens" metadata the chunker computed, scaled down when a chunk is
+    trimmed, and are only recomputed for chunks indexed without one.
+    """
+    token_budget = CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    metadatas = metadatas or [{}] * len(documents)
+    order = list(range(len(documents)))
+    if scores:
+        order.sort(key=lambda i: scores[i], reverse=True)
+
+    seen = set()
+    contexts, packed_ids = [], []
+    original_tokens = used_tokens = duplicate_tokens = 0
+    dropped = 0
+
+    for i in order:
+        text = documents[i] or ""
+        stored = (metadatas[i] or {}).get("tokens")
+        tokens = int(stored) if stored else count_tokens(text)
+        original_tokens += tokens
+
+        paragraphs = [p for p in PARAGRAPH_SPLIT.split(text) if p.strip()]
+        kept = []
+        for paragraph in paragraphs:
+            key = _normalize_paragraph(paragraph)
+            if key not in seen:
+                kept.append(paragraph)
+        if not kept:
+            duplicate_tokens += tokens
+            continue
+
+        trimmed = "\n\n".join(kept)
+        if len(kept) < len(paragraphs):
+            trimmed_tokens = max(1, round(tokens * len(trimmed) / max(len(text), 1)))
+            duplicate_tokens += tokens - trimmed_tokens
+            tokens = trimmed_tokens
+
+        if used_tokens + tokens > token_budget:
+            dropped += 1
+            continue
+
+        seen.update(_normalize_paragraph(p) for p in kept)
+        contexts.append(trimmed)
+        packed_ids.append(chunk_ids[i] if chunk_ids else i)
+        used_tokens += tokens
+
+    saved = original_tokens - used_tokens
+    tokens_saved.inc(saved)
+    tokens_packed.observe(used_tokens)
+    return {
+        "contexts": contexts,
+        "chunk_ids": packed_ids,
+        "token_budget": token_budget,
+        "tokens_original": original_tokens,
+        "tokens_used": used_tokens,
+        "tokens_saved": saved,
+        "duplicate_tokens_removed": duplicate_tokens,
+        "chunks_dropped": dropped
+    }
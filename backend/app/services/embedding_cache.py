@@ -0,0 +1,307 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, one process per cache directory
+    fcntl = None
+
+from .embedding_registry import DEFAULT_EMBEDDING_MODEL
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_DIR = Path(
+    os.getenv("EMBEDDING_CACHE_DIR") or Path(__file__).resolve().parent.parent / "data" / "embedding_cache"
+)
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", 500000))
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+
+
+def content_key(model_name: str, normalize: bool, text: str, runtime: str = "torch") -> str:
+    """
+    Content address of an embedding: hash of model name, encoder runtime,
+    normalization flag and text. Runtimes agree only within a tolerance, so
+    vectors from a quantized or ONNX encoder never stand in for torch ones.
+    """
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(f"\x00{runtime}".encode("utf-8"))
+    digest.update(b"\x00normalized\x00" if normalize else b"\x00raw\x00")
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class PersistentEmbeddingCache:
+    """
+    On-disk, content-addressed embedding cache for one model.
+
+    Vectors live in a flat float32 file that is read through a memory map, so
+    lookups only touch the rows they need. An append-only index log maps each
+    content hash to its row. When the cache grows past max_rows it is compacted:
+    stale and least recently used rows are dropped and both files rewritten.
+
+    Several worker processes may share a cache directory. Appends and
+    compaction hold an exclusive flock on the lock file and lookups a shared
+    one; each process picks up index lines the others appended (or a compacted
+    index) before it reads or writes.
+
+    Files in cache_dir:
+        meta.json    - model name and vector dimension
+        vectors.f32  - row-major float32 vectors
+        index.log    - "<hash>\\t<row>" lines; later lines win
+        lock         - flock target, empty
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        model_name: str = DEFAULT_EMBEDDING_MODEL,
+        max_rows: int = EMBEDDING_CACHE_MAX_ROWS
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.model_name = model_name
+        self.max_rows = max_rows
+
+        self.meta_path = self.cache_dir / "meta.json"
+        self.vectors_path = self.cache_dir / "vectors.f32"
+        self.index_path = self.cache_dir / "index.log"
+        self.lock_path = self.cache_dir / "lock"
+
+        self._lock = threading.RLock()
+        self._rows: Dict[str, int] = {}
+        self._last_used: Dict[str, float] = {}
+        self._dim: Optional[int] = None
+        self._n_rows = 0
+        self._mmap: Optional[np.memmap] = None
+        # Inode and byte offset of index.log read so far
+        self._index_inode: Optional[int] = None
+        self._index_offset = 0
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        """Hold the thread lock and, where supported, a flock shared with other processes."""
+        with self._lock:
+            if exclusive:
+                # Created on first write, so opening the cache leaves no trace on disk
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+            elif not self.cache_dir.exists():
+                yield  # Nothing written yet, nothing to read
+                return
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load(self) -> None:
+        with self._file_lock(exclusive=False):
+            self._refresh()
+        logger.info(f"Embedding cache {self.cache_dir}: {len(self._rows)} entries, {self._n_rows} rows")
+
+    def _refresh(self) -> None:
+        """Catch up with rows other processes appended or compacted. Call with the file lock held."""
+        if self._dim is None and self.meta_path.exists():
+            with open(self.meta_path, "r") as f:
+                meta = json.load(f)
+            if meta.get("model_name") != self.model_name:
+                raise ValueError(
+                    f"Embedding cache at {self.cache_dir} belongs to {meta.get('model_name')}, not {self.model_name}"
+                )
+            self._dim = meta["dim"]
+
+        n_rows = self.vectors_path.stat().st_size // (self._dim * 4) if self._dim and self.vectors_path.exists() else 0
+        if n_rows != self._n_rows:
+            self._n_rows = n_rows
+            self._mmap = None
+
+        try:
+            index_stat = self.index_path.stat()
+        except FileNotFoundError:
+            self._rows, self._index_inode, self._index_offset = {}, None, 0
+            return
+        if index_stat.st_ino != self._index_inode or index_stat.st_size < self._index_offset:
+            # Compacted (replaced) since we last read it: start over
+            self._rows, self._index_inode, self._index_offset = {}, index_stat.st_ino, 0
+            self._mmap = None
+        if index_stat.st_size == self._index_offset:
+            return
+
+        with open(self.index_path, "rb") as f:
+            f.seek(self._index_offset)
+            data = f.read(index_stat.st_size - self._index_offset)
+        # Leave a line still being written (or torn by a crash) for the next call
+        complete = data[:data.rfind(b"\n") + 1]
+        self._index_offset += len(complete)
+        for line in complete.decode("utf-8", errors="ignore").splitlines():
+            parts = line.split("\t")
+            if len(parts) != 2 or not parts[1].isdigit():
+                continue
+            row = int(parts[1])
+            # Ignore rows whose vector never made it to disk
+            if row < self._n_rows:
+                self._rows[parts[0]] = row
+        self._last_used = {key: used for key, used in self._last_used.items() if key in self._rows}
+
+    def _vectors(self) -> Optional[np.memmap]:
+        if self._mmap is None and self._n_rows > 0:
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._n_rows, self._dim))
+        return self._mmap
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Return the cached vectors for the keys that are present."""
+        found = {}
+        with self._file_lock(exclusive=False):
+            self._refresh()
+            vectors = self._vectors()
+            now = time.time()
+            for key in keys:
+                row = self._rows.get(key)
+                if row is None:
+                    self.misses += 1
+                    continue
+                found[key] = np.array(vectors[row])
+                self._last_used[key] = now
+                self.hits += 1
+        return found
+
+    def put_many(self, entries: Dict[str, np.ndarray]) -> None:
+        """Append vectors for new keys and record them in the index."""
+        if not entries:
+            return
+
+        with self._file_lock(exclusive=True):
+            self._refresh()
+            new_keys = [key for key in entries if key not in self._rows]
+            if not new_keys:
+                return
+
+            block = np.stack([np.asarray(entries[key], dtype=np.float32) for key in new_keys])
+            if self._dim is None:
+                self._dim = int(block.shape[1])
+                with open(self.meta_path, "w") as f:
+                    json.dump({"model_name": self.model_name, "dim": self._dim}, f)
+            elif block.shape[1] != self._dim:
+                raise ValueError(f"Expected {self._dim}-dimensional vectors, got {block.shape[1]}")
+
+            # A crash can leave a partial vector or index line behind; appending after them would misalign rows
+            if self.vectors_path.exists() and self.vectors_path.stat().st_size != self._n_rows * self._dim * 4:
+                os.truncate(self.vectors_path, self._n_rows * self._dim * 4)
+            if self.index_path.exists() and self.index_path.stat().st_size != self._index_offset:
+                os.truncate(self.index_path, self._index_offset)
+            # Vectors first, then the index, so the index never points past the data
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(block).tobytes())
+            first_row = self._n_rows
+            with open(self.index_path, "a") as f:
+                for offset, key in enumerate(new_keys):
+                    f.write(f"{key}\t{first_row + offset}\n")
+                f.flush()
+                self._index_offset = f.tell()
+                self._index_inode = os.fstat(f.fileno()).st_ino
+
+            now = time.time()
+            for offset, key in enumerate(new_keys):
+                self._rows[key] = first_row + offset
+                self._last_used[key] = now
+            self._n_rows += len(new_keys)
+            self._mmap = None
+
+            if self.max_rows and self._n_rows > self.max_rows:
+                self._compact()
+
+    def compact(self, max_rows: Optional[int] = None) -> Dict:
+        """
+        Rewrite the cache keeping only live rows, dropping the least recently
+        used entries beyond max_rows (defaults to 90% of the cap to leave headroom).
+        """
+        with self._file_lock(exclusive=True):
+            self._refresh()
+            return self._compact(max_rows)
+
+    def _compact(self, max_rows: Optional[int] = None) -> Dict:
+        """compact() with the exclusive file lock already held."""
+        limit = max_rows if max_rows is not None else int(self.max_rows * 0.9)
+        before = self._n_rows
+
+        keys = sorted(self._rows, key=lambda k: (self._last_used.get(k, 0.0), self._rows[k]), reverse=True)
+        if limit:
+            keys = keys[:limit]
+        keys.sort(key=lambda k: self._rows[k])  # Preserve on-disk order for sequential reads
+
+        vectors = self._vectors()
+        tmp_vectors = self.vectors_path.with_suffix(".f32.tmp")
+        tmp_index = self.index_path.with_suffix(".log.tmp")
+        with open(tmp_vectors, "wb") as vf, open(tmp_index, "w") as xf:
+            for new_row, key in enumerate(keys):
+                vf.write(np.ascontiguousarray(vectors[self._rows[key]]).tobytes())
+                xf.write(f"{key}\t{new_row}\n")
+
+        self._mmap = None
+        if vectors is not None:
+            del vectors
+        os.replace(tmp_vectors, self.vectors_path)
+        os.replace(tmp_index, self.index_path)
+        index_stat = self.index_path.stat()
+        self._index_inode, self._index_offset = index_stat.st_ino, index_stat.st_size
+
+        self._rows = {key: row for row, key in enumerate(keys)}
+        self._last_used = {key: self._last_used[key] for key in keys if key in self._last_used}
+        self._n_rows = len(keys)
+
+        logger.info(f"Compacted embedding cache {self.cache_dir}: {before} -> {self._n_rows} rows")
+        return {"rows_before": before, "rows_after": self._n_rows}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model_name": self.model_name,
+                "path": str(self.cache_dir),
+                "entries": len(self._rows),
+                "rows_on_disk": self._n_rows,
+                "max_rows": self.max_rows,
+                "disk_bytes": self._n_rows * (self._dim or 0) * 4,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None
+            }
+
+
+_caches: Dict[str, PersistentEmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: Optional[str] = None) -> Optional[PersistentEmbeddingCache]:
+    """Return the shared on-disk cache for a model, or None when caching is disabled."""
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    model_name = model_name or DEFAULT_EMBEDDING_MODEL
+    with _caches_lock:
+        cache = _caches.get(model_name)
+        if cache is None:
+            slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+            cache = PersistentEmbeddingCache(EMBEDDING_CACHE_DIR / slug, model_name=model_name)
+            _caches[model_name] = cache
+        return cache
+
+
+def cache_stats() -> List[Dict]:
+    with _caches_lock:
+        return [cache.stats() for cache in _caches.values()]
@@ -0,0 +1,249 @@
+import os
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sentence_transformers import SentenceTransformer
+
+from .encoder_runtimes import (
+    EMBEDDING_RUNTIME,
+    EMBEDDING_RUNTIMES,
+    OnnxSentenceEncoder,
+    benchmark,
+    build_runtime,
+    consistency_check,
+    load_runtime_choices,
+    save_runtime_choice
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-large-en-v1.5")
+# Off by default: the benchmark builds every runtime variant and competes with traffic for CPU.
+# Prefer `python -m app.manage_collections select-encoder-runtime`, which also saves the choice.
+EMBEDDING_STARTUP_BENCHMARK = os.getenv("EMBEDDING_STARTUP_BENCHMARK", "false").lower() == "true"
+EMBEDDING_BENCHMARK_RUNTIMES = [
+    r.strip() for r in os.getenv("EMBEDDING_BENCHMARK_RUNTIMES", ",".join(EMBEDDING_RUNTIMES)).split(",") if r.strip()
+]
+
+
+class EmbeddingModelRegistry:
+    """
+    Process-wide registry of sentence encoders.
+
+    Models are loaded lazily on first use and shared by every caller that asks
+    for the same model name, runtime and settings, so a worker holds a single
+    copy of each model no matter how many VectorStore instances it creates.
+
+    Runtimes other than torch are derived from the torch model and must agree
+    with it within EMBEDDING_RUNTIME_TOLERANCE; otherwise the registry logs an
+    error and serves the torch model. With runtime "auto" each model is served
+    by the runtime select_runtime saved for it, or torch if none was saved.
+    """
+
+    def __init__(self, runtime: str = EMBEDDING_RUNTIME):
+        self.runtime = runtime
+        self._models: Dict[Tuple, SentenceTransformer] = {}
+        self._stats: Dict[Tuple, Dict] = {}
+        self._choices: Optional[Dict[str, Dict]] = None
+        self._lock = threading.Lock()
+        self._load_locks: Dict[Tuple, threading.Lock] = {}
+
+    def default_runtime(self, model_name: str) -> str:
+        """Runtime used when a caller does not ask for one."""
+        if self.runtime != "auto":
+            return self.runtime
+        with self._lock:
+            if self._choices is None:
+                self._choices = load_runtime_choices()
+            choice = self._choices.get(model_name)
+        return choice["runtime"] if choice else "torch"
+
+    def _make_key(self, model_name: str, runtime: Optional[str], settings: Dict) -> Tuple:
+        return (model_name, runtime or self.default_runtime(model_name), tuple(sorted(settings.items())))
+
+    def get(self, model_name: str = DEFAULT_EMBEDDING_MODEL, runtime: Optional[str] = None, **settings) -> SentenceTransformer:
+        """Return the shared encoder for model_name/runtime/settings, loading it on first use."""
+        key = self._make_key(model_name, runtime, settings)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        # One lock per key so loading one model doesn't block lookups of another
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            model = self._models.get(key)
+            if model is None:
+                model = self._load(key, model_name, key[1], settings)
+        return model
+
+    def _load(self, key: Tuple, model_name: str, runtime: str, settings: Dict) -> SentenceTransformer:
+        logger.info(f"Loading embedding model {model_name} ({runtime}) with settings {settings}")
+        start = time.perf_counter()
+        try:
+            model = SentenceTransformer(model_name, **settings)
+        except Exception as e:
+            logger.error(f"Error loading embedding model {model_name}: {str(e)}")
+            raise
+
+        served_runtime, consistency = "torch", None
+        if runtime != "torch":
+            try:
+                candidate = build_runtime(model, runtime, model_name)
+                consistency = consistency_check(model, candidate)
+                if consistency["passed"]:
+                    model, served_runtime = candidate, runtime
+                else:
+                    logger.error(
+                        f"{runtime} runtime for {model_name} is {consistency['max_cosine_distance']} "
+                        f"from the reference (tolerance {consistency['tolerance']}); serving torch instead"
+                    )
+            except Exception as e:
+                logger.error(f"Error building {runtime} runtime for {model_name}, serving torch instead: {str(e)}")
+        load_time = time.perf_counter() - start
+
+        stats = {
+            "model_name": model_name,
+            "runtime": served_runtime,
+            "requested_runtime": runtime,
+            "consistency": consistency,
+            "settings": dict(settings),
+            "load_time_seconds": round(load_time, 3),
+            "memory_bytes": self._model_memory_bytes(model),
+            "embedding_dimension": model.get_sentence_embedding_dimension(),
+            "loaded_at": datetime.now().isoformat()
+        }
+        logger.info(
+            f"Loaded {model_name} in {stats['load_time_seconds']}s "
+            f"({stats['memory_bytes'] / (1024 * 1024):.1f} MiB)"
+        )
+
+        with self._lock:
+            self._models[key] = model
+            self._stats[key] = stats
+        return model
+
+    @staticmethod
+    def _model_memory_bytes(model) -> int:
+        """
+        Approximate resident size of a torch model from its state dict.
+
+        Dynamically quantized layers keep their int8 weights in packed params,
+        which are neither parameters nor buffers but do appear in the state dict.
+        """
+        if isinstance(model, OnnxSentenceEncoder):
+            return model.model_path.stat().st_size  # ONNX graph weights
+        import torch
+
+        seen = set()
+
+        def size(value) -> int:
+            if isinstance(value, (tuple, list)):
+                return sum(size(item) for item in value)
+            if not torch.is_tensor(value):
+                return 0
+            key = (value.data_ptr(), value.numel(), value.dtype)
+            if key in seen:  # Tied weights are stored once
+                return 0
+            seen.add(key)
+            return value.numel() * value.element_size()
+
+        return sum(size(value) for value in model.state_dict().values())
+
+    def served_runtime(self, model_name: str = DEFAULT_EMBEDDING_MODEL, runtime: Optional[str] = None, **settings) -> str:
+        """Runtime actually serving model_name, after any fallback to torch. Loads the model if needed."""
+        self.get(model_name, runtime, **settings)
+        key = self._make_key(model_name, runtime, settings)
+        with self._lock:
+            stats = self._stats.get(key)
+        return stats["runtime"] if stats else key[1]
+
+    def is_loaded(self, model_name: str = DEFAULT_EMBEDDING_MODEL, runtime: Optional[str] = None, **settings) -> bool:
+        return self._make_key(model_name, runtime, settings) in self._models
+
+    def unload(self, model_name: str = DEFAULT_EMBEDDING_MODEL, runtime: Optional[str] = None, **settings) -> bool:
+        """Drop a model from the registry. Returns False if it was not loaded."""
+        key = self._make_key(model_name, runtime, settings)
+        with self._lock:
+            self._stats.pop(key, None)
+            return self._models.pop(key, None) is not None
+
+    def stats(self) -> List[Dict]:
+        """Load time and memory footprint of every loaded model."""
+        with self._lock:
+            return [dict(s) for s in self._stats.values()]
+
+    def benchmark_runtimes(self, model_name: str = DEFAULT_EMBEDDING_MODEL, runtimes: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """
+        Log single-query latency, batch throughput and memory for each runtime.
+
+        Every variant is derived from one torch reference (the registry's torch
+        model when it is loaded) and dropped once measured, so at most one
+        variant is alive besides the reference. Nothing is added to the registry.
+        Variants other than torch also report their consistency check.
+        """
+        reference = self._models.get(self._make_key(model_name, "torch", {}))
+        if reference is None:
+            logger.info(f"Loading {model_name} as the benchmark reference")
+            reference = SentenceTransformer(model_name)
+
+        results = {}
+        for runtime in runtimes or EMBEDDING_BENCHMARK_RUNTIMES:
+            encoder = None
+            try:
+                encoder = build_runtime(reference, runtime, model_name)
+                result = {
+                    "runtime": runtime,
+                    "memory_bytes": self._model_memory_bytes(encoder),
+                    "consistency": consistency_check(reference, encoder) if runtime != "torch" else None,
+                    **benchmark(encoder)
+                }
+                logger.info(
+                    f"Encoder runtime {runtime} for {model_name}: "
+                    f"{result['query_latency_ms_p50']}ms per query, "
+                    f"{result['throughput_texts_per_second']} texts/s at batch {result['batch_size']}, "
+                    f"{result['memory_bytes'] / (1024 * 1024):.1f} MiB"
+                )
+            except Exception as e:
+                logger.error(f"Error benchmarking encoder runtime {runtime}: {str(e)}")
+                result = {"error": str(e)}
+            finally:
+                del encoder
+            results[runtime] = result
+
+        with self._lock:
+            for stats in self._stats.values():
+                if stats["model_name"] == model_name:
+                    stats["benchmark"] = results
+        return results
+
+    def select_runtime(self, model_name: str = DEFAULT_EMBEDDING_MODEL, runtimes: Optional[List[str]] = None) -> Dict:
+        """
+        Benchmark the runtimes and save the one with the lowest single-query
+        latency among those within tolerance of torch. Workers running with
+        EMBEDDING_RUNTIME=auto serve it from their next start.
+        """
+        results = self.benchmark_runtimes(model_name, runtimes)
+        eligible = {
+            runtime: result for runtime, result in results.items()
+            if "error" not in result and (result["consistency"] is None or result["consistency"]["passed"])
+        }
+        runtime = min(eligible, key=lambda r: eligible[r]["query_latency_ms_p50"]) if eligible else "torch"
+        choice = {"runtime": runtime, "selected_at": datetime.now().isoformat(), "results": results}
+        # Loaded models keep their runtime; swapping in place would hold two copies
+        save_runtime_choice(model_name, choice)
+        logger.info(f"Selected encoder runtime {runtime} for {model_name}")
+        return {"model_name": model_name, **choice}
+
+
+# Shared by every VectorStore in the process
+embedding_registry = EmbeddingModelRegistry()
+
+
+def get_embedding_model(model_name: Optional[str] = None, **settings) -> SentenceTransformer:
+    """Convenience accessor for the process-wide registry."""
+    return embedding_registry.get(model_name or DEFAULT_EMBEDDING_MODEL, **settings)
@@ -0,0 +1,242 @@
+import os
+import re
+import copy
+import json
+import inspect
+import time
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# torch (eager reference), torch-int8 (dynamic quantization), onnx, onnx-int8, or auto:
+# the runtime saved by `python -m app.manage_collections select-encoder-runtime`, else torch
+EMBEDDING_RUNTIME = os.getenv("EMBEDDING_RUNTIME", "auto").lower()
+EMBEDDING_RUNTIMES = ("torch", "torch-int8", "onnx", "onnx-int8")
+_DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+EMBEDDING_ONNX_DIR = Path(os.getenv("EMBEDDING_ONNX_DIR") or _DATA_DIR / "onnx_models")
+# Runtime chosen per model by select_runtime, shared by every worker on the host
+EMBEDDING_RUNTIME_CHOICE_FILE = Path(os.getenv("EMBEDDING_RUNTIME_CHOICE_FILE") or _DATA_DIR / "embedding_runtime.json")
+# Largest allowed cosine distance between a runtime's vectors and the torch reference
+EMBEDDING_RUNTIME_TOLERANCE = float(os.getenv("EMBEDDING_RUNTIME_TOLERANCE", 0.02))
+EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", 0))  # 0 lets onnxruntime decide
+
+# Sentences for consistency checks and benchmarks, close to what students ask
+SAMPLE_TEXTS = [
+    "What is photosynthesis?",
+    "Explain the difference between mitosis and meiosis.",
+    "Newton's second law states that force equals mass times acceleration.",
+    "The mitochondria is the site of cellular respiration, where glucose is broken down to release energy.",
+    "Balance the chemical equation for the combustion of methane.",
+    "Ethiopia's highlands influence the climate and rainfall patterns of the Horn of Africa.",
+    "Find the derivative of x squared plus three x.",
+    "Describe the structure of an atom, including protons, neutrons and electrons.",
+]
+
+
+class OnnxSentenceEncoder:
+    """
+    Sentence encoder that runs the transformer as an optimized ONNX graph.
+
+    Tokenization, pooling and normalization mirror the SentenceTransformer it
+    was exported from, so it can stand in for it anywhere encode() is used.
+    """
+
+    def __init__(self, reference, model_path: Path, threads: int = EMBEDDING_ONNX_THREADS):
+        import onnxruntime as ort
+
+        self.model_path = model_path
+        self.tokenizer = reference.tokenizer
+        self.max_seq_length = reference.max_seq_length
+        self.pooling = _pooling_mode(reference)
+        self.normalize = any(type(module).__name__ == "Normalize" for module in reference)
+        self.dimension = reference.get_sentence_embedding_dimension()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences, batch_size: int = 32, convert_to_numpy: bool = True, show_progress_bar: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        # Length-sorted batches waste less compute on padding
+        order = np.argsort([-len(t) for t in texts])
+        out = np.zeros((len(texts), self.dimension), dtype=np.float32)
+
+        for start in range(0, len(texts), batch_size):
+            batch = order[start:start + batch_size]
+            encoded = self.tokenizer(
+                [texts[i] for i in batch],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feed = {name: encoded[name].astype(np.int64) for name in self.input_names if name in encoded}
+            hidden = self.session.run(None, feed)[0]
+            out[batch] = self._pool(hidden, encoded["attention_mask"])
+
+        if self.normalize:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out[0] if single else out
+
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        if self.pooling == "cls":
+            return hidden[:, 0]
+        mask = mask[..., None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+
+def _pooling_mode(model) -> str:
+    for module in model:
+        if type(module).__name__ == "Pooling":
+            config = module.get_config_dict()
+            if config.get("pooling_mode_cls_token"):
+                return "cls"
+            if config.get("pooling_mode_mean_tokens"):
+                return "mean"
+            raise ValueError(f"Unsupported pooling for ONNX runtime: {config}")
+    raise ValueError("Model has no pooling module")
+
+
+def _export_onnx(reference, model_name: str, quantized: bool) -> Path:
+    """Export (and optionally int8-quantize) the transformer once; later loads reuse the file."""
+    import torch
+
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+    target_dir = EMBEDDING_ONNX_DIR / slug
+    fp32_path = target_dir / "model.onnx"
+    int8_path = target_dir / "model-int8.onnx"
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    if not fp32_path.exists():
+        logger.info(f"Exporting {model_name} to ONNX at {fp32_path}")
+        transformer = reference[0].auto_model.eval()
+        sample = reference.tokenizer(SAMPLE_TEXTS[:2], padding=True, return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+        tmp_path = fp32_path.with_suffix(".onnx.tmp")
+        export_options = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            export_options["dynamo"] = False  # The TorchScript exporter handles dynamic_axes
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer,
+                tuple(sample[name] for name in input_names),
+                str(tmp_path),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=axes,
+                opset_version=14,
+                **export_options
+            )
+        os.replace(tmp_path, fp32_path)
+
+    if not quantized:
+        return fp32_path
+
+    if not int8_path.exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info(f"Quantizing {fp32_path} to int8")
+        tmp_path = int8_path.with_suffix(".onnx.tmp")
+        quantize_dynamic(str(fp32_path), str(tmp_path), weight_type=QuantType.QInt8)
+        os.replace(tmp_path, int8_path)
+    return int8_path
+
+
+def build_runtime(reference, runtime: str, model_name: str):
+    """Return an encoder for runtime derived from the torch reference model."""
+    if runtime == "torch":
+        return reference
+    if runtime == "torch-int8":
+        import torch
+
+        return torch.quantization.quantize_dynamic(copy.deepcopy(reference), {torch.nn.Linear}, dtype=torch.qint8)
+    if runtime in ("onnx", "onnx-int8"):
+        model_path = _export_onnx(reference, model_name, quantized=runtime == "onnx-int8")
+        return OnnxSentenceEncoder(reference, model_path)
+    raise ValueError(f"Unknown embedding runtime: {runtime}")
+
+
+def load_runtime_choices(path: Optional[Path] = None) -> Dict[str, Dict]:
+    """Saved runtime choices keyed by model name; empty when none were saved."""
+    path = path or EMBEDDING_RUNTIME_CHOICE_FILE
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error(f"Error reading encoder runtime choices from {path}: {str(e)}")
+        return {}
+
+
+def save_runtime_choice(model_name: str, choice: Dict, path: Optional[Path] = None) -> None:
+    """Record the runtime chosen for model_name, keeping other models' choices."""
+    path = path or EMBEDDING_RUNTIME_CHOICE_FILE
+    choices = load_runtime_choices(path)
+    choices[model_name] = choice
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(choices, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _unit(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def consistency_check(
+    reference,
+    candidate,
+    texts: Optional[List[str]] = None,
+    tolerance: float = EMBEDDING_RUNTIME_TOLERANCE
+) -> Dict:
+    """Compare candidate vectors with the reference; passes when every cosine distance is within tolerance."""
+    texts = texts or SAMPLE_TEXTS
+    expected = _unit(reference.encode(texts, convert_to_numpy=True, show_progress_bar=False))
+    actual = _unit(candidate.encode(texts, convert_to_numpy=True, show_progress_bar=False))
+    distances = 1.0 - np.sum(expected * actual, axis=1)
+    max_distance = float(distances.max())
+    return {
+        "max_cosine_distance": round(max_distance, 6),
+        "mean_cosine_distance": round(float(distances.mean()), 6),
+        "tolerance": tolerance,
+        "passed": max_distance <= tolerance
+    }
+
+
+def benchmark(encoder, texts: Optional[List[str]] = None, batch_size: int = 32, repeats: int = 5) -> Dict:
+    """Single-query latency and batch throughput of an encoder on the sample texts."""
+    texts = texts or SAMPLE_TEXTS
+    encoder.encode(texts[:1], show_progress_bar=False)  # Warm up
+
+    latencies = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        encoder.encode([texts[i % len(texts)]], show_progress_bar=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    batch = (texts * ((batch_size // len(texts)) + 1))[:batch_size]
+    start = time.perf_counter()
+    encoder.encode(batch, batch_size=batch_size, show_progress_bar=False)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "query_latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+        "query_latency_ms_max": round(float(max(latencies)), 2),
+        "batch_size": batch_size,
+        "throughput_texts_per_second": round(batch_size / elapsed, 1) if elapsed > 0 else None
+    }
@@ -0,0 +1,107 @@
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .embedding_registry import DEFAULT_EMBEDDING_MODEL, get_embedding_model
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MAX_WORKERS = int(os.getenv("EMBEDDING_MAX_WORKERS", 2))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", EMBEDDING_MAX_WORKERS))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+
+
+class EncoderService:
+    """
+    Runs sentence-encoder inference on a dedicated thread pool.
+
+    PyTorch releases the GIL during the forward pass, so a small thread pool
+    keeps the event loop responsive without paying for a second copy of the
+    model in another process. An asyncio semaphore caps how many encode calls
+    may be in flight at once; extra callers wait without blocking the loop.
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_EMBEDDING_MODEL,
+        max_workers: int = EMBEDDING_MAX_WORKERS,
+        max_concurrency: int = EMBEDDING_MAX_CONCURRENCY
+    ):
+        self.model_name = model_name
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="encoder")
+        # Semaphores bind to the running loop, so create them lazily per loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+
+    @property
+    def model(self):
+        return get_embedding_model(self.model_name)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def encode_sync(
+        self,
+        texts: List[str],
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        normalize: bool = False
+    ) -> np.ndarray:
+        """Encode texts on the calling thread. Returns a float32 (n, dim) array."""
+        embeddings = self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if normalize:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.maximum(norms, 1e-12)
+        return embeddings
+
+    async def encode(
+        self,
+        texts: List[str],
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        normalize: bool = False
+    ) -> np.ndarray:
+        """Encode texts on the worker pool without blocking the event loop."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        async with self._get_semaphore():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor,
+                partial(self.encode_sync, texts, batch_size=batch_size, normalize=normalize)
+            )
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+_services: Dict[str, EncoderService] = {}
+_services_lock = threading.Lock()
+
+
+def get_encoder_service(model_name: Optional[str] = None) -> EncoderService:
+    """Return the process-wide encoder service for a model, creating it on first use."""
+    model_name = model_name or DEFAULT_EMBEDDING_MODEL
+    with _services_lock:
+        service = _services.get(model_name)
+        if service is None:
+            service = EncoderService(model_name=model_name)
+            _services[model_name] = service
+        return service
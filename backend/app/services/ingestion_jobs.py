@@ -0,0 +1,431 @@
+import os
+import json
+import uuid
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, so run a single worker there
+    fcntl = None
+
+from .chunk_store import ChunkStore
+from .pdf_service import document_source_from_folder
+
+logger = logging.getLogger(__name__)
+
+# Resolved against the package, not the working directory
+INGESTION_JOBS_DIR = Path(
+    os.getenv("INGESTION_JOBS_DIR") or Path(__file__).resolve().parent.parent / "data" / "ingestion_jobs"
+)
+# How many jobs may run each stage at once; the rest wait their turn
+INGESTION_MAX_CONCURRENT_EXTRACTIONS = int(os.getenv("INGESTION_MAX_CONCURRENT_EXTRACTIONS", 2))
+INGESTION_MAX_CONCURRENT_INDEXING = int(os.getenv("INGESTION_MAX_CONCURRENT_INDEXING", 1))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+# handler(job, update) -> values merged into job["state"]; update(progress=..., **state) persists mid-stage
+StageHandler = Callable[[Dict, Callable[..., None]], Awaitable[Optional[Dict]]]
+
+
+def job_id_for(dedupe_key: str) -> str:
+    """Jobs for the same work share an ID, so resubmitting finds the existing job."""
+    return hashlib.sha256(dedupe_key.encode("utf-8")).hexdigest()[:16]
+
+
+def upload_dedupe_key(content: bytes, subject: Optional[str], grade: Optional[str], index: bool) -> str:
+    return f"upload:{hashlib.sha256(content).hexdigest()}:{subject}:{grade}:{index}"
+
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+
+class IngestionJobQueue:
+    """
+    Background jobs for document ingestion, run as a sequence of stages.
+
+    Every job is a JSON file in jobs_dir, rewritten atomically on each stage
+    transition and progress update, so status can be polled while it runs and
+    survives a restart. resume() picks up queued and interrupted jobs and skips
+    the stages they already finished. Each stage has its own concurrency limit,
+    e.g. two PDFs extracting while a third one is being indexed.
+
+    Several worker processes may share jobs_dir. A job runs only in the
+    process holding an exclusive flock on its "<id>.lock" file; the kernel
+    drops the lock when that process exits, so an interrupted job can be
+    claimed again by whichever worker resumes first.
+
+    A job's ID is derived from what it does (file contents and options, or
+    folder and mode), so submitting the same work again returns the existing
+    job instead of starting a duplicate; a failed job is retried from its
+    first unfinished stage.
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, StageHandler],
+        stage_limits: Optional[Dict[str, int]] = None,
+        jobs_dir: Path = INGESTION_JOBS_DIR
+    ):
+        self.handlers = handlers
+        self.stage_limits = stage_limits or {}
+        # Created on the first write, so merely importing the app leaves no directory behind
+        self.jobs_dir = Path(jobs_dir)
+        self._lock = threading.Lock()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._semaphore_loop = None
+
+    def _path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _save(self, job: Dict) -> None:
+        job["updated_at"] = _now()
+        path = self._path(job["id"])
+        tmp_path = path.with_suffix(".json.tmp")
+        with self._lock:
+            self.jobs_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(job, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        path = self._path(job_id)
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def list(self, limit: Optional[int] = None) -> List[Dict]:
+        """Jobs, newest first."""
+        jobs = []
+        for path in self.jobs_dir.glob("*.json"):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    jobs.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable job file {path}: {e}")
+        jobs.sort(key=lambda job: job["created_at"], reverse=True)
+        return jobs[:limit] if limit else jobs
+
+    def _semaphore(self, stage: str) -> Optional[asyncio.Semaphore]:
+        limit = self.stage_limits.get(stage)
+        if not limit:
+            return None
+        # Bound to the running loop, so recreate them if the loop changes (e.g. in tests)
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphores = {}
+            self._semaphore_loop = loop
+        if stage not in self._semaphores:
+            self._semaphores[stage] = asyncio.Semaphore(limit)
+        return self._semaphores[stage]
+
+    def submit(
+        self,
+        kind: str,
+        stages: List[str],
+        params: Dict,
+        dedupe_key: Optional[str] = None,
+        force: bool = False
+    ) -> Dict:
+        """
+        Queue a job and start it in the background. Must be called from the
+        event loop. With force, finished work is redone under a new ID.
+        """
+        unknown = [stage for stage in stages if stage not in self.handlers]
+        if unknown:
+            raise ValueError(f"Unknown ingestion stages: {unknown}")
+
+        job_id = job_id_for(dedupe_key) if dedupe_key and not force else uuid.uuid4().hex[:16]
+        existing = self.get(job_id)
+        if existing:
+            if existing["status"] == FAILED:
+                logger.info(f"Retrying ingestion job {job_id} from its first unfinished stage")
+                existing["status"] = QUEUED
+                existing["error"] = None
+                self._save(existing)
+                self._start(existing["id"])
+            elif existing["status"] != SUCCEEDED:
+                # Interrupted jobs are picked up by resume(); make sure this one is
+                self._start(existing["id"])
+            return existing
+
+        job = {
+            "id": job_id,
+            "kind": kind,
+            "status": QUEUED,
+            "params": params,
+            "state": {},
+            "stages": [
+                {"name": stage, "status": QUEUED, "attempts": 0, "started_at": None,
+                 "finished_at": None, "seconds": None, "progress": None}
+                for stage in stages
+            ],
+            "result": None,
+            "error": None,
+            "created_at": _now(),
+            "updated_at": None,
+            "started_at": None,
+            "finished_at": None,
+            "seconds": None
+        }
+        self._save(job)
+        logger.info(f"Queued {kind} ingestion job {job_id} ({', '.join(stages)})")
+        self._start(job_id)
+        return job
+
+    def _start(self, job_id: str, claim=None) -> None:
+        task = self._tasks.get(job_id)
+        if task and not task.done():
+            if claim is not None:
+                claim.close()
+            return
+        task = asyncio.get_running_loop().create_task(self._run(job_id, claim))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    def _claim(self, job_id: str):
+        """
+        Take the job's lock file without waiting. Returns the open file, which
+        holds the claim until closed, or None if another worker has the job.
+        """
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.jobs_dir / f"{job_id}.lock", "a")
+        if fcntl is None:
+            return lock_file
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def resume(self) -> List[str]:
+        """
+        Restart every job left queued or running, e.g. by a worker restart.
+        Jobs another worker is running are left to it.
+        """
+        resumed = []
+        for job in self.list():
+            if job["status"] in (QUEUED, RUNNING):
+                claim = self._claim(job["id"])
+                if claim is None:
+                    continue
+                self._start(job["id"], claim)
+                resumed.append(job["id"])
+        if resumed:
+            logger.info(f"Resuming {len(resumed)} ingestion jobs: {', '.join(resumed)}")
+        return resumed
+
+    async def wait(self, job_id: str) -> Optional[Dict]:
+        """Wait for a job started by this process and return its final record."""
+        task = self._tasks.get(job_id)
+        if task:
+            await asyncio.shield(task)
+        return self.get(job_id)
+
+    async def _run(self, job_id: str, claim=None) -> None:
+        claim = claim or self._claim(job_id)
+        if claim is None:
+            logger.info(f"Ingestion job {job_id} is running in another worker")
+            return
+        try:
+            await self._run_claimed(job_id)
+        finally:
+            claim.close()
+
+    async def _run_claimed(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if job is None or job["status"] not in (QUEUED, RUNNING):
+            return  # Finished by another worker before we claimed it
+        job_start = time.perf_counter()
+        job["status"] = RUNNING
+        job["started_at"] = job["started_at"] or _now()
+        self._save(job)
+
+        for stage in job["stages"]:
+            if stage["status"] == SUCCEEDED:
+                continue
+
+            def update(progress: Optional[Dict] = None, **state) -> None:
+                if progress is not None:
+                    stage["progress"] = progress
+                job["state"].update(state)
+                self._save(job)
+
+            semaphore = self._semaphore(stage["name"])
+            try:
+                if semaphore:
+                    await semaphore.acquire()
+                try:
+                    stage["status"] = RUNNING
+                    stage["attempts"] += 1
+                    stage["started_at"] = _now()
+                    stage["finished_at"] = stage["seconds"] = None
+                    self._save(job)
+
+                    stage_start = time.perf_counter()
+                    result = await self.handlers[stage["name"]](job, update)
+                    stage["seconds"] = round(time.perf_counter() - stage_start, 3)
+                finally:
+                    if semaphore:
+                        semaphore.release()
+            except Exception as e:
+                logger.error(f"Ingestion job {job_id} failed in stage {stage['name']}: {str(e)}")
+                stage["status"] = FAILED
+                stage["finished_at"] = _now()
+                job["status"] = FAILED
+                job["error"] = f"{stage['name']}: {e}"
+                self._save(job)
+                return
+
+            job["state"].update(result or {})
+            stage["status"] = SUCCEEDED
+            stage["finished_at"] = _now()
+            self._save(job)
+
+        job["status"] = SUCCEEDED
+        job["result"] = job["state"]
+        job["finished_at"] = _now()
+        # Time spent in this run; stage timings cover earlier attempts too
+        job["seconds"] = round(time.perf_counter() - job_start, 3)
+        self._save(job)
+        logger.info(f"Ingestion job {job_id} finished in {job['seconds']}s")
+
+
+async def index_chunks_folder(
+    vector_store,
+    folder_path: Path,
+    mode: str = "full",
+    batch_size: Optional[int] = None,
+    progress_callback: Optional[Callable[[Dict], None]] = None,
+    subject: Optional[str] = None,
+    grade: Optional[str] = None
+) -> Dict:
+    """
+    Embed and store the chunks of an extraction folder, then record them as
+    indexed in its chunk store. subject and grade override the values in the
+    chunk metadata.
+    """
+    folder_path = Path(folder_path)
+    store = ChunkStore(folder_path)
+    chunks = store.read(with_status=False)
+
+    if not chunks:
+        raise ValueError("No chunks found in file")
+
+    # Ensure all chunks have proper metadata
+    for chunk in chunks:
+        chunk_metadata = chunk.get('metadata') or {}
+        chunk['metadata'] = {
+            'subject': str(subject or chunk_metadata.get('subject', 'unknown')),
+            'grade': str(grade or chunk_metadata.get('grade', 'unknown')),
+            'chapter_title': str(chunk_metadata.get('chapter_title', 'unknown')),
+            'chapter_number': str(chunk_metadata.get('chapter_number', '0')),
+            'page_number': str(chunk_metadata.get('page_number', '0')),
+            'source': folder_path.name
+        }
+
+    metadata = {
+        "subject": str(chunks[0]['metadata']['subject']),
+        "grade": str(chunks[0]['metadata']['grade']),
+        # Stable across re-extractions of the same book, so incremental
+        # re-indexing diffs against the previous run
+        "source": document_source_from_folder(folder_path.name)
+    }
+    logger.info(f"Using metadata for vector store: {metadata}")
+
+    progress = {}
+
+    def report(update: Dict) -> None:
+        progress.update(update)
+        if progress_callback:
+            progress_callback(update)
+
+    diff = None
+    if mode == "incremental":
+        diff = await vector_store.reindex_documents(chunks, metadata, batch_size=batch_size, progress_callback=report)
+        embedding_ids = diff.pop("ids")
+    else:
+        embedding_ids = await vector_store.add_documents(chunks, metadata, batch_size=batch_size, progress_callback=report)
+
+    # Record indexing status and embedding IDs next to the chunks
+    indexed_at = datetime.now().isoformat()
+    store.set_status({
+        index: {"indexed": True, "indexed_at": indexed_at, "embedding_id": embedding_id}
+        for index, embedding_id in enumerate(embedding_ids)
+    })
+
+    return {
+        "chunks_indexed": len(chunks),
+        "embedding_ids": embedding_ids,
+        "elapsed_seconds": progress.get("elapsed_seconds"),
+        "chunks_per_second": progress.get("chunks_per_second"),
+        "mode": mode,
+        "changes": diff
+    }
+
+
+def create_ingestion_queue(pdf_service, vector_store, jobs_dir: Path = INGESTION_JOBS_DIR) -> IngestionJobQueue:
+    """
+    Queue with the standard stages:
+        extract - PDF to chunks in a new extraction folder (params: file_path, subject, grade)
+        index   - embed and store the folder's chunks (params: folder_path or the
+                  extract stage's folder, mode, batch_size)
+    """
+
+    async def extract(job: Dict, update) -> Dict:
+        params, state = job["params"], job["state"]
+        if state.get("output_dir"):
+            # Resumed: write into the folder the interrupted run started
+            output_dir = Path(state["output_dir"])
+            output_dir.mkdir(parents=True, exist_ok=True)
+        else:
+            # An earlier extraction of the same file is resumed, or reused if it finished
+            output_dir = pdf_service.output_dir_for(params["file_path"])
+            update(output_dir=str(output_dir))
+
+        chunks = await pdf_service.process_pdf(
+            file_path=params["file_path"],
+            subject=params.get("subject"),
+            grade=params.get("grade"),
+            output_dir=output_dir,
+            progress_callback=lambda progress: update(progress=progress)
+        )
+        return {"folder_name": output_dir.name, "num_chunks": len(chunks)}
+
+    async def index(job: Dict, update) -> Dict:
+        params, state = job["params"], job["state"]
+        stage = next(s for s in job["stages"] if s["name"] == "index")
+        mode = params.get("mode", "incremental")
+        if stage["attempts"] > 1:
+            # Some batches may already be stored; content-hash IDs let incremental skip them
+            mode = "incremental"
+        result = await index_chunks_folder(
+            vector_store,
+            Path(params.get("folder_path") or state["output_dir"]),
+            mode=mode,
+            batch_size=params.get("batch_size"),
+            progress_callback=lambda progress: update(progress=progress),
+            subject=params.get("subject"),
+            grade=params.get("grade")
+        )
+        result.pop("embedding_ids")  # Already recorded in the chunk store
+        return {"index": result}
+
+    return IngestionJobQueue(
+        {"extract": extract, "index": index},
+        stage_limits={
+            "extract": INGESTION_MAX_CONCURRENT_EXTRACTIONS,
+            "index": INGESTION_MAX_CONCURRENT_INDEXING
+        },
+        jobs_dir=jobs_dir
+    )
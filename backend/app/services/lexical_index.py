@@ -0,0 +1,162 @@
+import os
+import re
+import math
+import heapq
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .vector_backends import matches_where
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = float(os.getenv("BM25_K1", 1.5))
+BM25_B = float(os.getenv("BM25_B", 0.75))
+
+# Keeps section numbers ("3.2"), formulas ("h2o") and hyphenated terms together
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have how in is it its of on or that the
+this to was were what when where which who why will with do does did can
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Incrementally maintained inverted index with Okapi BM25 scoring.
+
+    Postings map term -> {doc_id: term frequency}. Documents can be added,
+    replaced and removed one at a time, so the index is kept in step with the
+    vector collection instead of being rebuilt. Writes made by other processes
+    are not seen; VectorStore rebuilds the index when the counts drift apart.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._doc_terms: Dict[str, List[str]] = {}
+        self._metadatas: Dict[str, Dict] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+        self.ready = False  # Set once the index mirrors the whole collection
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def add(self, ids: Iterable[str], texts: Iterable[str], metadatas: Optional[Iterable[Dict]] = None) -> None:
+        """Index documents, replacing any existing entries with the same IDs."""
+        ids, texts = list(ids), list(texts)
+        metadatas = list(metadatas) if metadatas is not None else [None] * len(ids)
+        with self._lock:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                self._remove_one(doc_id)
+                counts = Counter(tokenize(text or ""))
+                for term, tf in counts.items():
+                    self._postings.setdefault(term, {})[doc_id] = tf
+                length = sum(counts.values())
+                self._doc_lengths[doc_id] = length
+                self._doc_terms[doc_id] = list(counts)
+                self._metadatas[doc_id] = metadata or {}
+                self._total_length += length
+
+    def remove(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            for doc_id in ids:
+                self._remove_one(doc_id)
+
+    def _remove_one(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(doc_id, 0)
+        self._metadatas.pop(doc_id, None)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._doc_lengths.clear()
+            self._doc_terms.clear()
+            self._metadatas.clear()
+            self._total_length = 0
+            self.ready = False
+
+    def replace(self, other: "BM25Index") -> None:
+        """Take over the contents of an index built off to the side."""
+        with self._lock, other._lock:
+            self._postings = other._postings
+            self._doc_lengths = other._doc_lengths
+            self._doc_terms = other._doc_terms
+            self._metadatas = other._metadatas
+            self._total_length = other._total_length
+            self.ready = other.ready
+
+    def update_metadata(self, ids: Iterable[str], metadatas: Iterable[Dict]) -> None:
+        with self._lock:
+            for doc_id, metadata in zip(ids, metadatas):
+                if doc_id in self._metadatas:
+                    self._metadatas[doc_id] = {**self._metadatas[doc_id], **(metadata or {})}
+
+    def search(self, query: str, k: int = 10, where: Optional[Dict] = None) -> List[Tuple[str, float]]:
+        """Return up to k (doc_id, score) pairs, best first."""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            n_docs = len(self._doc_lengths)
+            if n_docs == 0:
+                return []
+            avg_length = self._total_length / n_docs
+            scores: Dict[str, float] = {}
+
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            if where:
+                scores = {d: s for d, s in scores.items() if matches_where(self._metadatas.get(d), where)}
+
+            return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked ID lists: score(d) = sum over lists of 1 / (k + rank of d)."""
+    scores: Dict[str, float] = {}
+    for ranked in ranked_lists:
+        for rank, doc_id in enumerate(ranked, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+_indexes: Dict[Tuple[str, str], BM25Index] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(backend: str, collection_name: str) -> BM25Index:
+    """Return the process-wide lexical index that mirrors a collection."""
+    key = (backend, collection_name)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = BM25Index()
+        return index
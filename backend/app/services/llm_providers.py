@@ -0,0 +1,160 @@
+import os
+import re
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableGenerator
+from langchain_openai import ChatOpenAI
+
+from .lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# openai, or offline for a deterministic local stand-in (load tests, CI, benchmarks)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai").lower()
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4-turbo-preview")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", 0.7))
+# Model used when a caller asks for a specific temperature
+LLM_TEMPERATURE_MODEL = os.getenv("LLM_TEMPERATURE_MODEL", "gpt-4o")
+
+# Offline provider: "extractive" quotes the best-matching context sentences, "canned" returns a fixed answer
+LLM_OFFLINE_MODE = os.getenv("LLM_OFFLINE_MODE", "extractive").lower()
+LLM_OFFLINE_CANNED_ANSWER = os.getenv(
+    "LLM_OFFLINE_CANNED_ANSWER",
+    "This is a placeholder answer from the offline LLM provider."
+)
+LLM_OFFLINE_LATENCY_MS = float(os.getenv("LLM_OFFLINE_LATENCY_MS", 0))  # Before the first token
+LLM_OFFLINE_TOKENS_PER_SECOND = float(os.getenv("LLM_OFFLINE_TOKENS_PER_SECOND", 0))  # 0 = no delay
+LLM_OFFLINE_MAX_SENTENCES = int(os.getenv("LLM_OFFLINE_MAX_SENTENCES", 3))
+
+NO_ANSWER = "I cannot answer this question based on the provided context."
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+TOKEN_PATTERN = re.compile(r"\S+\s*")
+
+
+class LLMProvider(ABC):
+    """
+    Source of answer chains for LLMService.
+
+    A chain takes {"context": str, "question": str} and produces the answer
+    text; it must support ainvoke and astream. LLMService adds caching per
+    (model, temperature), concurrency limits, timeouts and retries on top.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def model_for(self, temperature: Optional[float] = None) -> str:
+        """Model name used for a request at this temperature."""
+
+    def temperature_for(self, temperature: Optional[float] = None) -> float:
+        return LLM_TEMPERATURE if temperature is None else float(temperature)
+
+    @abstractmethod
+    def build_chain(self, prompt, model: str, temperature: float, timeout_seconds: float):
+        """Answer chain for prompt on model; LLMService caches it per (model, temperature)."""
+
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        if not self.api_key:
+            raise ValueError("OPENAI_API_KEY not found in environment variables")
+
+    def model_for(self, temperature: Optional[float] = None) -> str:
+        return LLM_MODEL if temperature is None else LLM_TEMPERATURE_MODEL
+
+    def build_chain(self, prompt, model: str, temperature: float, timeout_seconds: float):
+        llm = ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            openai_api_key=self.api_key,
+            request_timeout=timeout_seconds,
+            max_retries=0  # LLMService retries with backoff
+        )
+        return prompt | llm | StrOutputParser()
+
+
+def extractive_answer(question: str, contexts: List[str], max_sentences: int = LLM_OFFLINE_MAX_SENTENCES) -> str:
+    """The context sentences sharing the most words with the question, in their original order."""
+    question_words = set(tokenize(question))
+    sentences = [s.strip() for context in contexts for s in SENTENCE_PATTERN.split(context or "") if s.strip()]
+    scored = []
+    for position, sentence in enumerate(sentences):
+        overlap = len(question_words & set(tokenize(sentence)))
+        if overlap:
+            scored.append((overlap, position))
+    if not scored:
+        return NO_ANSWER
+    best = sorted(scored, key=lambda item: (-item[0], item[1]))[:max_sentences]
+    return " ".join(sentences[position] for _, position in sorted(best, key=lambda item: item[1]))
+
+
+class OfflineProvider(LLMProvider):
+    """
+    Deterministic local stand-in for a hosted model: no network, no quota.
+
+    Answers are canned or extracted from the supplied contexts, so the same
+    question and contexts always give the same answer. Latency before the first
+    token and the streaming token rate can be simulated, so load tests see
+    realistic concurrency without calling a provider.
+    """
+
+    name = "offline"
+
+    def __init__(
+        self,
+        mode: str = LLM_OFFLINE_MODE,
+        canned_answer: str = LLM_OFFLINE_CANNED_ANSWER,
+        latency_ms: float = LLM_OFFLINE_LATENCY_MS,
+        tokens_per_second: float = LLM_OFFLINE_TOKENS_PER_SECOND,
+        max_sentences: int = LLM_OFFLINE_MAX_SENTENCES
+    ):
+        if mode not in ("extractive", "canned"):
+            raise ValueError(f"Unknown offline LLM mode: {mode}")
+        self.mode = mode
+        self.canned_answer = canned_answer
+        self.latency_ms = latency_ms
+        self.tokens_per_second = tokens_per_second
+        self.max_sentences = max_sentences
+
+    def model_for(self, temperature: Optional[float] = None) -> str:
+        return f"offline-{self.mode}"
+
+    def answer(self, inputs: Dict) -> str:
+        if self.mode == "canned":
+            return self.canned_answer
+        contexts = (inputs.get("context") or "").split("\n\n")
+        return extractive_answer(inputs.get("question") or "", contexts, self.max_sentences)
+
+    async def _generate(self, inputs: AsyncIterator[Dict]) -> AsyncIterator[str]:
+        async for item in inputs:
+            answer = self.answer(item)
+            if self.latency_ms:
+                await asyncio.sleep(self.latency_ms / 1000.0)
+            delay = 1.0 / self.tokens_per_second if self.tokens_per_second else 0
+            for i, token in enumerate(TOKEN_PATTERN.findall(answer)):
+                if delay and i:
+                    await asyncio.sleep(delay)
+                yield token
+
+    def build_chain(self, prompt, model: str, temperature: float, timeout_seconds: float):
+        # The prompt isn't rendered: answers come straight from the inputs
+        return RunnableGenerator(self._generate)
+
+
+def create_llm_provider(name: Optional[str] = None) -> LLMProvider:
+    name = (name or LLM_PROVIDER).lower()
+    if name == "openai":
+        return OpenAIProvider()
+    if name == "offline":
+        logger.info(f"Using offline LLM provider ({LLM_OFFLINE_MODE})")
+        return OfflineProvider()
+    raise ValueError(f"Unknown LLM provider: {name}")
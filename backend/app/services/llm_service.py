@@ -1,26 +1,80 @@
-from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import os
+import time
+import random
+import asyncio
 import logging
+import threading
 from dotenv import load_dotenv
+from ..utils.metrics import metrics
+from .llm_providers import LLM_MODEL, LLMProvider, create_llm_provider
 load_dotenv() 
 
 logger = logging.getLogger(__name__)
 
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 60))
+# Once a stream has started: longest wait for the next chunk, and for the whole answer
+LLM_STREAM_IDLE_TIMEOUT_SECONDS = float(os.getenv("LLM_STREAM_IDLE_TIMEOUT_SECONDS", 30))
+LLM_STREAM_TIMEOUT_SECONDS = float(os.getenv("LLM_STREAM_TIMEOUT_SECONDS", 300))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_RETRY_BACKOFF_SECONDS = float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", 1.0))
+
+llm_ttft = metrics.histogram("llm.ttft_ms")
+llm_latency = metrics.histogram("llm.latency_ms")
+llm_retries = metrics.counter("llm.retries")
+llm_timeouts = metrics.counter("llm.timeouts")
+llm_failures = metrics.counter("llm.failures")
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Timeouts, connection problems, rate limits and 5xx are worth another try."""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    try:
+        import openai
+    except ImportError:
+        return False
+    return isinstance(error, (
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError
+    ))
+
+
 class LLMService:
-    def __init__(self):
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        if not self.api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables")
-
-        # Initialize the model
-        self.llm = ChatOpenAI(
-            model="gpt-4-turbo-preview",
-            temperature=0.7,
-            openai_api_key=self.api_key
-        )
+    """
+    Async client for answer generation, meant to be shared by the whole process.
+
+    Answers come from a pluggable LLMProvider (LLM_PROVIDER: the OpenAI API,
+    or a deterministic offline stand-in). Chains (and the HTTP connections
+    they keep open) are built once per (model, temperature) and reused. A semaphore caps concurrent calls to the
+    provider; every call has a timeout and is retried with exponential backoff
+    and jitter on transient errors. Use get_llm_service() instead of
+    constructing one per request.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        timeout_seconds: float = LLM_TIMEOUT_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        provider: Optional[LLMProvider] = None,
+        stream_idle_timeout_seconds: float = LLM_STREAM_IDLE_TIMEOUT_SECONDS,
+        stream_timeout_seconds: float = LLM_STREAM_TIMEOUT_SECONDS
+    ):
+        self.provider = provider or create_llm_provider()
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self.stream_idle_timeout_seconds = stream_idle_timeout_seconds
+        self.stream_timeout_seconds = stream_timeout_seconds
+        self.max_retries = max_retries
+        self._chains: Dict[Tuple[str, float], object] = {}
+        self._chains_lock = threading.Lock()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
 
         # Create prompt template
         self.prompt = ChatPromptTemplate.from_messages([
@@ -29,8 +83,85 @@ class LLMService:
             ("user", "Context: {context}\n\nQuestion: {question}")
         ])
 
-        # Create chain
-        self.chain = self.prompt | self.llm | StrOutputParser()
+        # Default chain
+        self.chain = self._get_chain()
+
+    def model_name(self, temperature: Optional[float] = None) -> str:
+        return self.provider.model_for(temperature)
+
+    def _get_chain(self, temperature: Optional[float] = None):
+        """Chain for a temperature, built on first use and then reused."""
+        key = (self.provider.model_for(temperature), self.provider.temperature_for(temperature))
+        with self._chains_lock:
+            chain = self._chains.get(key)
+            if chain is None:
+                chain = self._chains[key] = self.provider.build_chain(
+                    self.prompt,
+                    model=key[0],
+                    temperature=key[1],
+                    timeout_seconds=self.timeout_seconds
+                )
+            return chain
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Bound to the running loop, so recreate it if the loop changes (e.g. in tests)
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def _backoff(self, attempt: int, error: Exception) -> None:
+        delay = LLM_RETRY_BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random() / 2)
+        llm_retries.inc()
+        logger.warning(f"LLM call failed ({error!r}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+    async def stream_response(
+        self,
+        question: str,
+        contexts: List[str],
+        temperature: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yield the answer in chunks as the model produces them. Failures before
+        the first chunk are retried; after that the error is raised to the caller.
+        The first chunk must arrive within timeout_seconds, each later one within
+        stream_idle_timeout_seconds, and the whole stream within stream_timeout_seconds.
+        """
+        chain = self._get_chain(temperature)
+        inputs = {"context": "\n\n".join(contexts), "question": question}
+        for attempt in range(self.max_retries + 1):
+            # Each attempt takes its own slot, so a call waiting to retry doesn't hold one
+            async with self.semaphore:
+                start = time.perf_counter()
+                deadline = start + self.stream_timeout_seconds
+                started = False
+                try:
+                    stream = chain.astream(inputs).__aiter__()
+                    while True:
+                        timeout = self.stream_idle_timeout_seconds if started else self.timeout_seconds
+                        timeout = max(min(timeout, deadline - time.perf_counter()), 0)
+                        try:
+                            token = await asyncio.wait_for(stream.__anext__(), timeout=timeout)
+                        except StopAsyncIteration:
+                            break
+                        if not started and token:
+                            llm_ttft.observe((time.perf_counter() - start) * 1000)
+                            started = True
+                        yield token
+                    llm_latency.observe((time.perf_counter() - start) * 1000)
+                    return
+                except Exception as e:
+                    if isinstance(e, asyncio.TimeoutError):
+                        llm_timeouts.inc()
+                    if started or attempt >= self.max_retries or not _is_retryable(e):
+                        llm_failures.inc()
+                        logger.error(f"Error streaming LLM response: {str(e)}")
+                        raise
+                    error = e
+            await self._backoff(attempt, error)
 
     async def generate_response(
         self,
@@ -39,32 +170,56 @@ class LLMService:
         temperature: Optional[float] = None
     ) -> Dict:
         """Generate response using the LLM."""
-        try:
-            # Combine contexts
-            combined_context = "\n\n".join(contexts)
-
-            # Use custom temperature if provided
-            if temperature is not None:
-                llm = ChatOpenAI(
-                    model="gpt-4o",
-                    temperature=temperature,
-                    openai_api_key=self.api_key
-                )
-                chain = self.prompt | llm | StrOutputParser()
-            else:
-                chain = self.chain
-
-            # Generate response
-            response = chain.invoke({
-                "context": combined_context,
-                "question": question
-            })
-
-            return {
-                "response": response,
-                "model": "gpt-4-turbo-preview"
-            }
-
-        except Exception as e:
-            logger.error(f"Error generating LLM response: {str(e)}")
-            raise
\ No newline at end of file
+        # Use custom temperature if provided
+        chain = self._get_chain(temperature)
+        inputs = {
+            "context": "\n\n".join(contexts),
+            "question": question
+        }
+
+        for attempt in range(self.max_retries + 1):
+            # Each attempt takes its own slot, so a call waiting to retry doesn't hold one
+            async with self.semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await asyncio.wait_for(chain.ainvoke(inputs), timeout=self.timeout_seconds)
+                    llm_latency.observe((time.perf_counter() - start) * 1000)
+                    return {
+                        "response": response,
+                        "model": self.model_name(temperature)
+                    }
+                except Exception as e:
+                    if isinstance(e, asyncio.TimeoutError):
+                        llm_timeouts.inc()
+                    if attempt >= self.max_retries or not _is_retryable(e):
+                        llm_failures.inc()
+                        logger.error(f"Error generating LLM response: {str(e)}")
+                        raise
+                    error = e
+            await self._backoff(attempt, error)
+
+    def stats(self) -> Dict:
+        return {
+            "provider": self.provider.name,
+            "chains": [{"model": model, "temperature": temperature} for model, temperature in self._chains],
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": self.timeout_seconds,
+            "max_retries": self.max_retries,
+            "latency_ms": llm_latency.snapshot(),
+            "retries": llm_retries.value,
+            "timeouts": llm_timeouts.value,
+            "failures": llm_failures.value
+        }
+
+
+_llm_service: Optional[LLMService] = None
+_llm_service_lock = threading.Lock()
+
+
+def get_llm_service() -> LLMService:
+    """Return the process-wide LLM client, creating it on first use."""
+    global _llm_service
+    with _llm_service_lock:
+        if _llm_service is None:
+            _llm_service = LLMService()
+        return _llm_service
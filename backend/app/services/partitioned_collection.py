@@ -0,0 +1,477 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+VECTOR_PARTITIONING = os.getenv("VECTOR_PARTITIONING", "false").lower() == "true"
+PARTITION_QUERY_WORKERS = int(os.getenv("PARTITION_QUERY_WORKERS", 8))
+# How long a process trusts its list of partitions before asking the server again
+PARTITION_CATALOG_TTL_SECONDS = float(os.getenv("PARTITION_CATALOG_TTL_SECONDS", 30))
+
+SEPARATOR = "--"
+# Keeps "<base>--<subject>--<grade>--<kind>" within Chroma's 63-character limit for bases up to 21 characters
+MAX_SEGMENT_LENGTH = 16
+HASH_LENGTH = 8
+MISSING = "none"
+PLAIN_SEGMENT = re.compile(r"[A-Za-z0-9]+(-[A-Za-z0-9]+)*")
+TEXTBOOK, EXAM = "text", "exam"
+
+PartitionKey = Tuple[str, str, str]  # (subject segment, grade segment, kind)
+
+_executor = ThreadPoolExecutor(max_workers=PARTITION_QUERY_WORKERS, thread_name_prefix="partition-query")
+
+
+def segment(value: Any) -> str:
+    """
+    Collection-name-safe form of a subject or grade. Never contains the separator.
+
+    Short strings of letters, digits and single inner dashes are used as is.
+    Anything else is shortened and given a hash suffix after "_", which plain
+    segments never contain, so two distinct values never share a partition.
+    """
+    if value is None or value == "":
+        return MISSING
+    text = str(value)
+    if isinstance(value, str) and text != MISSING and len(text) <= MAX_SEGMENT_LENGTH and PLAIN_SEGMENT.fullmatch(text):
+        return text
+    digest = hashlib.sha1(f"{type(value).__name__}:{text}".encode("utf-8")).hexdigest()[:HASH_LENGTH]
+    readable = re.sub(r"[^A-Za-z0-9]+", "-", text)[:MAX_SEGMENT_LENGTH - HASH_LENGTH - 1].strip("-")
+    return f"{readable}_{digest}"
+
+
+def partition_key(metadata: Optional[Dict]) -> PartitionKey:
+    metadata = metadata or {}
+    kind = EXAM if metadata.get("type") == "exam_question" else TEXTBOOK
+    return segment(metadata.get("subject")), segment(metadata.get("grade")), kind
+
+
+def _equality_values(condition: Any) -> Optional[List[Any]]:
+    """Values a single-field condition pins the field to, or None if it doesn't."""
+    if not isinstance(condition, dict):
+        return [condition]
+    if set(condition) == {"$eq"}:
+        return [condition["$eq"]]
+    if set(condition) == {"$in"}:
+        return list(condition["$in"])
+    return None
+
+
+def _flatten(where: Optional[Dict]) -> Optional[List[Dict]]:
+    """Split a where clause into single-field conditions joined by AND (None if it has an $or)."""
+    if not where:
+        return []
+    conditions = []
+    for key, value in where.items():
+        if key == "$and":
+            for part in value:
+                flattened = _flatten(part)
+                if flattened is None:
+                    return None
+                conditions.extend(flattened)
+        elif key.startswith("$"):
+            return None
+        else:
+            conditions.append({key: value})
+    return conditions
+
+
+def _combine(conditions: List[Dict]) -> Optional[Dict]:
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+
+class PartitionRoute:
+    """Which partitions a where clause can match, and what is left to filter inside them."""
+
+    def __init__(self, where: Optional[Dict]):
+        self.subjects: Optional[Set[str]] = None
+        self.grades: Optional[Set[str]] = None
+        self.kinds: Optional[Set[str]] = None
+        self.residual = where
+
+        conditions = _flatten(where)
+        if conditions is None:
+            return  # $or and friends: search everything, filter as asked
+
+        residual = []
+        for condition in conditions:
+            field, value = next(iter(condition.items()))
+            values = _equality_values(value)
+            if field in ("subject", "grade") and values is not None:
+                segments = {segment(v) for v in values}
+                current = self.subjects if field == "subject" else self.grades
+                segments = segments if current is None else segments & current
+                if field == "subject":
+                    self.subjects = segments
+                else:
+                    self.grades = segments
+                # Each value has a partition of its own, so a single-value filter can be
+                # dropped; "none" also holds items without the field, so that one stays
+                if not (len(values) == 1 and segment(values[0]) != MISSING):
+                    residual.append(condition)
+            elif field == "type" and value in ("exam_question", {"$eq": "exam_question"}):
+                self.kinds = {EXAM} if self.kinds is None else self.kinds & {EXAM}
+            elif field == "type" and value == {"$ne": "exam_question"}:
+                self.kinds = {TEXTBOOK} if self.kinds is None else self.kinds & {TEXTBOOK}
+            else:
+                if field == "type" and values is not None and "exam_question" not in values:
+                    self.kinds = {TEXTBOOK} if self.kinds is None else self.kinds & {TEXTBOOK}
+                residual.append(condition)
+        self.residual = _combine(residual)
+
+    def matches(self, key: PartitionKey) -> bool:
+        subject, grade, kind = key
+        return (
+            (self.subjects is None or subject in self.subjects)
+            and (self.grades is None or grade in self.grades)
+            and (self.kinds is None or kind in self.kinds)
+        )
+
+
+class PartitionedCollection:
+    """
+    A logical collection stored as one physical collection per
+    (subject, grade, content type), named "<base>--<subject>--<grade>--<kind>".
+
+    Writes are routed by metadata. Queries and reads use the where clause to
+    pick only the partitions that can match. Conditions a partition already
+    guarantees are dropped, so a filtered query runs an unfiltered search over
+    a small index instead of post-filtering a large one. Queries that span
+    several partitions are scattered in parallel and merged by distance.
+
+    Exposes the subset of the Chroma collection API that VectorStore uses.
+    """
+
+    def __init__(self, client, name: str, metadata: Optional[Dict] = None):
+        self.client = client
+        self.name = name
+        self.metadata = metadata or {"hnsw:space": "cosine"}
+        self._partitions: Dict[PartitionKey, Any] = {}
+        self._catalog_loaded_at = 0.0
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------
+    # Catalog
+
+    def _partition_name(self, key: PartitionKey) -> str:
+        return SEPARATOR.join((self.name,) + key)
+
+    def _parse_name(self, name: str) -> Optional[PartitionKey]:
+        prefix = self.name + SEPARATOR
+        if not name.startswith(prefix):
+            return None
+        parts = name[len(prefix):].split(SEPARATOR)
+        if len(parts) != 3 or parts[2] not in (TEXTBOOK, EXAM):
+            return None
+        return parts[0], parts[1], parts[2]
+
+    def _refresh(self, force: bool = False) -> None:
+        with self._lock:
+            if not force and time.monotonic() - self._catalog_loaded_at < PARTITION_CATALOG_TTL_SECONDS:
+                return
+            names = [getattr(c, "name", c) for c in self.client.list_collections()]
+            for name in names:
+                key = self._parse_name(name)
+                if key is not None and key not in self._partitions:
+                    self._partitions[key] = self.client.get_collection(name)
+            self._catalog_loaded_at = time.monotonic()
+
+    def partitions(self, route: Optional[PartitionRoute] = None) -> List[Tuple[PartitionKey, Any]]:
+        self._refresh()
+        with self._lock:
+            items = sorted(self._partitions.items())
+        return [(key, collection) for key, collection in items if route is None or route.matches(key)]
+
+    def _get_or_create(self, key: PartitionKey):
+        with self._lock:
+            collection = self._partitions.get(key)
+            if collection is None:
+                name = self._partition_name(key)
+                logger.info(f"Creating partition {name}")
+                collection = self.client.get_or_create_collection(name, metadata=self.metadata)
+                self._partitions[key] = collection
+            return collection
+
+    def drop(self) -> None:
+        """Delete every partition."""
+        self._refresh(force=True)
+        with self._lock:
+            for key in list(self._partitions):
+                self.client.delete_collection(self._partition_name(key))
+            self._partitions.clear()
+
+    def stats(self) -> List[Dict]:
+        return [
+            {"partition": self._partition_name(key), "count": collection.count()}
+            for key, collection in self.partitions()
+        ]
+
+    # ------------------------------------------------------------------
+    # Writes
+
+    def _group(self, ids, embeddings, metadatas, documents, keys=None) -> Dict[PartitionKey, Dict[str, list]]:
+        groups: Dict[PartitionKey, Dict[str, list]] = {}
+        for i, item_id in enumerate(ids):
+            metadata = metadatas[i] if metadatas is not None else None
+            group = groups.setdefault(
+                keys[i] if keys is not None else partition_key(metadata),
+                {"ids": [], "embeddings": [], "metadatas": [], "documents": []}
+            )
+            group["ids"].append(item_id)
+            group["embeddings"].append(embeddings[i] if embeddings is not None else None)
+            group["metadatas"].append(metadata)
+            group["documents"].append(documents[i] if documents is not None else None)
+        return groups
+
+    def _write(self, method: str, ids, embeddings=None, metadatas=None, documents=None, keys=None) -> None:
+        self._refresh()
+        for key, group in self._group(ids, embeddings, metadatas, documents, keys).items():
+            getattr(self._get_or_create(key), method)(
+                ids=group["ids"],
+                embeddings=group["embeddings"] if embeddings is not None else None,
+                metadatas=group["metadatas"] if metadatas is not None else None,
+                documents=group["documents"] if documents is not None else None
+            )
+
+    def add(self, ids, embeddings=None, metadatas=None, documents=None, **kwargs) -> None:
+        self._write("add", ids, embeddings, metadatas, documents)
+
+    def upsert(self, ids, embeddings=None, metadatas=None, documents=None, **kwargs) -> None:
+        """Insert or replace, removing the old copy of items whose new metadata belongs to another partition."""
+        ids = list(ids)
+        existing = self.get(ids=ids, include=[], _with_keys=True)
+        old_keys = dict(zip(existing["ids"], existing["keys"]))
+
+        keys, stale = [], {}
+        for i, item_id in enumerate(ids):
+            old_key = old_keys.get(item_id)
+            if metadatas is not None or old_key is None:
+                key = partition_key(metadatas[i] if metadatas is not None else None)
+            else:
+                key = old_key  # No new metadata: replace in place
+            keys.append(key)
+            if old_key is not None and old_key != key:
+                stale.setdefault(old_key, []).append(item_id)
+
+        self._write("upsert", ids, embeddings, metadatas, documents, keys)
+        for key, stale_ids in stale.items():
+            self._partitions[key].delete(ids=stale_ids)
+
+    def update(self, ids, embeddings=None, metadatas=None, documents=None, **kwargs) -> None:
+        """Update in place, moving items whose new metadata belongs to another partition."""
+        ids = list(ids)
+        current = self.get(ids=ids, include=["metadatas", "documents", "embeddings"], _with_keys=True)
+        found = {item_id: i for i, item_id in enumerate(current["ids"])}
+
+        in_place: Dict[PartitionKey, Dict[str, list]] = {}
+        for i, item_id in enumerate(ids):
+            if item_id not in found:
+                logger.warning(f"Update of nonexistent embedding ID: {item_id}")
+                continue
+            j = found[item_id]
+            old_key = current["keys"][j]
+            new_metadata = metadatas[i] if metadatas is not None else None
+            merged = {**(current["metadatas"][j] or {}), **(new_metadata or {})}
+            new_key = partition_key(merged)
+            embedding = embeddings[i] if embeddings is not None else current["embeddings"][j]
+            document = documents[i] if documents is not None else current["documents"][j]
+
+            if new_key != old_key:
+                self._get_or_create(new_key).add(
+                    ids=[item_id], embeddings=[embedding], metadatas=[merged], documents=[document]
+                )
+                self._partitions[old_key].delete(ids=[item_id])
+                continue
+
+            group = in_place.setdefault(old_key, {"ids": [], "embeddings": [], "metadatas": [], "documents": []})
+            group["ids"].append(item_id)
+            group["embeddings"].append(embedding)
+            group["metadatas"].append(new_metadata if new_metadata is not None else current["metadatas"][j])
+            group["documents"].append(document)
+
+        for key, group in in_place.items():
+            self._partitions[key].update(
+                ids=group["ids"],
+                embeddings=group["embeddings"] if embeddings is not None else None,
+                metadatas=group["metadatas"] if metadatas is not None else None,
+                documents=group["documents"] if documents is not None else None
+            )
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None, **kwargs) -> None:
+        route = PartitionRoute(where)
+        for _, collection in self.partitions(route):
+            if ids is not None:
+                collection.delete(ids=list(ids), where=where)
+            elif route.residual is None:
+                # The whole partition matches; delete everything in it
+                everything = collection.get(include=[])["ids"]
+                if everything:
+                    collection.delete(ids=everything)
+            else:
+                collection.delete(where=route.residual)
+
+    # ------------------------------------------------------------------
+    # Reads
+
+    def count(self) -> int:
+        return sum(collection.count() for _, collection in self.partitions())
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Optional[List[str]] = None,
+        _with_keys: bool = False,
+        **kwargs
+    ) -> Dict:
+        """Concatenate partitions in name order; limit/offset page over the concatenation."""
+        include = include if include is not None else ["metadatas", "documents"]
+        route = PartitionRoute(where)
+        result = {"ids": [], "embeddings": [], "metadatas": [], "documents": [], "keys": []}
+        skip = offset or 0
+        remaining = limit
+
+        for key, collection in self.partitions(route):
+            if remaining is not None and remaining <= 0:
+                break
+            if ids is None and skip:
+                # Skip whole partitions without fetching them
+                size = collection.count() if route.residual is None else len(
+                    collection.get(where=route.residual, include=[])["ids"]
+                )
+                if skip >= size:
+                    skip -= size
+                    continue
+
+            page = collection.get(
+                ids=list(ids) if ids is not None else None,
+                where=route.residual,
+                limit=remaining if ids is None else None,
+                offset=skip if ids is None else None,
+                include=include
+            )
+            skip = 0
+            page_ids = page.get("ids") or []
+            result["ids"].extend(page_ids)
+            result["keys"].extend([key] * len(page_ids))
+            for field in ("embeddings", "metadatas", "documents"):
+                values = page.get(field)
+                if field in include and values is not None:
+                    result[field].extend(list(values))
+            if remaining is not None and ids is None:
+                remaining -= len(page_ids)
+
+        if ids is not None and (offset or limit is not None):
+            start = offset or 0
+            stop = start + limit if limit is not None else None
+            for field in ("ids", "keys", "embeddings", "metadatas", "documents"):
+                result[field] = result[field][start:stop]
+
+        for field in ("embeddings", "metadatas", "documents"):
+            if field not in include:
+                result[field] = None
+        if not _with_keys:
+            result.pop("keys")
+        result["included"] = list(include)
+        return result
+
+    def query(
+        self,
+        query_embeddings,
+        n_results: int = 10,
+        where: Optional[Dict] = None,
+        include: Optional[List[str]] = None,
+        **kwargs
+    ) -> Dict:
+        include = include if include is not None else ["metadatas", "documents", "distances"]
+        route = PartitionRoute(where)
+        targets = self.partitions(route)
+        query_embeddings = [list(map(float, q)) for q in query_embeddings]
+        fields = [f for f in ("metadatas", "documents", "embeddings") if f in include]
+        # Distances are needed to merge, even if the caller didn't ask for them
+        partition_include = list(dict.fromkeys(list(include) + ["distances"]))
+
+        def search(collection) -> Dict:
+            return collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=route.residual,
+                include=partition_include
+            )
+
+        if len(targets) == 1:
+            responses = [search(targets[0][1])]
+        else:
+            responses = list(_executor.map(search, [collection for _, collection in targets]))
+
+        result: Dict[str, Any] = {"ids": [], "distances": []}
+        for field in fields:
+            result[field] = []
+        for q in range(len(query_embeddings)):
+            hits = []
+            for response in responses:
+                for rank, item_id in enumerate(response["ids"][q]):
+                    hit = {"id": item_id, "distance": response["distances"][q][rank]}
+                    for field in fields:
+                        hit[field] = response[field][q][rank]
+                    hits.append(hit)
+            hits.sort(key=lambda hit: hit["distance"])
+            hits = hits[:n_results]
+            result["ids"].append([hit["id"] for hit in hits])
+            result["distances"].append([hit["distance"] for hit in hits])
+            for field in fields:
+                result[field].append([hit[field] for hit in hits])
+
+        for field in ("distances", "metadatas", "documents", "embeddings"):
+            if field not in include:
+                result[field] = None
+        result["included"] = list(include)
+        return result
+
+    # ------------------------------------------------------------------
+    # Migration
+
+    def import_from(self, source, page_size: int = 1000) -> int:
+        """Copy an unpartitioned collection into partitions, reusing its embeddings."""
+        copied = 0
+        while True:
+            page = source.get(limit=page_size, offset=copied, include=["documents", "metadatas", "embeddings"])
+            page_ids = page.get("ids") or []
+            if not page_ids:
+                break
+            self.upsert(
+                ids=page_ids,
+                embeddings=[list(map(float, e)) for e in page["embeddings"]],
+                metadatas=page["metadatas"],
+                documents=page["documents"]
+            )
+            copied += len(page_ids)
+            logger.info(f"Partitioned {copied} records from {source.name}")
+            if len(page_ids) < page_size:
+                break
+        return copied
+
+
+_collections: Dict[Tuple[str, str], PartitionedCollection] = {}
+_collections_lock = threading.Lock()
+
+
+def get_partitioned_collection(client, backend: str, name: str) -> PartitionedCollection:
+    """Return the process-wide partitioned view of a logical collection."""
+    key = (backend, name)
+    with _collections_lock:
+        collection = _collections.get(key)
+        if collection is None:
+            collection = _collections[key] = PartitionedCollection(client, name)
+        return collection
@@ -1,132 +1,382 @@
 import fitz
 import pdfplumber
 from pathlib import Path
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional, Tuple
+import asyncio
+import glob
+import hashlib
 import logging
 import json
+import math
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 
-from app.utils.text_cleaner import clean_text_dict, clean_raw_text
+from app.utils.text_cleaner import clean_raw_text
 from ..utils.chunking import create_chunks
+from .chunk_store import ChunkStore
 from ..models.document import PageMetadata, TextChunk, ProcessedPage
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Worker processes for page extraction; 1 extracts in a single background thread
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+# Page ranges handed to each worker, so slow pages (figures, tables) even out
+PDF_RANGES_PER_WORKER = int(os.getenv("PDF_RANGES_PER_WORKER", 4))
+# Smaller documents aren't worth the cost of starting workers
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 16))
+# spawn: workers don't inherit the API process's threads (torch, HTTP clients)
+PDF_EXTRACTION_START_METHOD = os.getenv("PDF_EXTRACTION_START_METHOD", "spawn")
+
+EXTRACTION_ROOT = Path("/mnt/c/CursTest/Production/Extract")
+# Per-document progress: which file a folder holds and whether it finished
+CHECKPOINT_FILE = "checkpoint.json"
+# One record per finished page (text, metadata, chunk count), kept as a ChunkStore
+PAGE_LOG_DIR = "pages"
+
+def document_source_from_folder(folder_name: str) -> str:
+    """
+    Stable identity of the document behind an extraction folder, i.e. the
+    folder name without the pdf_extraction_ prefix and timestamp suffix.
+    """
+    match = re.match(r"^pdf_extraction_(.+)_\d{8}_\d{6}$", folder_name)
+    return match.group(1) if match else folder_name
+
+def page_text(page) -> str:
+    """
+    Raw text of a page, block by block in reading order.
+
+    Only the text blocks are requested: MuPDF decodes the page once and hands
+    back plain strings, without building the span/line/char layout (and image
+    data) of the "dict" output.
+    """
+    blocks = page.get_text("blocks", flags=fitz.TEXTFLAGS_BLOCKS & ~fitz.TEXT_PRESERVE_IMAGES)
+    # (x0, y0, x1, y1, text, block_no, block_type); type 1 is an image
+    return " ".join(block[4] for block in blocks if block[6] == 0)
+
+def _extract_page(page, page_num: int) -> Dict:
+    """Extract, clean and chunk one page."""
+    raw_text = page_text(page)
+    cleaned_text, page_metadata = clean_raw_text(raw_text)
+    
+    chunks = []
+    if cleaned_text.strip():
+        # Create chunks
+        chunks = create_chunks(cleaned_text)
+        logger.debug(f"Created {len(chunks)} chunks for page {page_num + 1}")
+        
+        # Add page metadata to chunks
+        for chunk in chunks:
+            chunk['metadata'] = {
+                'page_number': page_num + 1,
+                'chapter_number': page_metadata.get('unit_number'),
+                'chapter_title': page_metadata.get('unit_title')
+            }
+
+    return {
+        "page_num": page_num,
+        "text": cleaned_text,
+        "page_metadata": page_metadata,
+        "chunks": chunks
+    }
+
+def extract_page_range(file_path: str, start: int, stop: int) -> List[Dict]:
+    """
+    Extract pages [start, stop) of a PDF. Runs in worker processes, so it
+    opens its own handle to the document. Each result carries its timing;
+    a page that fails is reported with its error instead of stopping the range.
+    """
+    results = []
+    with fitz.open(file_path) as doc:
+        for page_num in range(start, stop):
+            page_start = time.perf_counter()
+            try:
+                result = _extract_page(doc[page_num], page_num)
+            except Exception as page_error:
+                logger.error(f"Error processing page {page_num + 1}: {page_error}", exc_info=True)
+                result = {"page_num": page_num, "error": str(page_error), "chunks": []}
+            result["seconds"] = round(time.perf_counter() - page_start, 4)
+            results.append(result)
+    logger.info(f"Extracted pages {start + 1}-{stop} of {file_path}")
+    return results
+
+# Extraction pools by (workers, start method), started on first use and kept for
+# later documents so each upload doesn't pay for starting interpreters
+_pools: Dict[Tuple[int, str], ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+def get_extraction_pool(workers: int, start_method: str = PDF_EXTRACTION_START_METHOD) -> ProcessPoolExecutor:
+    key = (workers, start_method)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            logger.info(f"Starting PDF extraction pool with {workers} workers ({start_method})")
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method))
+            _pools[key] = pool
+        return pool
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """Forget a broken pool without waiting for it; the next document starts a new one."""
+    with _pools_lock:
+        for key, existing in list(_pools.items()):
+            if existing is pool:
+                del _pools[key]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_extraction_pools(wait: bool = True) -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+def _page_ranges(page_count: int, parts: int, start: int = 0) -> List[range]:
+    size = max(1, math.ceil((page_count - start) / max(parts, 1)))
+    return [range(first, min(first + size, page_count)) for first in range(start, page_count, size)]
+
+def file_fingerprint(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _read_checkpoint(output_dir: Path) -> Optional[Dict]:
+    try:
+        with open(output_dir / CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_checkpoint(output_dir: Path, checkpoint: Dict) -> None:
+    checkpoint["updated_at"] = datetime.now().isoformat()
+    tmp_path = output_dir / f"{CHECKPOINT_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, output_dir / CHECKPOINT_FILE)
+
+def _processed_pages(page_records: List[Dict], chunks: List[Dict]) -> List[ProcessedPage]:
+    """Rebuild ProcessedPages from the page log and the chunks written for it, in page order."""
+    processed_pages = []
+    position = 0
+    for record in page_records:
+        page_chunks = chunks[position:position + record["chunk_count"]]
+        position += record["chunk_count"]
+        if record.get("error") or not record["text"].strip():
+            continue
+
+        metadata = PageMetadata(
+            page_number=record["page_num"] + 1,
+            chapter_number=record["page_metadata"].get('unit_number'),
+            chapter_title=record["page_metadata"].get('unit_title')
+        )
+        processed_pages.append(ProcessedPage(
+            text=record["text"],
+            metadata=metadata,
+            chunks=[TextChunk(text=chunk['text'], metadata=metadata) for chunk in page_chunks]
+        ))
+    return processed_pages
+
 class PDFService:
-    def __init__(self):
+    def __init__(self, workers: int = PDF_EXTRACTION_WORKERS):
         self.upload_dir = Path("data/uploads")
         self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self.workers = max(1, workers)
 
-    def _create_output_dirs(self, pdf_name: str) -> Path:
-        """Create output directories for storing chunks and other data."""
+    def _create_output_dir(self, pdf_name: str) -> Path:
+        """Create the output directory for storing chunks and other data."""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_root = Path("/mnt/c/CursTest/Production/Extract")
-        output_dir = output_root / f"pdf_extraction_{pdf_name}_{timestamp}"
+        output_dir = EXTRACTION_ROOT / f"pdf_extraction_{pdf_name}_{timestamp}"
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        # Create chunks directory
-        chunks_dir = output_dir / "chunks"
-        chunks_dir.mkdir(exist_ok=True)
+        return output_dir
+
+    def output_dir_for(self, file_path: str, fingerprint: Optional[str] = None) -> Path:
+        """
+        The folder of the latest earlier extraction of the same file (by content),
+        finished or not, or a new folder if there is none.
+        """
+        fingerprint = fingerprint or file_fingerprint(file_path)
+        pdf_name = Path(file_path).stem
+        for folder in sorted(EXTRACTION_ROOT.glob(f"pdf_extraction_{glob.escape(pdf_name)}_*"), reverse=True):
+            checkpoint = _read_checkpoint(folder)
+            if checkpoint and checkpoint.get("source_sha256") == fingerprint:
+                return folder
+        return self._create_output_dir(pdf_name)
+
+    async def extract_pages(
+        self,
+        file_path: str,
+        workers: Optional[int] = None,
+        start_method: str = PDF_EXTRACTION_START_METHOD,
+        progress_callback: Optional[Callable[[Dict], None]] = None,
+        start_page: int = 0,
+        on_pages: Optional[Callable[[List[Dict]], None]] = None
+    ) -> List[Dict]:
+        """
+        Extract every page from start_page on, in page order. With more than one
+        worker the page ranges are handled by a process pool; otherwise they are
+        extracted in a background thread. Either way the event loop stays free.
+
+        on_pages is called with consecutive runs of pages, in page order, as soon
+        as every page before them is done, so callers can checkpoint as they go.
+        """
+        workers = max(1, workers or self.workers)
+        with fitz.open(file_path) as doc:
+            page_count = len(doc)
 
-        return output_dir, chunks_dir
+        loop = asyncio.get_running_loop()
+        ranges = _page_ranges(page_count, workers * PDF_RANGES_PER_WORKER, start_page)
+        parts = []
+        waiting = {}
+        next_page = start_page
 
-    async def process_pdf(self, file_path: str, subject: str, grade: int) -> List[ProcessedPage]:
-        """Process PDF and return chunks with metadata."""
+        def report(part: List[Dict]) -> None:
+            nonlocal next_page
+            parts.append(part)
+            if on_pages:
+                waiting[part[0]["page_num"]] = part
+                while next_page in waiting:
+                    ready = waiting.pop(next_page)
+                    on_pages(ready)
+                    next_page += len(ready)
+            if progress_callback:
+                pages_done = start_page + sum(len(p) for p in parts)
+                progress_callback({"pages_done": pages_done, "pages_total": page_count})
+
+        if workers == 1 or page_count - start_page < PDF_PARALLEL_MIN_PAGES:
+            for r in ranges:
+                report(await loop.run_in_executor(None, extract_page_range, file_path, r.start, r.stop))
+        else:
+            logger.info(f"Extracting {page_count - start_page} pages with {workers} workers in {len(ranges)} ranges")
+            pool = get_extraction_pool(workers, start_method)
+            futures = [
+                loop.run_in_executor(pool, extract_page_range, file_path, r.start, r.stop)
+                for r in ranges
+            ]
+            try:
+                for future in asyncio.as_completed(futures):
+                    report(await future)
+            except BaseException as e:
+                # Drop the ranges still queued; ranges already running finish in
+                # the background instead of holding up the event loop
+                for future in futures:
+                    future.cancel()
+                if isinstance(e, BrokenProcessPool):
+                    _discard_pool(pool)
+                raise
+        return sorted((page for part in parts for page in part), key=lambda page: page["page_num"])
+
+    async def process_pdf(
+        self,
+        file_path: str,
+        subject: str,
+        grade: int,
+        workers: Optional[int] = None,
+        output_dir: Optional[Path] = None,
+        progress_callback: Optional[Callable[[Dict], None]] = None
+    ) -> List[ProcessedPage]:
+        """
+        Process PDF and return chunks with metadata.
+
+        Chunks go to the folder's ChunkStore and a record per finished page to
+        its page log, in page order, so the page log is the checkpoint: after a
+        crash the same file (matched by content) resumes from the first page
+        without a record, reusing the chunks already written. Processing a
+        file that already finished reads the results back without extracting
+        anything. output_dir picks the folder instead of looking one up.
+        """
         try:
-            print("process pdf" + file_path)
-            doc = fitz.open(file_path)
-            processed_pages = []
-            
-            # Create output directories
-            pdf_name = Path(file_path).stem
-            output_dir, chunks_dir = self._create_output_dirs(pdf_name)
-            all_chunks = []
-
-            for page_num in range(len(doc)):
-                logger.info(f"Processing page {page_num + 1}/{len(doc)}")
-                
-                try:
-                    # Get page
-                    page = doc[page_num]
-                    
-                    # Extract text and metadata
-                    text_dict = {
-                        "text": page.get_text("dict"),
-                        "blocks": page.get_text("blocks")
-                    }
-                    text_dict = clean_text_dict(text_dict)
-                    
-                    # Clean text
-                    blocks = text_dict.get("blocks", [])
-                    text_content = []
-                    
-                    # Add debug logging
-                    logger.debug(f"Number of blocks on page {page_num + 1}: {len(blocks)}")
-                    
-                    for i, block in enumerate(blocks):
-                        try:
-                            if isinstance(block, tuple):
-                                logger.debug(f"Block {i} length: {len(block)}")
-                                if len(block) > 4:
-                                    text_content.append(str(block[4]))
-                        except Exception as block_error:
-                            logger.warning(f"Error processing block {i} on page {page_num + 1}: {block_error}")
-                            continue
-                    
-                    raw_text = " ".join(text_content)
-                    cleaned_text, page_metadata = clean_raw_text(raw_text)
-                    
-                    if cleaned_text.strip():
-                        # Create chunks
-                        chunks = create_chunks(cleaned_text)
-                        logger.debug(f"Created {len(chunks)} chunks for page {page_num + 1}")
-                        
-                        # Add page metadata to chunks
-                        for chunk in chunks:
-                            chunk['metadata'] = {
-                                'page_number': page_num + 1,
-                                'chapter_number': page_metadata.get('unit_number'),
-                                'chapter_title': page_metadata.get('unit_title')
-                            }
-                        
-                        # Save page-specific chunks
-                        page_chunks_file = chunks_dir / f"page_{page_num}_chunks.json"
-                        with open(page_chunks_file, "w", encoding="utf-8") as f:
-                            json.dump(chunks, f, ensure_ascii=False, indent=2)
-                        
-                        all_chunks.extend(chunks)
-                        
-                        # Create metadata
-                        metadata = PageMetadata(
-                            page_number=page_num + 1,
-                            chapter_number=page_metadata.get('unit_number'),
-                            chapter_title=page_metadata.get('unit_title')
-                        )
-                        
-                        # Create processed page
-                        processed_page = ProcessedPage(
-                            text=cleaned_text,
-                            metadata=metadata,
-                            chunks=[TextChunk(text=chunk['text'], metadata=metadata) 
-                                   for chunk in chunks]
-                        )
-                        
-                        processed_pages.append(processed_page)
-                
-                except Exception as page_error:
-                    logger.error(f"Error processing page {page_num + 1}: {page_error}")
-                    logger.error(f"Stack trace: ", exc_info=True)
-                    continue  # Continue with next page instead of failing completely
-            
-            # Save all chunks to a single file
-            all_chunks_file = output_dir / "all_chunks.json"
-            with open(all_chunks_file, "w", encoding="utf-8") as f:
-                json.dump(all_chunks, f, ensure_ascii=False, indent=2)
+            logger.info(f"Processing PDF {file_path}")
+            workers = max(1, workers or self.workers)
+            fingerprint = file_fingerprint(file_path)
+            output_dir = Path(output_dir or self.output_dir_for(file_path, fingerprint))
+            output_dir.mkdir(parents=True, exist_ok=True)
+            store = ChunkStore(output_dir)
+            page_log = ChunkStore(output_dir / PAGE_LOG_DIR)
+
+            checkpoint = _read_checkpoint(output_dir)
+            if checkpoint and checkpoint.get("source_sha256") == fingerprint:
+                if checkpoint.get("completed"):
+                    logger.info(f"{file_path} was already extracted to {output_dir}; nothing to do")
+                    return _processed_pages(page_log.read(), store.read(with_status=False))
+                start_page = page_log.count()
+                # Chunks written for a page whose record wasn't are extracted again
+                store.truncate(sum(record["chunk_count"] for record in page_log.read()))
+                logger.info(f"Resuming {file_path} from page {start_page + 1}")
+            else:
+                start_page = 0
+                store.truncate(0)
+                page_log.truncate(0)
+                with fitz.open(file_path) as doc:
+                    page_count = len(doc)
+                checkpoint = {
+                    "source_sha256": fingerprint,
+                    "file_name": Path(file_path).name,
+                    "page_count": page_count,
+                    "completed": False
+                }
+                _write_checkpoint(output_dir, checkpoint)
+
+            def save(pages: List[Dict]) -> None:
+                # Chunks first: a crash in between leaves chunks without a page record, which resume drops
+                records, chunks = [], []
+                for page in pages:
+                    page_chunks = [] if page.get("error") or not page["text"].strip() else page["chunks"]
+                    chunks.extend(page_chunks)
+                    records.append({
+                        "page_num": page["page_num"],
+                        "text": page.get("text", ""),
+                        "page_metadata": page.get("page_metadata", {}),
+                        "chunk_count": len(page_chunks),
+                        "seconds": page["seconds"],
+                        "error": page.get("error")
+                    })
+                if chunks:
+                    store.append(chunks)
+                page_log.append(records)
+
+            start = time.perf_counter()
+            pages = await self.extract_pages(
+                file_path,
+                workers=workers,
+                progress_callback=progress_callback,
+                start_page=start_page,
+                on_pages=save
+            )
+            elapsed = time.perf_counter() - start
+
+            page_records = page_log.read()
+            all_chunks = store.read(with_status=False)
+            processed_pages = _processed_pages(page_records, all_chunks)
+
+            page_seconds = [page["seconds"] for page in pages]
+            timings = {
+                'workers': workers,
+                'resumed_from_page': start_page + 1 if start_page else None,
+                'elapsed_seconds': round(elapsed, 3),
+                # Sum of per-page times is what a single worker would have taken
+                'page_seconds_total': round(sum(page_seconds), 3),
+                'speedup': round(sum(page_seconds) / elapsed, 2) if elapsed > 0 else None,
+                'pages_per_second': round(len(pages) / elapsed, 2) if elapsed > 0 else None,
+                'slowest_page_seconds': max(page_seconds, default=0),
+                'failed_pages': [record["page_num"] + 1 for record in page_records if record.get("error")],
+                'pages': [{'page_number': record["page_num"] + 1, 'seconds': record["seconds"]} for record in page_records]
+            }
+            logger.info(
+                f"Extracted {len(pages)} pages in {timings['elapsed_seconds']}s with {workers} workers "
+                f"({timings['pages_per_second']} pages/sec, speedup {timings['speedup']}x)"
+            )
 
             # Create and save metadata summary
             metadata_summary = {
-                'total_pages': len(doc),
+                'total_pages': len(page_records),
                 'total_chunks': len(all_chunks),
                 'subject': subject,
                 'grade': grade,
@@ -135,17 +385,20 @@ class PDFService:
                     for chunk in all_chunks 
                     if chunk['metadata']['chapter_number'] is not None
                 ))),
-                'processing_timestamp': datetime.now().strftime("%Y%m%d_%H%M%S")
+                'processing_timestamp': datetime.now().strftime("%Y%m%d_%H%M%S"),
+                'extraction_timings': timings
             }
             
             metadata_file = output_dir / "metadata_summary.json"
             with open(metadata_file, "w", encoding="utf-8") as f:
                 json.dump(metadata_summary, f, ensure_ascii=False, indent=2)
+
+            checkpoint["completed"] = True
+            _write_checkpoint(output_dir, checkpoint)
             
-            doc.close()
             return processed_pages
             
         except Exception as e:
             logger.error(f"Error processing PDF: {str(e)}")
             logger.error("Stack trace: ", exc_info=True)
-            raise
\ No newline at end of file
+            raise
@@ -0,0 +1,117 @@
+import os
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .encoder_service import EncoderService, get_encoder_service
+from ..utils.metrics import metrics, SIZE_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", 32))
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", 5))
+
+
+class QueryBatcher:
+    """
+    Collects single-query encode requests into micro-batches.
+
+    The first request to arrive opens a window of max_wait_ms; everything that
+    arrives before it closes (or until max_batch_size is reached) is encoded
+    in one call and each caller receives its own vector.
+    """
+
+    def __init__(
+        self,
+        encoder: EncoderService,
+        max_batch_size: int = QUERY_BATCH_MAX_SIZE,
+        max_wait_ms: float = QUERY_BATCH_WINDOW_MS
+    ):
+        self.encoder = encoder
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max_wait_ms
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop = None
+        self._tasks = set()
+
+        prefix = f"query_batcher.{encoder.model_name}"
+        self.batch_size_histogram = metrics.histogram(f"{prefix}.batch_size", SIZE_BUCKETS)
+        self.queue_wait_histogram = metrics.histogram(f"{prefix}.queue_wait_ms")
+
+    async def encode(self, text: str) -> np.ndarray:
+        """Encode a single text, sharing the forward pass with concurrent callers."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Pending futures belong to a single loop; start fresh if it changed
+            self._pending = []
+            self._timer = None
+            self._tasks = set()
+            self._loop = loop
+
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000.0, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = self._loop.create_task(self._run_batch(batch))
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future, float]]) -> None:
+        started = time.perf_counter()
+        self.batch_size_histogram.observe(len(batch))
+        for _, _, enqueued in batch:
+            self.queue_wait_histogram.observe((started - enqueued) * 1000)
+
+        try:
+            vectors = await self.encoder.encode([text for text, _, _ in batch])
+        except Exception as e:
+            logger.error(f"Error encoding query batch of {len(batch)}: {str(e)}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def stats(self) -> Dict:
+        return {
+            "batch_size": self.batch_size_histogram.snapshot(),
+            "queue_wait_ms": self.queue_wait_histogram.snapshot()
+        }
+
+
+_batchers: Dict[str, QueryBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_query_batcher(model_name: Optional[str] = None) -> QueryBatcher:
+    """Return the process-wide query batcher for a model, creating it on first use."""
+    encoder = get_encoder_service(model_name)
+    with _batchers_lock:
+        batcher = _batchers.get(encoder.model_name)
+        if batcher is None:
+            batcher = QueryBatcher(encoder)
+            _batchers[encoder.model_name] = batcher
+        return batcher
@@ -0,0 +1,196 @@
+import os
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 2048))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", 0))
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form used as the cache key: lower case, single spaces, no trailing punctuation."""
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip("?!. ")
+
+
+class QueryEmbeddingCache:
+    """
+    Size-bounded LRU cache of query embeddings keyed by (model name, normalized text).
+
+    Concurrent misses for the same key are coalesced: the first caller computes
+    the embedding and the others await the same future, so a burst of identical
+    questions costs one forward pass.
+    """
+
+    def __init__(
+        self,
+        max_size: int = QUERY_CACHE_SIZE,
+        ttl_seconds: Optional[float] = QUERY_CACHE_TTL_SECONDS or None,
+        name: str = "query_cache"
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[np.ndarray, Optional[float]]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+        self.hits = metrics.counter(f"{name}.hits")
+        self.misses = metrics.counter(f"{name}.misses")
+        self.evictions = metrics.counter(f"{name}.evictions")
+        self.expirations = metrics.counter(f"{name}.expirations")
+
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        key = (model_name, normalize_query(text))
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        vector, expires_at = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.expirations.inc()
+            return None
+
+        self._entries.move_to_end(key)
+        return vector
+
+    def put(self, model_name: str, text: str, vector: np.ndarray) -> np.ndarray:
+        """Store a read-only copy of vector and return it."""
+        vector = np.array(vector, dtype=np.float32)
+        vector.setflags(write=False)  # Shared between callers
+        if self.max_size <= 0:
+            return vector
+
+        key = (model_name, normalize_query(text))
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+
+        self._entries[key] = (vector, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions.inc()
+        return vector
+
+    async def get_or_compute(
+        self,
+        model_name: str,
+        text: str,
+        compute: Callable[[], Awaitable[np.ndarray]]
+    ) -> np.ndarray:
+        """Return the cached embedding or compute it once for all concurrent callers."""
+        vector = self.get(model_name, text)
+        if vector is not None:
+            self.hits.inc()
+            return vector
+
+        key = (model_name, normalize_query(text))
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.hits.inc()
+            return await asyncio.shield(inflight)
+
+        self.misses.inc()
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            vector = self.put(model_name, text, await compute())
+            future.set_result(vector)
+            return vector
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a failure without waiters doesn't log a warning
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get_or_compute_many(
+        self,
+        model_name: str,
+        texts: List[str],
+        compute: Callable[[List[str]], Awaitable[np.ndarray]]
+    ) -> List[np.ndarray]:
+        """
+        Batch form of get_or_compute, with the same keys, metrics and coalescing.
+        Cached texts are served, texts already being computed are awaited, and
+        the rest go to a single compute call, one text per normalized key.
+        """
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        waiting: Dict[int, asyncio.Future] = {}
+        missing: Dict[Tuple[str, str], List[int]] = {}
+        for i, text in enumerate(texts):
+            vector = self.get(model_name, text)
+            if vector is not None:
+                self.hits.inc()
+                vectors[i] = vector
+                continue
+            key = (model_name, normalize_query(text))
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self.hits.inc()
+                waiting[i] = inflight
+            elif key in missing:
+                self.hits.inc()  # Repeated within the batch: computed once
+                missing[key].append(i)
+            else:
+                self.misses.inc()
+                missing[key] = [i]
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            futures = {key: loop.create_future() for key in missing}
+            self._inflight.update(futures)
+            try:
+                computed = await compute([texts[positions[0]] for positions in missing.values()])
+                for (key, positions), vector in zip(missing.items(), computed):
+                    vector = self.put(model_name, texts[positions[0]], vector)
+                    futures[key].set_result(vector)
+                    for i in positions:
+                        vectors[i] = vector
+            except asyncio.CancelledError:
+                for future in futures.values():
+                    future.cancel()
+                raise
+            except Exception as e:
+                for future in futures.values():
+                    future.set_exception(e)
+                    future.exception()
+                raise
+            finally:
+                for key in futures:
+                    self._inflight.pop(key, None)
+
+        for i, future in waiting.items():
+            vectors[i] = await asyncio.shield(future)
+        return vectors
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits.value + self.misses.value
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits.value,
+            "misses": self.misses.value,
+            "evictions": self.evictions.value,
+            "expirations": self.expirations.value,
+            "hit_rate": round(self.hits.value / lookups, 4) if lookups else None
+        }
+
+
+# Shared by every VectorStore in the process
+query_embedding_cache = QueryEmbeddingCache()
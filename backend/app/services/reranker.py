@@ -0,0 +1,162 @@
+import os
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from .query_cache import normalize_query
+from ..utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 30))
+RERANK_TIME_BUDGET_MS = float(os.getenv("RERANK_TIME_BUDGET_MS", 250))
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", 256))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", 32))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", 20000))
+# Load the model on the reranker thread at startup instead of in the first request's budget.
+# Off by default: reranking is opt-in per request, and every worker would pay for the model
+RERANKER_PRELOAD = os.getenv("RERANKER_PRELOAD", "false").lower() == "true"
+
+
+class CrossEncoderReranker:
+    """
+    Scores (query, passage) pairs with a small cross-encoder on the CPU.
+
+    All uncached pairs of a request are scored in one batch on a dedicated
+    worker thread. Pair scores are kept in an LRU keyed by normalized query and
+    passage hash, so repeated questions only pay for passages they haven't seen.
+    A request that exceeds its time budget gets None back and keeps the dense
+    order. If its batch is still queued behind another one it is dropped; a
+    batch already being scored finishes in the background and fills the cache.
+    """
+
+    def __init__(
+        self,
+        model_name: str = RERANKER_MODEL,
+        max_length: int = RERANK_MAX_LENGTH,
+        cache_size: int = RERANK_CACHE_SIZE
+    ):
+        self.model_name = model_name
+        self.max_length = max_length
+        self.cache_size = cache_size
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # One thread: the model already uses every core for a batch
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+
+        self.latency = metrics.histogram("reranker.latency_ms")
+        self.pairs_scored = metrics.counter("reranker.pairs_scored")
+        self.cache_hits = metrics.counter("reranker.cache_hits")
+        self.timeouts = metrics.counter("reranker.timeouts")
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+
+                    logger.info(f"Loading reranker model {self.model_name}")
+                    self._model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+        return self._model
+
+    def preload(self) -> None:
+        """Start loading the model on the reranker thread; requests queue behind it."""
+        self._executor.submit(lambda: self.model)
+
+    @staticmethod
+    def _pair_key(query: str, passage: str) -> Tuple[str, str]:
+        return (normalize_query(query), hashlib.sha1(passage.encode("utf-8")).hexdigest())
+
+    def _score_sync(self, query: str, passages: List[str], deadline: Optional[float] = None) -> Optional[List[float]]:
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None  # The caller has already given up; don't hold up the requests behind it
+        keys = [self._pair_key(query, passage) for passage in passages]
+        scores: Dict[int, float] = {}
+        with self._cache_lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[i] = self._cache[key]
+        self.cache_hits.inc(len(scores))
+
+        missing = [i for i in range(len(passages)) if i not in scores]
+        if missing:
+            predicted = self.model.predict(
+                [(query, passages[i]) for i in missing],
+                batch_size=RERANK_BATCH_SIZE,
+                show_progress_bar=False
+            )
+            self.pairs_scored.inc(len(missing))
+            with self._cache_lock:
+                for i, score in zip(missing, predicted):
+                    scores[i] = float(score)
+                    self._cache[keys[i]] = float(score)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return [scores[i] for i in range(len(passages))]
+
+    async def score(
+        self,
+        query: str,
+        passages: List[str],
+        budget_ms: Optional[float] = RERANK_TIME_BUDGET_MS
+    ) -> Optional[List[float]]:
+        """Return one relevance score per passage, or None if the time budget ran out."""
+        if not passages:
+            return []
+
+        start = time.perf_counter()
+        deadline = start + budget_ms / 1000.0 if budget_ms else None
+        future = asyncio.get_running_loop().run_in_executor(
+            self._executor, self._score_sync, query, passages, deadline
+        )
+        try:
+            if budget_ms:
+                # On timeout wait_for cancels the future, which drops it if it hasn't started
+                scores = await asyncio.wait_for(future, timeout=budget_ms / 1000.0)
+            else:
+                scores = await future
+        except asyncio.TimeoutError:
+            scores = None
+        if scores is None:
+            self.timeouts.inc()
+            logger.warning(f"Reranking {len(passages)} passages exceeded {budget_ms}ms, keeping dense order")
+            return None
+        self.latency.observe((time.perf_counter() - start) * 1000)
+        return scores
+
+    def stats(self) -> Dict:
+        with self._cache_lock:
+            cache_size = len(self._cache)
+        return {
+            "model_name": self.model_name,
+            "loaded": self._model is not None,
+            "cache_size": cache_size,
+            "pairs_scored": self.pairs_scored.value,
+            "cache_hits": self.cache_hits.value,
+            "timeouts": self.timeouts.value,
+            "latency_ms": self.latency.snapshot()
+        }
+
+
+_reranker: Optional[CrossEncoderReranker] = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> CrossEncoderReranker:
+    """Return the process-wide reranker, creating it on first use."""
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = CrossEncoderReranker()
+        return _reranker
@@ -0,0 +1,814 @@
+import os
+import re
+import json
+import base64
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, one process per store directory
+    fcntl = None
+
+from .vector_quantization import (
+    VECTOR_RESCORE_FACTOR,
+    VECTOR_STORAGE_DTYPE,
+    OriginalVectors,
+    QuantizedMatrix,
+    dequantize
+)
+
+logger = logging.getLogger(__name__)
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+# Where the in-process backend keeps its files; empty means memory only
+VECTOR_STORE_PATH = os.getenv(
+    "VECTOR_STORE_PATH",
+    str(Path(__file__).resolve().parent.parent / "data" / "vector_store")
+)
+# Collections at least this large are searched with an HNSW index instead of brute force
+VECTOR_ANN_THRESHOLD = int(os.getenv("VECTOR_ANN_THRESHOLD", 20000))
+VECTOR_ANN_EF = int(os.getenv("VECTOR_ANN_EF", 128))
+
+
+def create_vector_client(backend: Optional[str] = None):
+    """
+    Return a client for the configured vector backend.
+
+    Both backends expose the subset of the chromadb client/collection API that
+    VectorStore uses, so the rest of the code does not care which one it gets.
+    """
+    backend = (backend or VECTOR_BACKEND).lower()
+    if backend in ("chroma", "chromadb"):
+        import chromadb
+        return chromadb.HttpClient(
+            host=os.getenv("CHROMADB_HOST", "localhost"),
+            port=int(os.getenv("CHROMADB_PORT", 8000))
+        )
+    if backend in ("inprocess", "in-process", "local"):
+        return InProcessClient(Path(VECTOR_STORE_PATH) if VECTOR_STORE_PATH else None)
+    raise ValueError(f"Unknown vector backend: {backend}")
+
+
+def _compare(value: Any, condition: Any) -> bool:
+    if not isinstance(condition, dict):
+        return value == condition
+
+    for op, operand in condition.items():
+        if op == "$eq":
+            ok = value == operand
+        elif op == "$ne":
+            ok = value != operand
+        elif op == "$in":
+            ok = value in operand
+        elif op == "$nin":
+            ok = value not in operand
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            if value is None:
+                return False
+            ok = {
+                "$gt": lambda: value > operand,
+                "$gte": lambda: value >= operand,
+                "$lt": lambda: value < operand,
+                "$lte": lambda: value <= operand
+            }[op]()
+        else:
+            raise ValueError(f"Unsupported where operator: {op}")
+        if not ok:
+            return False
+    return True
+
+
+def _equality_values(condition: Any) -> Optional[List[Any]]:
+    """Values an equality or $in condition accepts, or None for any other condition."""
+    if not isinstance(condition, dict):
+        return [condition]
+    if set(condition) == {"$eq"}:
+        return [condition["$eq"]]
+    if set(condition) == {"$in"}:
+        return list(condition["$in"])
+    return None
+
+
+def matches_where(metadata: Optional[Dict], where: Optional[Dict]) -> bool:
+    """Evaluate a Chroma-style where clause against one metadata dict."""
+    if not where:
+        return True
+    metadata = metadata or {}
+
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif not _compare(metadata.get(key), condition):
+            return False
+    return True
+
+
+class InProcessCollection:
+    """
+    In-memory vector collection with the same call shapes as a Chroma collection.
+
+    Vectors are stored L2-normalized in a contiguous matrix and searched
+    exactly with a single matrix product. Once a collection reaches the ANN
+    threshold an HNSW index (hnswlib, shipped with chromadb) is built and kept
+    up to date incrementally. Distances are cosine distances, as with the
+    "hnsw:space": "cosine" collections used elsewhere.
+
+    The matrix can be held as float16 or int8 (storage_dtype) to cut memory
+    and snapshot size by 2x or 4x. Persistent quantized collections can keep
+    float32 originals on disk and rescore the top n_results * rescore_factor
+    candidates with them; without a directory there is nowhere to keep them
+    but memory, which would cost more than the quantization saves, so
+    rescoring is off. HNSW keeps its own float32 copy, so the savings apply
+    to exact search.
+
+    When given a directory the collection persists itself as a snapshot plus an
+    append-only operation log that is replayed on load.
+
+    Metadata is indexed by field and value (field -> value -> ids), kept up to
+    date on every write and delete. Where clauses made of equality and $in
+    conditions, joined by $and, are answered by intersecting those sets; other
+    operators are checked only against the rows the indexed conditions leave,
+    or by a scan when there are none.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        metadata: Optional[Dict] = None,
+        path: Optional[Path] = None,
+        storage_dtype: str = VECTOR_STORAGE_DTYPE,
+        rescore_factor: int = VECTOR_RESCORE_FACTOR,
+        ann_threshold: Optional[int] = None
+    ):
+        self.name = name
+        self.metadata = metadata or {}
+        self.path = path
+        self.storage_dtype = storage_dtype
+        self.rescore_factor = rescore_factor if storage_dtype != "float32" and path is not None else 0
+        if rescore_factor and storage_dtype != "float32" and path is None:
+            logger.info(f"Collection {name} is not persisted; {storage_dtype} results are not rescored")
+        self.ann_threshold = ann_threshold
+        self._lock = threading.RLock()
+        # Inode of records.jsonl and byte offset of oplog.jsonl read so far
+        self._snapshot_inode: Optional[int] = None
+        self._log_offset = 0
+        self._reset()
+
+        if self.path is not None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            with self._file_lock(exclusive=False):
+                self._load()
+
+    def _reset(self) -> None:
+        """Drop all in-memory rows, e.g. before reloading a snapshot another process wrote."""
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict]] = []
+        self._metadata_index: Dict[str, Dict[Any, Set[str]]] = {}
+        # Fields holding a value that can't be a dict key; filters on them scan
+        self._unindexed_fields: Set[str] = set()
+        self._vectors = QuantizedMatrix(self.storage_dtype)
+        self._originals = OriginalVectors(self.path / "originals.npy") if self.rescore_factor else None
+        self._size = 0
+
+        # HNSW labels are stable integers, independent of matrix rows
+        self._labels: List[int] = []
+        self._label_to_row: Dict[int, int] = {}
+        self._next_label = 0
+        self._ann = None
+        self._log_entries = 0
+
+    # ------------------------------------------------------------------
+    # Storage helpers
+
+    @property
+    def _ann_threshold(self) -> int:
+        return self.ann_threshold if self.ann_threshold is not None else VECTOR_ANN_THRESHOLD
+
+    def _ensure_capacity(self, dim: int, extra: int) -> None:
+        self._vectors.ensure_capacity(dim, self._size, self._size + extra)
+
+    def vector_memory_bytes(self) -> int:
+        """Resident bytes used by vectors: the allocated search matrix plus unsnapshotted originals."""
+        total = self._vectors.allocated_bytes()
+        if self._originals is not None:
+            total += self._originals.nbytes_in_memory()
+        return total
+
+    @staticmethod
+    def _normalize(embeddings) -> np.ndarray:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _write(
+        self,
+        ids,
+        embeddings,
+        metadatas,
+        documents,
+        mode: str,
+        normalized: bool = False,
+        keep_originals: bool = True
+    ) -> None:
+        """
+        Insert or overwrite rows. mode is 'add' (skip existing), 'upsert' or 'update'.
+        normalized skips re-normalizing vectors restored from a snapshot.
+        """
+        n = len(ids)
+        metadatas = metadatas if metadatas is not None else [None] * n
+        documents = documents if documents is not None else [None] * n
+        if embeddings is None:
+            vectors = None
+        elif normalized:
+            vectors = np.asarray(embeddings, dtype=np.float32)
+        else:
+            vectors = self._normalize(embeddings)
+        if vectors is not None:
+            self._ensure_capacity(vectors.shape[1], n)
+
+        for i, item_id in enumerate(ids):
+            row = self._rows.get(item_id)
+            if row is not None and mode == "add":
+                logger.warning(f"Add of existing embedding ID: {item_id}")
+                continue
+            if row is None and mode == "update":
+                logger.warning(f"Update of nonexistent embedding ID: {item_id}")
+                continue
+
+            if row is None:
+                if vectors is None:
+                    raise ValueError("Embeddings are required when adding new items")
+                row = self._size
+                self._size += 1
+                self._ids.append(item_id)
+                self._documents.append(documents[i])
+                self._metadatas.append(metadatas[i])
+                self._labels.append(-1)
+                self._rows[item_id] = row
+                self._index_metadata(item_id, metadatas[i])
+            else:
+                if documents[i] is not None:
+                    self._documents[row] = documents[i]
+                if metadatas[i] is not None:
+                    self._unindex_metadata(item_id, self._metadatas[row])
+                    self._metadatas[row] = (
+                        {**(self._metadatas[row] or {}), **metadatas[i]} if mode == "update" else metadatas[i]
+                    )
+                    self._index_metadata(item_id, self._metadatas[row])
+
+            if vectors is not None:
+                self._vectors.set(row, vectors[i])
+                if self._originals is not None and keep_originals:
+                    self._originals.put(item_id, vectors[i])
+                self._index_row(row)
+
+    def _remove(self, ids: List[str]) -> None:
+        for item_id in ids:
+            row = self._rows.pop(item_id, None)
+            if row is None:
+                continue
+            self._unindex_metadata(item_id, self._metadatas[row])
+            if self._originals is not None:
+                self._originals.remove(item_id)
+            label = self._labels[row]
+            if label >= 0:
+                self._label_to_row.pop(label, None)
+                if self._ann is not None:
+                    self._ann.mark_deleted(label)
+
+            # Swap the last row into the hole to keep the matrix dense
+            last = self._size - 1
+            if row != last:
+                moved_id = self._ids[last]
+                self._ids[row] = moved_id
+                self._documents[row] = self._documents[last]
+                self._metadatas[row] = self._metadatas[last]
+                self._vectors.move(row, last)
+                self._labels[row] = self._labels[last]
+                self._rows[moved_id] = row
+                if self._labels[row] >= 0:
+                    self._label_to_row[self._labels[row]] = row
+            self._ids.pop()
+            self._documents.pop()
+            self._metadatas.pop()
+            self._labels.pop()
+            self._size -= 1
+
+    # ------------------------------------------------------------------
+    # Metadata index
+
+    def _index_metadata(self, item_id: str, metadata: Optional[Dict]) -> None:
+        for field, value in (metadata or {}).items():
+            try:
+                self._metadata_index.setdefault(field, {}).setdefault(value, set()).add(item_id)
+            except TypeError:
+                self._unindexed_fields.add(field)
+
+    def _unindex_metadata(self, item_id: str, metadata: Optional[Dict]) -> None:
+        for field, value in (metadata or {}).items():
+            try:
+                ids = self._metadata_index.get(field, {}).get(value)
+            except TypeError:
+                continue
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del self._metadata_index[field][value]
+
+    def _indexed_ids(self, where: Dict) -> Tuple[Optional[Set[str]], bool]:
+        """
+        Ids the indexable conditions of where allow (None if there are none),
+        and whether where needs no further checking on them.
+        """
+        sets, exact = [], True
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    ids, clause_exact = self._indexed_ids(clause)
+                    if ids is not None:
+                        sets.append(ids)
+                    exact = exact and clause_exact and ids is not None
+                continue
+            values = None if key.startswith("$") or key in self._unindexed_fields else _equality_values(condition)
+            # Items without the field match None, and the index only holds fields that are present
+            if values is None or any(value is None for value in values):
+                exact = False
+                continue
+            index = self._metadata_index.get(key, {})
+            try:
+                sets.append(set().union(*(index.get(value, ()) for value in values)))
+            except TypeError:
+                exact = False
+        if not sets:
+            return None, False
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:]), exact
+
+    # ------------------------------------------------------------------
+    # Approximate index
+
+    def _index_row(self, row: int) -> None:
+        """Give a row a fresh HNSW label, retiring the old one."""
+        old_label = self._labels[row]
+        if old_label >= 0:
+            self._label_to_row.pop(old_label, None)
+            if self._ann is not None:
+                self._ann.mark_deleted(old_label)
+
+        label = self._next_label
+        self._next_label += 1
+        self._labels[row] = label
+        self._label_to_row[label] = row
+
+        if self._ann is not None:
+            if self._ann.get_current_count() >= self._ann.get_max_elements():
+                self._ann.resize_index(max(16, self._ann.get_max_elements() * 2))
+            self._ann.add_items(self._vectors.rows(slice(row, row + 1)), np.array([label]))
+
+    def _ensure_ann(self) -> bool:
+        """Build the HNSW index once the collection is large enough. Returns whether it is usable."""
+        if self._size < self._ann_threshold:
+            return False
+        if self._ann is not None:
+            return True
+        try:
+            import hnswlib
+        except ImportError:
+            logger.warning("hnswlib not installed; using exact search")
+            return False
+
+        logger.info(f"Building HNSW index for {self.name} ({self._size} vectors)")
+        index = hnswlib.Index(space="cosine", dim=self._vectors.dim)
+        index.init_index(max_elements=max(self._size * 2, 1024), ef_construction=200, M=16)
+        index.add_items(self._vectors.rows(slice(0, self._size)), np.array(self._labels[:self._size]))
+        index.set_ef(VECTOR_ANN_EF)
+        self._ann = index
+        return True
+
+    # ------------------------------------------------------------------
+    # Persistence
+
+    def _snapshot_paths(self):
+        return self.path / "vectors.npy", self.path / "records.jsonl", self.path / "oplog.jsonl"
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        """Hold the thread lock and, where supported, a flock shared with other processes."""
+        with self._lock:
+            if fcntl is None or self.path is None:
+                yield
+                return
+            with open(self.path / "lock", "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load(self) -> None:
+        self._refresh()
+        logger.info(f"Loaded in-process collection {self.name} with {self._size} vectors")
+
+    def _refresh(self) -> None:
+        """
+        Catch up with snapshots and log entries other processes sharing the
+        directory wrote. Call with the file lock held.
+        """
+        if self.path is None:
+            return
+        vectors_path, records_path, log_path = self._snapshot_paths()
+        try:
+            snapshot_inode = records_path.stat().st_ino
+        except FileNotFoundError:
+            snapshot_inode = None
+        try:
+            log_size = log_path.stat().st_size
+        except FileNotFoundError:
+            log_size = 0
+
+        if snapshot_inode != self._snapshot_inode or log_size < self._log_offset:
+            # Persisted (snapshot replaced, log truncated) since we last read it: start over
+            self._reset()
+            self._snapshot_inode, self._log_offset = snapshot_inode, 0
+            if snapshot_inode is not None and vectors_path.exists():
+                with open(records_path, "r", encoding="utf-8") as f:
+                    records = [json.loads(line) for line in f if line.strip()]
+                if records:
+                    self._restore_snapshot(records, vectors_path)
+        if log_size == self._log_offset:
+            return
+
+        with open(log_path, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read(log_size - self._log_offset)
+        # Leave a line still being written (or torn by a crash) for the next call
+        complete = data[:data.rfind(b"\n") + 1]
+        self._log_offset += len(complete)
+        for line in complete.decode("utf-8").splitlines():
+            try:
+                op = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            self._replay(op)
+            self._log_entries += 1
+
+    def _restore_snapshot(self, records: List[Dict], vectors_path: Path, batch_size: int = 4096) -> None:
+        """
+        Load snapshot rows in batches from a memory map. Quantized codes in the
+        current storage dtype are restored verbatim; otherwise rows are
+        re-encoded, from float32 originals when they are on disk.
+        """
+        codes = np.load(vectors_path, mmap_mode="r")
+        scales = np.load(self.path / "scales.npy") if codes.dtype == np.int8 else None
+        verbatim = codes.dtype.name in ("float32", self.storage_dtype)
+        has_originals = self._originals is not None and self._originals.open()
+        if self._originals is not None and not has_originals and codes.dtype != np.float32:
+            logger.warning(f"No float32 originals for {self.name}; rescoring applies to new vectors only")
+
+        for start in range(0, len(records), batch_size):
+            batch = records[start:start + batch_size]
+            ids = [r["id"] for r in batch]
+            vectors = self._originals.get_many(ids) if has_originals and not verbatim else None
+            from_originals = vectors is not None
+            if vectors is None:
+                stop = start + len(batch)
+                vectors = dequantize(codes[start:stop], scales[start:stop] if scales is not None else None)
+            self._write(
+                ids,
+                vectors,
+                [r.get("metadata") for r in batch],
+                [r.get("document") for r in batch],
+                mode="upsert",
+                normalized=verbatim or from_originals,
+                keep_originals=not has_originals and codes.dtype == np.float32
+            )
+
+    def _replay(self, op: Dict) -> None:
+        if op["op"] == "delete":
+            self._remove(op["ids"])
+            return
+        embeddings = None
+        if op.get("embeddings") is not None:
+            raw = base64.b64decode(op["embeddings"])
+            embeddings = np.frombuffer(raw, dtype=np.float32).reshape(len(op["ids"]), -1)
+        self._write(op["ids"], embeddings, op.get("metadatas"), op.get("documents"), mode=op["op"])
+
+    def _log(self, op: str, ids, embeddings=None, metadatas=None, documents=None) -> None:
+        """Append an operation to the log. Call with the exclusive file lock held."""
+        if self.path is None:
+            return
+        entry = {"op": op, "ids": list(ids), "metadatas": metadatas, "documents": documents}
+        if embeddings is not None:
+            entry["embeddings"] = base64.b64encode(
+                np.ascontiguousarray(embeddings, dtype=np.float32).tobytes()
+            ).decode("ascii")
+        log_path = self._snapshot_paths()[2]
+        # Appending after a torn line would glue the entry onto it
+        if log_path.exists() and log_path.stat().st_size != self._log_offset:
+            os.truncate(log_path, self._log_offset)
+        with open(log_path, "ab") as f:
+            f.write((json.dumps(entry) + "\n").encode("utf-8"))
+            f.flush()
+            self._log_offset = f.tell()
+        self._log_entries += 1
+        # Fold the log into a fresh snapshot once it outgrows the collection
+        if self._log_entries > max(100, self._size // 64):
+            self._persist()
+
+    def persist(self) -> None:
+        """Write a full snapshot and truncate the operation log."""
+        if self.path is None:
+            return
+        with self._file_lock(exclusive=True):
+            # Fold in what other processes logged, or truncating the log would lose it
+            self._refresh()
+            self._persist()
+
+    def _persist(self) -> None:
+        """Snapshot and truncate. Call with the exclusive file lock held and the log caught up."""
+        vectors_path, records_path, log_path = self._snapshot_paths()
+        if self._originals is not None:
+            self._originals.write_snapshot(
+                self._ids[:self._size],
+                self._vectors.dim,
+                lambda row: self._vectors.rows(slice(row, row + 1))[0]
+            )
+        elif (self.path / "originals.npy").exists():
+            OriginalVectors(self.path / "originals.npy").discard()
+        if self._vectors.scales is not None:
+            np.save(self.path / "scales.tmp.npy", self._vectors.scales[:self._size])
+            os.replace(self.path / "scales.tmp.npy", self.path / "scales.npy")
+        np.save(str(vectors_path) + ".tmp.npy", self._vectors.codes[:self._size])
+        with open(str(records_path) + ".tmp", "w", encoding="utf-8") as f:
+            for i in range(self._size):
+                f.write(json.dumps({
+                    "id": self._ids[i],
+                    "document": self._documents[i],
+                    "metadata": self._metadatas[i]
+                }, ensure_ascii=False) + "\n")
+        os.replace(str(vectors_path) + ".tmp.npy", vectors_path)
+        os.replace(str(records_path) + ".tmp", records_path)
+        open(log_path, "w").close()
+        self._snapshot_inode = records_path.stat().st_ino
+        self._log_offset = 0
+        self._log_entries = 0
+
+    # ------------------------------------------------------------------
+    # Chroma-compatible API
+
+    def count(self) -> int:
+        with self._file_lock(exclusive=False):
+            self._refresh()
+            return self._size
+
+    def add(self, ids, embeddings=None, metadatas=None, documents=None, **kwargs) -> None:
+        with self._file_lock(exclusive=True):
+            self._refresh()
+            self._write(ids, embeddings, metadatas, documents, mode="add")
+            self._log("add", ids, embeddings, metadatas, documents)
+
+    def upsert(self, ids, embeddings=None, metadatas=None, documents=None, **kwargs) -> None:
+        with self._file_lock(exclusive=True):
+            self._refresh()
+            self._write(ids, embeddings, metadatas, documents, mode="upsert")
+            self._log("upsert", ids, embeddings, metadatas, documents)
+
+    def update(self, ids, embeddings=None, metadatas=None, documents=None, **kwargs) -> None:
+        with self._file_lock(exclusive=True):
+            self._refresh()
+            self._write(ids, embeddings, metadatas, documents, mode="update")
+            self._log("update", ids, embeddings, metadatas, documents)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None, **kwargs) -> None:
+        with self._file_lock(exclusive=True):
+            self._refresh()
+            if where and ids is None:
+                ids = [self._ids[row] for row in self._rows_matching(where)]
+            elif where:
+                ids = [i for i in ids if i in self._rows and matches_where(self._metadatas[self._rows[i]], where)]
+            ids = list(ids or [])
+            if ids:
+                self._remove(ids)
+                self._log("delete", ids)
+
+    def _rows_matching(self, where: Optional[Dict]) -> List[int]:
+        """Rows matching where, in row order."""
+        if not where:
+            return list(range(self._size))
+        ids, exact = self._indexed_ids(where)
+        if ids is None:
+            return [row for row in range(self._size) if matches_where(self._metadatas[row], where)]
+        rows = sorted(self._rows[item_id] for item_id in ids)
+        if exact:
+            return rows
+        return [row for row in rows if matches_where(self._metadatas[row], where)]
+
+    def _embeddings(self, rows: List[int]) -> List[List[float]]:
+        """Stored vectors for rows, preferring float32 originals over dequantized codes."""
+        if not rows:
+            return []
+        vectors = self._originals.get_many([self._ids[r] for r in rows]) if self._originals is not None else None
+        if vectors is None:
+            vectors = self._vectors.rows(np.asarray(rows))
+        return vectors.tolist()
+
+    def _pack(self, rows: List[int], include: List[str]) -> Dict:
+        return {
+            "ids": [self._ids[r] for r in rows],
+            "embeddings": self._embeddings(rows) if "embeddings" in include else None,
+            "metadatas": [self._metadatas[r] for r in rows] if "metadatas" in include else None,
+            "documents": [self._documents[r] for r in rows] if "documents" in include else None,
+            "included": list(include)
+        }
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Optional[List[str]] = None,
+        **kwargs
+    ) -> Dict:
+        include = include if include is not None else ["metadatas", "documents"]
+        with self._file_lock(exclusive=False):
+            self._refresh()
+            if ids is not None:
+                rows = [self._rows[i] for i in ids if i in self._rows]
+                if where:
+                    rows = [r for r in rows if matches_where(self._metadatas[r], where)]
+            else:
+                rows = self._rows_matching(where)
+            start = offset or 0
+            rows = rows[start:start + limit] if limit is not None else rows[start:]
+            return self._pack(rows, include)
+
+    def query(
+        self,
+        query_embeddings,
+        n_results: int = 10,
+        where: Optional[Dict] = None,
+        include: Optional[List[str]] = None,
+        **kwargs
+    ) -> Dict:
+        include = include if include is not None else ["metadatas", "documents", "distances"]
+        queries = self._normalize(query_embeddings)
+        result = {"ids": [], "distances": [], "metadatas": [], "documents": [], "embeddings": []}
+
+        with self._file_lock(exclusive=False):
+            self._refresh()
+            allowed = None if not where else self._rows_matching(where)
+            for query in queries:
+                rows, distances = self._search(query, n_results, allowed)
+                packed = self._pack(rows, include)
+                result["ids"].append(packed["ids"])
+                result["distances"].append(distances if "distances" in include else None)
+                for key in ("metadatas", "documents", "embeddings"):
+                    result[key].append(packed[key])
+
+        for key in ("distances", "metadatas", "documents", "embeddings"):
+            if key not in include:
+                result[key] = None
+        result["included"] = list(include)
+        return result
+
+    def _search(self, query: np.ndarray, k: int, allowed: Optional[List[int]]):
+        if self._size == 0 or (allowed is not None and not allowed):
+            return [], []
+
+        candidate_count = self._size if allowed is None else len(allowed)
+        k = min(k, candidate_count)
+        if k <= 0:
+            return [], []
+
+        # Quantized scores pick a wider shortlist that float32 originals then rescore
+        fetch = min(k * self.rescore_factor, candidate_count) if self.rescore_factor else k
+        rows, distances = self._candidates(query, fetch, candidate_count, allowed)
+        if fetch > k:
+            rows, distances = self._rescore(query, rows, distances, k)
+        return rows, distances
+
+    def _candidates(self, query: np.ndarray, k: int, candidate_count: int, allowed: Optional[List[int]]):
+        # Small or heavily filtered candidate sets are cheaper to scan exactly
+        if candidate_count >= self._ann_threshold and self._ensure_ann():
+            allowed_labels = None
+            if allowed is not None:
+                allowed_labels = {self._labels[r] for r in allowed}
+            try:
+                labels, distances = self._ann.knn_query(
+                    query[None, :],
+                    k=k,
+                    filter=(lambda label: label in allowed_labels) if allowed_labels is not None else None
+                )
+                rows = [self._label_to_row[int(label)] for label in labels[0]]
+                return rows, [float(d) for d in distances[0]]
+            except RuntimeError:
+                # HNSW could not find k live neighbours; fall back to exact search
+                logger.debug(f"ANN search on {self.name} returned fewer than {k} results")
+
+        if allowed is None:
+            similarities = self._vectors.dot(query, self._size)
+            candidate_rows = None
+        else:
+            candidate_rows = np.asarray(allowed)
+            similarities = self._vectors.dot(query, self._size, rows=candidate_rows)
+
+        if k < len(similarities):
+            top = np.argpartition(-similarities, k - 1)[:k]
+        else:
+            top = np.arange(len(similarities))
+        top = top[np.argsort(-similarities[top])]
+
+        rows = top if candidate_rows is None else candidate_rows[top]
+        return [int(r) for r in rows], [float(1.0 - similarities[i]) for i in top]
+
+    def _rescore(self, query: np.ndarray, rows: List[int], distances: List[float], k: int):
+        """Re-rank a quantized shortlist by exact float32 cosine distance."""
+        originals = self._originals.get_many([self._ids[r] for r in rows]) if self._originals is not None else None
+        if originals is None:
+            return rows[:k], distances[:k]
+        similarities = originals @ query
+        order = np.argsort(-similarities)[:k]
+        return [rows[i] for i in order], [float(1.0 - similarities[i]) for i in order]
+
+
+class InProcessClient:
+    """Minimal stand-in for chromadb's client that manages InProcessCollections."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self._collections: Dict[str, InProcessCollection] = {}
+        self._lock = threading.Lock()
+
+    def _collection_path(self, name: str) -> Optional[Path]:
+        if self.path is None:
+            return None
+        return self.path / re.sub(r"[^A-Za-z0-9_.-]+", "_", name)
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict] = None, **kwargs) -> InProcessCollection:
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = InProcessCollection(name, metadata, self._collection_path(name))
+                self._collections[name] = collection
+            return collection
+
+    def create_collection(self, name: str, metadata: Optional[Dict] = None, **kwargs) -> InProcessCollection:
+        return self.get_or_create_collection(name, metadata)
+
+    def get_collection(self, name: str, **kwargs) -> InProcessCollection:
+        with self._lock:
+            if name in self._collections:
+                return self._collections[name]
+        path = self._collection_path(name)
+        if path is not None and path.exists():
+            return self.get_or_create_collection(name)
+        raise ValueError(f"Collection {name} does not exist.")
+
+    def list_collections(self) -> List[str]:
+        names = set(self._collections)
+        if self.path is not None and self.path.exists():
+            names.update(p.name for p in self.path.iterdir() if p.is_dir())
+        return sorted(names)
+
+    def delete_collection(self, name: str) -> None:
+        with self._lock:
+            collection = self._collections.pop(name, None)
+        path = collection.path if collection is not None else self._collection_path(name)
+        if path is not None and path.exists():
+            for child in path.iterdir():
+                child.unlink()
+            path.rmdir()
+
+
+# In-process clients are shared so every VectorStore sees the same collections
+_inprocess_clients: Dict[Optional[str], InProcessClient] = {}
+_inprocess_lock = threading.Lock()
+
+
+def get_vector_client(backend: Optional[str] = None):
+    """Like create_vector_client, but reuses one in-process client per storage path."""
+    backend = (backend or VECTOR_BACKEND).lower()
+    if backend not in ("inprocess", "in-process", "local"):
+        return create_vector_client(backend)
+    with _inprocess_lock:
+        key = VECTOR_STORE_PATH or None
+        client = _inprocess_clients.get(key)
+        if client is None:
+            client = create_vector_client(backend)
+            _inprocess_clients[key] = client
+        return client
@@ -0,0 +1,310 @@
+import os
+import json
+import time
+import random
+import tempfile
+import logging
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# float32 (default), float16 or int8
+VECTOR_STORAGE_DTYPE = os.getenv("VECTOR_STORAGE_DTYPE", "float32").lower()
+# Quantized searches rescore n_results * factor candidates with float32 originals; 0 disables
+VECTOR_RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", 4))
+
+STORAGE_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+# Quantized rows are scored in slices so the float32 working copy stays small
+SCORE_CHUNK_ROWS = 8192
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Encode float32 rows in the storage dtype.
+    int8 uses a symmetric per-row scale (max |x| / 127), returned alongside the codes.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "int8":
+        scales = np.max(np.abs(vectors), axis=1) / 127.0
+        scales = np.maximum(scales, 1e-12).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales
+    return vectors.astype(STORAGE_DTYPES[dtype]), None
+
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    vectors = np.asarray(codes).astype(np.float32)
+    if scales is not None:
+        vectors *= np.asarray(scales, dtype=np.float32)[:, None]
+    return vectors
+
+
+class QuantizedMatrix:
+    """
+    Growable row store of unit vectors kept in float32, float16 or int8.
+
+    Dot products against a float32 query dequantize one slice of rows at a
+    time, so scoring a quantized matrix never materializes a full float32 copy.
+    """
+
+    def __init__(self, dtype: str = VECTOR_STORAGE_DTYPE):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown vector storage dtype: {dtype}")
+        self.dtype = dtype
+        self.codes = np.zeros((0, 0), dtype=STORAGE_DTYPES[dtype])
+        self.scales = np.zeros(0, dtype=np.float32) if dtype == "int8" else None
+
+    @property
+    def dim(self) -> int:
+        return self.codes.shape[1]
+
+    @property
+    def capacity(self) -> int:
+        return self.codes.shape[0]
+
+    def allocated_bytes(self) -> int:
+        """Bytes held by the matrix, including capacity reserved for growth."""
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def ensure_capacity(self, dim: int, size: int, needed: int) -> None:
+        if self.dim == 0:
+            self.codes = np.zeros((max(needed, 16), dim), dtype=self.codes.dtype)
+            if self.scales is not None:
+                self.scales = np.zeros(max(needed, 16), dtype=np.float32)
+        elif self.dim != dim:
+            raise ValueError(f"Embedding dimension {dim} does not match collection dimension {self.dim}")
+        if needed > self.capacity:
+            new_capacity = max(needed, self.capacity * 2)
+            grown = np.zeros((new_capacity, dim), dtype=self.codes.dtype)
+            grown[:size] = self.codes[:size]
+            self.codes = grown
+            if self.scales is not None:
+                scales = np.zeros(new_capacity, dtype=np.float32)
+                scales[:size] = self.scales[:size]
+                self.scales = scales
+
+    def set(self, row: int, vector: np.ndarray) -> None:
+        codes, scales = quantize(vector[None, :], self.dtype)
+        self.codes[row] = codes[0]
+        if self.scales is not None:
+            self.scales[row] = scales[0]
+
+    def move(self, dst: int, src: int) -> None:
+        self.codes[dst] = self.codes[src]
+        if self.scales is not None:
+            self.scales[dst] = self.scales[src]
+
+    def rows(self, rows) -> np.ndarray:
+        """Float32 view of the given rows (a copy unless stored as float32)."""
+        if self.dtype == "float32":
+            return self.codes[rows]
+        return dequantize(self.codes[rows], self.scales[rows] if self.scales is not None else None)
+
+    def dot(self, query: np.ndarray, size: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Similarity of query with rows[:size] (or the given row indices)."""
+        if self.dtype == "float32":
+            return self.codes[:size] @ query if rows is None else self.codes[rows] @ query
+
+        count = size if rows is None else len(rows)
+        out = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SCORE_CHUNK_ROWS):
+            stop = min(start + SCORE_CHUNK_ROWS, count)
+            block = slice(start, stop) if rows is None else rows[start:stop]
+            out[start:stop] = self.rows(block) @ query
+        return out
+
+
+class OriginalVectors:
+    """
+    Float32 originals of a quantized collection, used only to rescore top candidates.
+
+    Vectors captured in the last snapshot are read from a memory-mapped .npy
+    file; anything written since lives in a small in-memory overlay that is
+    folded into the file on the next snapshot.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.ids_path = path.with_name(path.stem + "_ids.json")
+        self._snapshot: Optional[np.ndarray] = None
+        self._snapshot_rows: Dict[str, int] = {}
+        self._overlay: Dict[str, np.ndarray] = {}
+
+    def open(self) -> bool:
+        """Map the snapshot file if there is one. Returns whether it was found."""
+        if not self.path.exists() or not self.ids_path.exists():
+            return False
+        with open(self.ids_path, "r", encoding="utf-8") as f:
+            ids = json.load(f)
+        snapshot = np.load(self.path, mmap_mode="r")
+        if len(snapshot) != len(ids):
+            logger.warning(f"Ignoring {self.path}: {len(snapshot)} rows for {len(ids)} ids")
+            return False
+        self._snapshot = snapshot
+        self._snapshot_rows = {item_id: row for row, item_id in enumerate(ids)}
+        return True
+
+    def put(self, item_id: str, vector: np.ndarray) -> None:
+        self._overlay[item_id] = np.array(vector, dtype=np.float32)
+        self._snapshot_rows.pop(item_id, None)
+
+    def remove(self, item_id: str) -> None:
+        self._overlay.pop(item_id, None)
+        self._snapshot_rows.pop(item_id, None)
+
+    def get(self, item_id: str) -> Optional[np.ndarray]:
+        vector = self._overlay.get(item_id)
+        if vector is None and item_id in self._snapshot_rows:
+            vector = np.asarray(self._snapshot[self._snapshot_rows[item_id]], dtype=np.float32)
+        return vector
+
+    def get_many(self, ids: Sequence[str]) -> Optional[np.ndarray]:
+        vectors = [self.get(item_id) for item_id in ids]
+        if any(v is None for v in vectors):
+            return None
+        return np.stack(vectors) if vectors else None
+
+    def write_snapshot(self, ids: Sequence[str], dim: int, fallback: Callable[[int], np.ndarray]) -> None:
+        """
+        Stream the originals for ids, in order, to a fresh .npy file and clear
+        the overlay. fallback(position) supplies a vector for ids without one.
+        """
+        if dim == 0:
+            return
+        tmp_path = self.path.with_name(self.path.name + ".tmp.npy")
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(len(ids), dim))
+        for row, item_id in enumerate(ids):
+            vector = self.get(item_id)
+            out[row] = vector if vector is not None else fallback(row)
+        out.flush()
+        del out
+        tmp_ids = self.ids_path.with_name(self.ids_path.name + ".tmp")
+        with open(tmp_ids, "w", encoding="utf-8") as f:
+            json.dump(list(ids), f)
+        self._snapshot = None
+        os.replace(tmp_path, self.path)
+        os.replace(tmp_ids, self.ids_path)
+        self._overlay.clear()
+        self.open()
+
+    def discard(self) -> None:
+        """Drop the snapshot files, e.g. after rescoring was switched off."""
+        self._snapshot = None
+        self._snapshot_rows = {}
+        for path in (self.path, self.ids_path):
+            if path.exists():
+                path.unlink()
+
+    def nbytes_in_memory(self) -> int:
+        return sum(v.nbytes for v in self._overlay.values())
+
+
+def _read_collection(collection, page_size: int = 1000) -> Tuple[List[str], List[Optional[Dict]], np.ndarray]:
+    ids, metadatas, vectors = [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+        page_ids = page.get("ids") or []
+        if page_ids:
+            ids.extend(page_ids)
+            metadatas.extend(page.get("metadatas") or [None] * len(page_ids))
+            vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+        if len(page_ids) < page_size:
+            break
+        offset += page_size
+    matrix = np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+    return ids, metadatas, matrix
+
+
+def quantization_report(
+    collection,
+    dtypes: Iterable[str] = ("float16", "int8"),
+    k: int = 10,
+    sample_size: int = 200,
+    rescore_factor: int = VECTOR_RESCORE_FACTOR,
+    seed: int = 0
+) -> Dict:
+    """
+    Compare quantized storage with the float32 baseline on a real collection.
+
+    Every vector is loaded into a collection of each storage type, persisted
+    to a temporary directory (rescoring needs its originals on disk).
+    A random sample of stored vectors is used as queries, each query's own
+    entry excluded. Recall@k is measured against exact float32 search, with
+    and without float32 rescoring, alongside per-query latency and memory.
+    """
+    from .vector_backends import InProcessCollection
+
+    ids, metadatas, vectors = _read_collection(collection)
+    if not ids:
+        raise ValueError(f"Collection {collection.name} is empty")
+
+    rng = random.Random(seed)
+    sample = rng.sample(range(len(ids)), min(sample_size, len(ids)))
+    queries = vectors[sample]
+
+    def build(dtype: str, factor: int, path: Optional[Path] = None) -> InProcessCollection:
+        # Exact search throughout so only the storage format differs
+        target = InProcessCollection(
+            f"report_{dtype}", path=path, storage_dtype=dtype, rescore_factor=factor, ann_threshold=len(ids) + 1
+        )
+        for start in range(0, len(ids), 4096):
+            stop = start + 4096
+            target.add(ids=ids[start:stop], embeddings=vectors[start:stop], metadatas=metadatas[start:stop])
+        # Rescoring reads originals from a memory-mapped snapshot, as it would in deployment
+        target.persist()
+        return target
+
+    def run(target: InProcessCollection) -> Tuple[List[List[str]], List[float]]:
+        results, latencies = [], []
+        for query_index, query in zip(sample, queries):
+            start = time.perf_counter()
+            found = target.query(query_embeddings=[query], n_results=k + 1, include=[])["ids"][0]
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append([item_id for item_id in found if item_id != ids[query_index]][:k])
+        return results, latencies
+
+    def summarize(target: InProcessCollection, results, latencies, baseline_results=None) -> Dict:
+        summary = {
+            "memory_bytes": target.vector_memory_bytes(),
+            "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+            "latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+            "latency_ms_mean": round(float(np.mean(latencies)), 3)
+        }
+        if baseline_results is not None:
+            recalls = [
+                len(set(found) & set(expected)) / max(len(expected), 1)
+                for found, expected in zip(results, baseline_results)
+            ]
+            summary[f"recall@{k}"] = round(float(np.mean(recalls)), 4)
+        return summary
+
+    baseline = build("float32", 0)
+    baseline_results, baseline_latencies = run(baseline)
+    report = {
+        "collection": collection.name,
+        "vectors": len(ids),
+        "dimension": int(vectors.shape[1]),
+        "queries": len(sample),
+        "k": k,
+        "float32": summarize(baseline, baseline_results, baseline_latencies)
+    }
+    del baseline
+
+    for dtype in dtypes:
+        variants = [(dtype, 0)]
+        if rescore_factor:
+            variants.append((f"{dtype}+rescore", rescore_factor))
+        for label, factor in variants:
+            with tempfile.TemporaryDirectory() as tmp:
+                target = build(dtype, factor, Path(tmp))
+                results, latencies = run(target)
+                report[label] = summarize(target, results, latencies, baseline_results)
+                del target
+
+    logger.info(f"Quantization report for {collection.name}: {report}")
+    return report
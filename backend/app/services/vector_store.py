@@ -1,60 +1,246 @@
 import os
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Optional
+import asyncio
+import hashlib
+import time
+from collections import Counter
+from functools import partial
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import logging
 import numpy as np
 from scipy.special import softmax  # Softmax for better ranking
 import json
+from datetime import datetime
 from pathlib import Path
 import uuid
 
+from .embedding_registry import DEFAULT_EMBEDDING_MODEL, embedding_registry, get_embedding_model
+from .encoder_service import get_encoder_service
+from .query_batcher import get_query_batcher
+from .query_cache import query_embedding_cache
+from .embedding_cache import content_key, get_embedding_cache
+from .vector_backends import VECTOR_BACKEND, get_vector_client
+from .partitioned_collection import VECTOR_PARTITIONING, PartitionedCollection, get_partitioned_collection
+from .lexical_index import BM25Index, get_lexical_index, reciprocal_rank_fusion
+from .reranker import RERANK_CANDIDATES, get_reranker
+from .answer_cache import answer_cache
+from ..utils.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
+# Chunks encoded and written per collection call; keeps memory flat and
+# requests under Chroma's payload limit regardless of document size
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", 256))
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", 1000))
+
+# Hybrid retrieval: each side contributes n_results * factor candidates to RRF
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", 4))
+RRF_K = int(os.getenv("RRF_K", 60))
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def make_chunk_id(subject: str, grade: str, source: str, text: str, occurrence: int = 0) -> str:
+    """
+    Deterministic chunk ID derived from the source document and chunk content.
+    Repeated identical chunks within one source get an occurrence suffix.
+    """
+    source_hash = hashlib.sha1(source.encode("utf-8")).hexdigest()[:8]
+    chunk_id = f"{subject}_grade_{grade}_{source_hash}_{content_hash(text)}"
+    return f"{chunk_id}_{occurrence}" if occurrence else chunk_id
+
+def _batched(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
 class VectorStore:
-    def __init__(self, collection_name: str = "textbook_content_4"):
-        print(os.getenv("CHROMADB_HOST", "localhost"))
-        self.client = chromadb.HttpClient(
-            #host=os.getenv("CHROMADB_HOST", "chromadb"), -"- when FASTAPI from within docker
-            host="localhost",
-            port=int(os.getenv("CHROMADB_PORT", 8000))
-        )
-        self.collection = self.client.get_or_create_collection(collection_name, metadata={"hnsw:space": "cosine"})
-        self.embedding_model = SentenceTransformer("BAAI/bge-large-en-v1.5")
+    def __init__(
+        self,
+        collection_name: str = "textbook_content_4",
+        embedding_model_name: str = DEFAULT_EMBEDDING_MODEL,
+        backend: Optional[str] = None,
+        partitioned: Optional[bool] = None
+    ):
+        # "chroma" talks to the Chroma server (CHROMADB_HOST/CHROMADB_PORT);
+        # "inprocess" keeps vectors in this process (see vector_backends.py)
+        self.backend = backend or VECTOR_BACKEND
+        self.client = get_vector_client(self.backend)
+        self.query_latency = metrics.histogram(f"vector_store.query_ms.{self.backend}")
+        # Partitioned: one physical collection per subject/grade/content type,
+        # queried only where the filter can match (see partitioned_collection.py)
+        self.partitioned = VECTOR_PARTITIONING if partitioned is None else partitioned
+        if self.partitioned:
+            self.collection = get_partitioned_collection(self.client, self.backend, collection_name)
+        else:
+            self.collection = self.client.get_or_create_collection(collection_name, metadata={"hnsw:space": "cosine"})
+        self.embedding_model_name = embedding_model_name
+        self.encoder = get_encoder_service(embedding_model_name)
+        self.query_batcher = get_query_batcher(embedding_model_name)
+        self.embedding_cache = get_embedding_cache(embedding_model_name)
+        # BM25 index kept in step with the collection for hybrid queries
+        self.lexical_index = get_lexical_index(self.backend, collection_name)
+        # Cached LLM answers are dropped whenever a chunk they used changes
+        self.answer_cache = answer_cache
 
-    async def add_documents(self, chunks: List[Dict], metadata: Dict):
-        """Add document chunks to the vector store."""
-        try:
-            texts = []
-            metadatas = []
-            ids = []
+    @property
+    def embedding_model(self):
+        """Shared encoder from the process-wide registry, loaded on first use."""
+        return get_embedding_model(self.embedding_model_name)
 
-            for i, chunk in enumerate(chunks):
-                chunk_id = f"{metadata['subject']}_grade_{metadata['grade']}_{i}"
-                
-                chunk_metadata = {
-                    "subject": metadata["subject"],
-                    "grade": metadata["grade"],
-                    "page": chunk["metadata"]["page_number"],
-                    "chapter_number": chunk["metadata"]["chapter_number"],
-                    "chapter_title": chunk["metadata"]["chapter_title"]
-                }
-                
-                texts.append(chunk["text"])
-                metadatas.append(chunk_metadata)
-                ids.append(chunk_id)
+    async def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """
+        Return normalized embeddings for texts, running the model only on
+        texts that are not already in the on-disk embedding cache.
+        """
+        if self.embedding_cache is None:
+            return await self.encoder.encode(texts, normalize=True)
 
-            # Generate embeddings
-            embeddings = self.embedding_model.encode(texts).tolist()
-            embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)  # ✅ Normalize
+        # Cache reads, writes and compaction touch disk and may wait on other
+        # workers' file locks, so none of them run on the event loop
+        loop = asyncio.get_running_loop()
+        runtime = await loop.run_in_executor(None, embedding_registry.served_runtime, self.embedding_model_name)
+        keys = [content_key(self.embedding_model_name, True, text, runtime=runtime) for text in texts]
+        cached = await loop.run_in_executor(None, self.embedding_cache.get_many, keys)
 
-            # Add to collection
-            self.collection.add(
-                documents=texts,
-                metadatas=metadatas,
-                ids=ids,
-                embeddings=embeddings
+        missing = {}
+        for i, key in enumerate(keys):
+            if key not in cached and key not in missing:
+                missing[key] = i
+        logger.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} to encode")
+
+        if missing:
+            encoded = await self.encoder.encode([texts[i] for i in missing.values()], normalize=True)
+            new_entries = dict(zip(missing.keys(), encoded))
+            await loop.run_in_executor(None, self.embedding_cache.put_many, new_entries)
+            cached.update(new_entries)
+
+        return np.stack([cached[key] for key in keys])
+
+    async def _write_batches(
+        self,
+        records: Iterable[Tuple[str, str, Dict]],
+        total: int,
+        batch_size: Optional[int] = None,
+        progress_callback: Optional[Callable[[Dict], None]] = None,
+        method: str = "add"
+    ) -> List[str]:
+        """
+        Embed and write (id, text, metadata) records in batches using the
+        collection's add or upsert method.
+
+        Encoding of batch N+1 overlaps with the collection write of batch N,
+        and at most two batches are held in memory at any time.
+        """
+        batch_size = batch_size or INDEX_BATCH_SIZE
+        collection_write = getattr(self.collection, method)
+
+        def write(ids, documents, metadatas, embeddings):
+            collection_write(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+            self.lexical_index.add(ids, documents, metadatas)
+            self.answer_cache.invalidate(ids)
+
+        loop = asyncio.get_running_loop()
+        written_ids = []
+        pending_write = None
+        pending_count = 0
+        indexed = 0
+        start = time.perf_counter()
+
+        def report():
+            elapsed = time.perf_counter() - start
+            progress = {
+                "indexed": indexed,
+                "total": total,
+                "elapsed_seconds": round(elapsed, 3),
+                "chunks_per_second": round(indexed / elapsed, 2) if elapsed > 0 else None
+            }
+            logger.info(
+                f"Indexed {indexed}/{total} chunks "
+                f"({progress['chunks_per_second']} chunks/sec)"
+            )
+            if progress_callback:
+                progress_callback(progress)
+
+        for batch in _batched(records, batch_size):
+            ids, texts, metadatas = (list(column) for column in zip(*batch))
+
+            # Runs while the previous batch is still being written
+            embeddings = await self.embed_documents(texts)
+
+            if pending_write is not None:
+                await pending_write
+                indexed += pending_count
+                report()
+
+            pending_write = loop.run_in_executor(
+                None,
+                partial(
+                    write,
+                    ids=ids,
+                    documents=texts,
+                    metadatas=metadatas,
+                    embeddings=embeddings.tolist()
+                )
+            )
+            pending_count = len(ids)
+            written_ids.extend(ids)
+
+        if pending_write is not None:
+            await pending_write
+            indexed += pending_count
+            report()
+
+        return written_ids
+
+    @staticmethod
+    def _document_source(metadata: Dict) -> str:
+        """Identity of the source document; falls back to subject/grade for legacy callers."""
+        return str(metadata.get("source") or f"{metadata['subject']}_grade_{metadata['grade']}")
+
+    def _chunk_records(self, chunks: List[Dict], metadata: Dict) -> Iterator[Tuple[str, str, Dict]]:
+        """Yield (id, text, metadata) for each chunk with content-derived IDs."""
+        source = self._document_source(metadata)
+        occurrences = Counter()
+
+        for chunk in chunks:
+            text = chunk["text"]
+            text_hash = content_hash(text)
+            chunk_id = make_chunk_id(metadata["subject"], metadata["grade"], source, text, occurrences[text_hash])
+            occurrences[text_hash] += 1
+
+            chunk_metadata = {
+                "subject": metadata["subject"],
+                "grade": metadata["grade"],
+                "page": chunk["metadata"]["page_number"],
+                "chapter_number": chunk["metadata"]["chapter_number"],
+                "chapter_title": chunk["metadata"]["chapter_title"],
+                "source": source,
+                "content_hash": text_hash
+            }
+            if chunk.get("tokens"):
+                # Lets context packing budget prompts without re-tokenizing
+                chunk_metadata["tokens"] = int(chunk["tokens"])
+
+            yield chunk_id, text, chunk_metadata
+
+    async def add_documents(
+        self,
+        chunks: List[Dict],
+        metadata: Dict,
+        batch_size: Optional[int] = None,
+        progress_callback: Optional[Callable[[Dict], None]] = None
+    ):
+        """Add document chunks to the vector store, streaming them through in batches."""
+        try:
+            ids = await self._write_batches(
+                self._chunk_records(chunks, metadata),
+                total=len(chunks),
+                batch_size=batch_size,
+                progress_callback=progress_callback
             )
 
             return ids  # Return the IDs instead of the length
@@ -63,6 +249,88 @@ class VectorStore:
             logger.error(f"Error adding document: {str(e)}")
             raise
 
+    def _get_source_entries(self, source: str, page_size: int = 1000) -> Dict[str, Dict]:
+        """Return {id: metadata} for everything already indexed from a source."""
+        entries = {}
+        offset = 0
+        while True:
+            page = self.collection.get(
+                where={"source": source},
+                include=["metadatas"],
+                limit=page_size,
+                offset=offset
+            )
+            ids = page.get("ids") or []
+            entries.update(zip(ids, page.get("metadatas") or [{}] * len(ids)))
+            if len(ids) < page_size:
+                return entries
+            offset += page_size
+
+    async def reindex_documents(
+        self,
+        chunks: List[Dict],
+        metadata: Dict,
+        batch_size: Optional[int] = None,
+        progress_callback: Optional[Callable[[Dict], None]] = None
+    ) -> Dict:
+        """
+        Incrementally re-index a document against what is already stored for its source.
+
+        Only chunks whose content is new are embedded and upserted; chunks whose
+        content is unchanged but whose metadata moved (e.g. page number) get a
+        metadata-only update, and chunks no longer present are deleted. Entries
+        indexed before content-hash IDs existed carry no source and are left alone.
+        """
+        try:
+            batch_size = batch_size or INDEX_BATCH_SIZE
+            source = self._document_source(metadata)
+            records = list(self._chunk_records(chunks, metadata))
+            record_ids = {record[0] for record in records}
+            existing = self._get_source_entries(source)
+
+            new_records = [r for r in records if r[0] not in existing]
+            moved_records = [r for r in records if r[0] in existing and existing[r[0]] != r[2]]
+            removed_ids = [chunk_id for chunk_id in existing if chunk_id not in record_ids]
+
+            logger.info(
+                f"Re-indexing {source}: {len(new_records)} new, {len(moved_records)} moved, "
+                f"{len(removed_ids)} removed, {len(records) - len(new_records) - len(moved_records)} unchanged"
+            )
+
+            for batch in _batched(removed_ids, batch_size):
+                self.collection.delete(ids=batch)
+                self.lexical_index.remove(batch)
+                self.answer_cache.invalidate(batch)
+
+            for batch in _batched(moved_records, batch_size):
+                self.collection.update(
+                    ids=[r[0] for r in batch],
+                    metadatas=[r[2] for r in batch]
+                )
+                self.lexical_index.update_metadata([r[0] for r in batch], [r[2] for r in batch])
+                self.answer_cache.invalidate([r[0] for r in batch])
+
+            if new_records:
+                await self._write_batches(
+                    new_records,
+                    total=len(new_records),
+                    batch_size=batch_size,
+                    progress_callback=progress_callback,
+                    method="upsert"
+                )
+
+            return {
+                "ids": [record[0] for record in records],
+                "added": len(new_records),
+                "updated": len(moved_records),
+                "deleted": len(removed_ids),
+                "unchanged": len(records) - len(new_records) - len(moved_records)
+            }
+
+        except Exception as e:
+            logger.error(f"Error re-indexing document: {str(e)}")
+            raise
+
     async def add_exam_questions(self, exam_data: Dict) -> List[str]:
         """
         Add exam questions to the vector store using composite IDs.
@@ -114,21 +382,8 @@ class VectorStore:
                 metadatas.append(metadata)
                 ids.append(composite_qid)
 
-            # Generate embeddings for the exam documents
-            embeddings = self.embedding_model.encode(texts).tolist()
-            embeddings = np.array(embeddings)
-            embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
-            embeddings = embeddings.tolist()
-
-            # Add exam questions to the collection
-            self.collection.add(
-                ids=ids,
-                documents=texts,
-                metadatas=metadatas,
-                embeddings=embeddings
-            )
-
-            return ids
+            # Embed and add exam questions to the collection in batches
+            return await self._write_batches(zip(ids, texts, metadatas), total=len(ids))
 
         except Exception as e:
             logger.error(f"Error adding exam questions: {str(e)}")
@@ -170,9 +425,8 @@ class VectorStore:
             }
             
             # Generate embedding for the document
-            embeddings = self.embedding_model.encode([doc_text]).tolist()
-            embedding = np.array(embeddings[0])
-            embedding = embedding / np.linalg.norm(embedding)
+            embeddings = await self.embed_documents([doc_text])
+            embedding = embeddings[0]
             
             # Add to collection
             self.collection.add(
@@ -181,6 +435,8 @@ class VectorStore:
                 metadatas=[metadata],
                 embeddings=[embedding.tolist()]
             )
+            self.lexical_index.add([composite_qid], [doc_text], [metadata])
+            self.answer_cache.invalidate([composite_qid])
             
             logger.info(f"Successfully added embedding for question {original_qid}")
             return composite_qid
@@ -206,120 +462,460 @@ class VectorStore:
         else:
             return np.zeros_like(scores)  # All scores are equal
 
+    async def embed_query(self, query_text: str) -> np.ndarray:
+        """Embed a query, serving repeats from the shared LRU cache."""
+        return await query_embedding_cache.get_or_compute(
+            self.embedding_model_name,
+            query_text,
+            lambda: self.query_batcher.encode(query_text)
+        )
+
+    def _lexical_index_stale(self) -> bool:
+        """
+        The lexical index only sees this process's writes; a count that no
+        longer matches the collection means another worker changed it.
+        """
+        return not self.lexical_index.ready or self.collection.count() != len(self.lexical_index)
+
+    def _build_lexical_index(self, page_size: int = 1000) -> None:
+        """Populate the lexical index from the collection, rebuilding it when it has gone stale."""
+        if not self._lexical_index_stale():
+            return
+        logger.info(f"Building lexical index for {self.collection.name}")
+        # Searches keep using the old index until the new one is complete
+        fresh = BM25Index(self.lexical_index.k1, self.lexical_index.b)
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            ids = page.get("ids") or []
+            if ids:
+                fresh.add(ids, page.get("documents") or [""] * len(ids), page.get("metadatas"))
+            if len(ids) < page_size:
+                break
+            offset += page_size
+        fresh.ready = True
+        self.lexical_index.replace(fresh)
+        logger.info(f"Lexical index ready with {len(self.lexical_index)} documents")
+
+    async def _hybrid_search(
+        self,
+        query_text: str,
+        query_embedding: List[float],
+        where: Optional[Dict],
+        n_results: int,
+        dense: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Fuse dense and BM25 candidate lists with reciprocal-rank fusion.
+        Returns the same nested-list shape as collection.query. A dense result
+        that was already fetched (e.g. by a batch query) can be passed in.
+        """
+        candidates = max(n_results * HYBRID_CANDIDATE_FACTOR, n_results)
+        if dense is None:
+            dense = self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=candidates,
+                where=where,
+                include=["documents", "metadatas", "distances"]
+            )
+        dense_ids = (dense.get("ids") or [[]])[0]
+        known = {
+            chunk_id: (doc, meta, dist)
+            for chunk_id, doc, meta, dist in zip(
+                dense_ids,
+                (dense.get("documents") or [[]])[0],
+                (dense.get("metadatas") or [[]])[0],
+                (dense.get("distances") or [[]])[0]
+            )
+        }
+
+        if self._lexical_index_stale():
+            await asyncio.get_running_loop().run_in_executor(None, self._build_lexical_index)
+        lexical_ids = [chunk_id for chunk_id, _ in self.lexical_index.search(query_text, candidates, where)]
+
+        fused = reciprocal_rank_fusion([dense_ids, lexical_ids], k=RRF_K)[:n_results]
+
+        # Lexical-only hits need their documents and a dense distance for scoring
+        missing = [chunk_id for chunk_id, _ in fused if chunk_id not in known]
+        if missing:
+            extra = self.collection.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            query_vector = query_vector / max(np.linalg.norm(query_vector), 1e-12)
+            for chunk_id, doc, meta, emb in zip(extra["ids"], extra["documents"], extra["metadatas"], extra["embeddings"]):
+                emb = np.asarray(emb, dtype=np.float32)
+                distance = 1.0 - float(emb @ query_vector / max(np.linalg.norm(emb), 1e-12))
+                known[chunk_id] = (doc, meta, distance)
+
+        fused = [(chunk_id, score) for chunk_id, score in fused if chunk_id in known]
+        return {
+            "ids": [[chunk_id for chunk_id, _ in fused]],
+            "documents": [[known[chunk_id][0] for chunk_id, _ in fused]],
+            "metadatas": [[known[chunk_id][1] for chunk_id, _ in fused]],
+            "distances": [[known[chunk_id][2] for chunk_id, _ in fused]],
+            "fusion_scores": [[score for _, score in fused]]
+        }
+
+    async def _rerank_results(self, query_text: str, results: Dict, n_results: int) -> Dict:
+        """
+        Reorder a collection.query-shaped result by cross-encoder score and keep n_results.
+        Falls back to the incoming (dense) order when reranking fails or runs out of time.
+        """
+        documents = (results.get("documents") or [[]])[0]
+        try:
+            scores = await get_reranker().score(query_text, documents)
+        except Exception as e:
+            logger.error(f"Error reranking results, keeping dense order: {str(e)}")
+            scores = None
+
+        keys = [key for key in ("ids", "documents", "metadatas", "distances") if results.get(key)]
+        if scores is None:
+            return {key: [results[key][0][:n_results]] for key in keys}
+
+        order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)[:n_results]
+        reranked = {key: [[results[key][0][i] for i in order]] for key in keys}
+        reranked["rerank_scores"] = [[scores[i] for i in order]]
+        return reranked
+
     async def query(
         self, 
         query_text: str, 
         filters: Optional[Dict] = None,
         n_results: int = 5,
-        content_types: Optional[List[str]] = None
+        content_types: Optional[List[str]] = None,
+        hybrid: bool = False,
+        rerank: bool = False
     ) -> Dict:
-        """Query the vector store with the given query text and return relevant results."""
+        """
+        Query the vector store with the given query text and return relevant results.
+        With rerank, a larger candidate pool is rescored by a cross-encoder and cut to n_results.
+        """
         try:
             # Generate embedding for the query
-            query_embedding = self.embedding_model.encode([query_text]).tolist()[0]
-            
-            # Prepare where clause for filtering
-            where_clause = {}
-            if filters:
-                for key, value in filters.items():
-                    if value:
-                        where_clause[key] = value
-                        
-            # Add content type filter if specified
-            if content_types:
-                # We can't use $exists, so we'll try a different approach
-                if "textbook" in content_types and "exam_question" in content_types:
-                    # If both are selected, don't filter by type
-                    # This will include both typed and untyped documents
-                    pass  # Don't add type filter
-                elif "textbook" in content_types:
-                    # For textbook only, we can either:
-                    # 1. Filter for type=textbook (might miss legacy entries)
-                    # 2. Use $ne to exclude exam_questions
-                    where_clause["type"] = {"$ne": "exam_question"}
-                elif "exam_question" in content_types:
-                    # For exam questions only
-                    where_clause["type"] = "exam_question"
+            query_embedding = (await self.embed_query(query_text)).tolist()
             
+            where_clause = self._build_where_clause(filters, content_types)
             logger.info(f"Query filters: {where_clause}")
             
             # Query the collection
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                where=where_clause if where_clause else None,
-                include=["documents", "metadatas", "distances"]
-            )
+            candidate_count = max(n_results, RERANK_CANDIDATES) if rerank else n_results
+            search_start = time.perf_counter()
+            if hybrid:
+                results = await self._hybrid_search(query_text, query_embedding, where_clause, candidate_count)
+            else:
+                results = self.collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=candidate_count,
+                    where=where_clause,
+                    include=["documents", "metadatas", "distances"]
+                )
+            self.query_latency.observe((time.perf_counter() - search_start) * 1000)
+
+            if rerank:
+                results = await self._rerank_results(query_text, results, n_results)
             
             # Log the query results
             logger.info(f"Query found {len(results.get('documents', [[]])[0])} documents")
             
-            # Process and format results
-            documents = results.get("documents", [[]])[0]
-            metadatas = results.get("metadatas", [[]])[0]
-            distances = results.get("distances", [[]])[0]
+            return self._format_results(results)
+        except Exception as e:
+            logger.error(f"Error querying vector store: {str(e)}")
+            raise
+
+    async def embed_queries(self, query_texts: List[str]) -> np.ndarray:
+        """Embed many queries at once: cached ones are reused, the rest encoded in a single batch."""
+        vectors = await query_embedding_cache.get_or_compute_many(
+            self.embedding_model_name, query_texts, self.encoder.encode
+        )
+        return np.stack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    async def query_many(
+        self,
+        query_texts: List[str],
+        filters: Optional[Dict] = None,
+        n_results: int = 5,
+        content_types: Optional[List[str]] = None,
+        hybrid: bool = False,
+        rerank: bool = False
+    ) -> List[Dict]:
+        """
+        Run several queries with one encode batch and one collection.query call.
+        Returns one result per query, in order, shaped like query().
+        """
+        if not query_texts:
+            return []
+        try:
+            query_embeddings = (await self.embed_queries(query_texts)).tolist()
+            where_clause = self._build_where_clause(filters, content_types)
+
+            candidate_count = max(n_results, RERANK_CANDIDATES) if rerank else n_results
+            dense_count = max(candidate_count * HYBRID_CANDIDATE_FACTOR, candidate_count) if hybrid else candidate_count
+            search_start = time.perf_counter()
+            dense = self.collection.query(
+                query_embeddings=query_embeddings,
+                n_results=dense_count,
+                where=where_clause,
+                include=["documents", "metadatas", "distances"]
+            )
+            self.query_latency.observe((time.perf_counter() - search_start) * 1000)
+
+            formatted = []
+            for i, query_text in enumerate(query_texts):
+                results = {
+                    key: [dense[key][i]]
+                    for key in ("ids", "documents", "metadatas", "distances")
+                    if dense.get(key)
+                }
+                if hybrid:
+                    results = await self._hybrid_search(
+                        query_text, query_embeddings[i], where_clause, candidate_count, dense=results
+                    )
+                if rerank:
+                    results = await self._rerank_results(query_text, results, n_results)
+                formatted.append(self._format_results(results))
+
+            logger.info(f"Batch query of {len(query_texts)} texts took {(time.perf_counter() - search_start) * 1000:.1f}ms")
+            return formatted
+        except Exception as e:
+            logger.error(f"Error running batch query: {str(e)}")
+            raise
+
+    @staticmethod
+    def _build_where_clause(filters: Optional[Dict], content_types: Optional[List[str]]) -> Optional[Dict]:
+        """Translate query filters and content types into a collection where clause."""
+        # Prepare where clause for filtering
+        where_clause = {}
+        if filters:
+            for key, value in filters.items():
+                if value:
+                    where_clause[key] = value
+                    
+        # Add content type filter if specified
+        if content_types:
+            # We can't use $exists, so we'll try a different approach
+            if "textbook" in content_types and "exam_question" in content_types:
+                # If both are selected, don't filter by type
+                # This will include both typed and untyped documents
+                pass  # Don't add type filter
+            elif "textbook" in content_types:
+                # For textbook only, we can either:
+                # 1. Filter for type=textbook (might miss legacy entries)
+                # 2. Use $ne to exclude exam_questions
+                where_clause["type"] = {"$ne": "exam_question"}
+            elif "exam_question" in content_types:
+                # For exam questions only
+                where_clause["type"] = "exam_question"
+        
+        return where_clause if where_clause else None
+
+    @staticmethod
+    def _format_results(results: Dict) -> Dict:
+        """Shape a single-query collection.query result into the response returned by query."""
+        # Process and format results
+        documents = results.get("documents", [[]])[0]
+        metadatas = results.get("metadatas", [[]])[0]
+        distances = results.get("distances", [[]])[0]
+        
+        rerank_scores = results.get("rerank_scores", [[]])[0]
+        
+        # Compute normalized scores (1.0 = best match, 0.0 = worst match)
+        if rerank_scores:
+            # Cross-encoder scores are logits already
+            normalized_scores = softmax(rerank_scores).tolist()
+        elif distances:
+            # Adjust distance to create better spread of scores using softmax
+            adjusted_distances = [-5 * d for d in distances]  # Scale factor for better separation
+            normalized_scores = softmax(adjusted_distances).tolist()
+        else:
+            normalized_scores = []
+            
+        # Group results by content type
+        textbook_results = []
+        exam_results = []
+        
+        for i, (doc, meta, dist, score) in enumerate(zip(documents, metadatas, distances, normalized_scores)):
+            result = {
+                "document": doc,
+                "metadata": meta,
+                "distance": dist,
+                "score": score,
+                "id": results.get("ids", [[]])[0][i] if results.get("ids") else None
+            }
+            if rerank_scores:
+                result["rerank_score"] = rerank_scores[i]
             
-            # Compute normalized scores (1.0 = best match, 0.0 = worst match)
-            if distances:
-                # Adjust distance to create better spread of scores using softmax
-                adjusted_distances = [-5 * d for d in distances]  # Scale factor for better separation
-                normalized_scores = softmax(adjusted_distances).tolist()
+            # Determine content type - assume textbook if not specified or not exam_question
+            content_type = meta.get("type", "textbook")
+            if content_type != "exam_question":
+                content_type = "textbook"  # Force to textbook for any non-exam type
+            
+            # Log content type for debugging
+            logger.debug(f"Document {i} type: {content_type}")
+            
+            if content_type == "exam_question":
+                exam_results.append(result)
             else:
-                normalized_scores = []
-                
-            # Group results by content type
-            textbook_results = []
-            exam_results = []
+                textbook_results.append(result)
             
-            for i, (doc, meta, dist, score) in enumerate(zip(documents, metadatas, distances, normalized_scores)):
-                result = {
-                    "document": doc,
-                    "metadata": meta,
-                    "distance": dist,
-                    "score": score,
-                    "id": results.get("ids", [[]])[0][i] if results.get("ids") else None
-                }
-                
-                # Determine content type - assume textbook if not specified or not exam_question
-                content_type = meta.get("type", "textbook")
-                if content_type != "exam_question":
-                    content_type = "textbook"  # Force to textbook for any non-exam type
-                
-                # Log content type for debugging
-                logger.debug(f"Document {i} type: {content_type}")
-                
-                if content_type == "exam_question":
-                    exam_results.append(result)
-                else:
-                    textbook_results.append(result)
-                
-            return {
-                "documents": documents,
-                "metadatas": metadatas,
-                "distances": distances,
-                "normalized_scores": normalized_scores,
-                "chunk_ids": results.get("ids", [[]])[0] if results.get("ids") else [],
-                "textbook_results": textbook_results,
-                "exam_results": exam_results
+        return {
+            "documents": documents,
+            "metadatas": metadatas,
+            "distances": distances,
+            "normalized_scores": normalized_scores,
+            "reranked": bool(rerank_scores),
+            "chunk_ids": results.get("ids", [[]])[0] if results.get("ids") else [],
+            "textbook_results": textbook_results,
+            "exam_results": exam_results
+        }
+
+    def export_collection(self, output_path: Path, page_size: int = EXPORT_PAGE_SIZE) -> Dict:
+        """
+        Stream the collection to a backup directory, one page at a time:
+            records.jsonl   - {"id", "document", "metadata"} per line
+            embeddings.f32  - float32 rows, row i belongs to line i
+            manifest.json   - counts, dimension and embedding model
+        Memory use is bounded by page_size regardless of collection size.
+        """
+        output_path = Path(output_path)
+        output_path.mkdir(parents=True, exist_ok=True)
+        count, dim = 0, None
+        start = time.perf_counter()
+
+        try:
+            with open(output_path / "records.jsonl", "w", encoding="utf-8") as records_file, \
+                    open(output_path / "embeddings.f32", "wb") as embeddings_file:
+                while True:
+                    page = self.collection.get(
+                        limit=page_size,
+                        offset=count,
+                        include=["documents", "metadatas", "embeddings"]
+                    )
+                    ids = page.get("ids") or []
+                    if not ids:
+                        break
+
+                    embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+                    if dim is None:
+                        dim = int(embeddings.shape[1])
+                    embeddings_file.write(np.ascontiguousarray(embeddings).tobytes())
+                    for item_id, document, metadata in zip(ids, page["documents"], page["metadatas"]):
+                        records_file.write(json.dumps(
+                            {"id": item_id, "document": document, "metadata": metadata},
+                            ensure_ascii=False
+                        ) + "\n")
+
+                    count += len(ids)
+                    logger.info(f"Exported {count} records from {self.collection.name}")
+                    if len(ids) < page_size:
+                        break
+
+            manifest = {
+                "format": "vector-store-export/1",
+                "collection": self.collection.name,
+                "count": count,
+                "dimension": dim,
+                "dtype": "float32",
+                "embedding_model": self.embedding_model_name,
+                "exported_at": datetime.now().isoformat(),
+                "elapsed_seconds": round(time.perf_counter() - start, 3)
             }
+            with open(output_path / "manifest.json", "w") as f:
+                json.dump(manifest, f, indent=2)
+            return manifest
         except Exception as e:
-            logger.error(f"Error querying vector store: {str(e)}")
+            logger.error(f"Error exporting collection {self.collection.name}: {str(e)}")
             raise
 
-    def export_collection(self, output_path: Path) -> None:
-        """Export collection data to JSON file."""
-        data = {
-            "ids": self.collection.get()["ids"],
-            "documents": self.collection.get()["documents"],
-            "metadatas": self.collection.get()["metadatas"],
-            "embeddings": self.collection.get()["embeddings"]
-        }
-        with open(output_path, 'w') as f:
-            json.dump(data, f, indent=2)
+    def _read_export(self, input_path: Path, batch_size: int) -> Iterator[Tuple[List[str], List[str], List[Dict], Optional[np.ndarray]]]:
+        """Yield (ids, documents, metadatas, embeddings) batches from an export directory or legacy JSON file."""
+        if input_path.is_file():
+            # Old single-file backups; these may lack embeddings
+            with open(input_path, "r") as f:
+                data = json.load(f)
+            embeddings = data.get("embeddings")
+            for begin in range(0, len(data["ids"]), batch_size):
+                end = begin + batch_size
+                yield (
+                    data["ids"][begin:end],
+                    data["documents"][begin:end],
+                    data["metadatas"][begin:end],
+                    np.asarray(embeddings[begin:end], dtype=np.float32) if embeddings else None
+                )
+            return
+
+        with open(input_path / "manifest.json", "r") as f:
+            manifest = json.load(f)
+        if manifest.get("embedding_model") != self.embedding_model_name:
+            logger.warning(
+                f"Export was made with {manifest.get('embedding_model')}, "
+                f"collection uses {self.embedding_model_name}"
+            )
+        dim = manifest["dimension"]
+        row_bytes = dim * 4 if dim else 0
+
+        with open(input_path / "records.jsonl", "r", encoding="utf-8") as records_file, \
+                open(input_path / "embeddings.f32", "rb") as embeddings_file:
+            while True:
+                records = [json.loads(line) for line in islice(records_file, batch_size)]
+                if not records:
+                    break
+                raw = embeddings_file.read(row_bytes * len(records))
+                if len(raw) != row_bytes * len(records):
+                    raise ValueError(f"{input_path / 'embeddings.f32'} is shorter than records.jsonl")
+                yield (
+                    [r["id"] for r in records],
+                    [r["document"] for r in records],
+                    [r["metadata"] for r in records],
+                    np.frombuffer(raw, dtype=np.float32).reshape(len(records), dim)
+                )
+
+    async def restore_collection(self, input_path: Path, batch_size: Optional[int] = None) -> int:
+        """
+        Bulk-load an export into this collection in batches, reusing the stored
+        embeddings. Upserts make an interrupted restore safe to run again.
+        """
+        input_path = Path(input_path)
+        batch_size = batch_size or INDEX_BATCH_SIZE
+        restored = 0
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+
+        try:
+            for ids, documents, metadatas, embeddings in self._read_export(input_path, batch_size):
+                if embeddings is None:
+                    logger.warning(f"Backup {input_path} has no embeddings; re-embedding {len(ids)} documents")
+                    embeddings = await self.embed_documents(documents)
+
+                def write(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings):
+                    self.collection.upsert(
+                        ids=ids,
+                        documents=documents,
+                        metadatas=metadatas,
+                        embeddings=embeddings.tolist()
+                    )
+                    self.lexical_index.add(ids, documents, metadatas)
+                    self.answer_cache.invalidate(ids)
+
+                await loop.run_in_executor(None, write)
+                restored += len(ids)
+                logger.info(f"Restored {restored} records into {self.collection.name}")
+
+            logger.info(
+                f"Restored {restored} records into {self.collection.name} "
+                f"in {time.perf_counter() - start:.1f}s"
+            )
+            return restored
+        except Exception as e:
+            logger.error(f"Error restoring collection {self.collection.name} from {input_path}: {str(e)}")
+            raise
 
     def delete_collection(self) -> None:
         """Delete the current collection."""
-        self.client.delete_collection(self.collection.name)
+        if isinstance(self.collection, PartitionedCollection):
+            self.collection.drop()
+        else:
+            self.client.delete_collection(self.collection.name)
+        self.lexical_index.reset()
+        self.answer_cache.clear()
 
     async def get_embedding(self, embedding_id: str) -> Dict:
         """Get a specific embedding by its ID."""
@@ -358,6 +954,8 @@ class VectorStore:
                 ids=[embedding_id],
                 metadatas=[updated_metadata]
             )
+            self.lexical_index.update_metadata([embedding_id], [updated_metadata])
+            self.answer_cache.invalidate([embedding_id])
             
             return True
         except Exception as e:
@@ -378,6 +976,8 @@ class VectorStore:
             # Delete from collection
             logger.info(f"Deleting embedding from collection: {embedding_id}")
             self.collection.delete(ids=[embedding_id])
+            self.lexical_index.remove([embedding_id])
+            self.answer_cache.invalidate([embedding_id])
             
             logger.info(f"Successfully deleted embedding: {embedding_id}")
             return True
@@ -0,0 +1,111 @@
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence
+
+# Default bucket upper bounds, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class Counter:
+    """Monotonic counter that is safe to bump from worker threads."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def snapshot(self) -> int:
+        return self._value
+
+
+class Histogram:
+    """Fixed-bucket histogram with count, sum and approximate percentiles."""
+
+    def __init__(self, name: str, buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.name = name
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+            self._max = max(self._max, value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket containing the q-th percentile (0-100)."""
+        with self._lock:
+            if self._count == 0:
+                return None
+            target = self._count * q / 100.0
+            seen = 0
+            for index, count in enumerate(self._counts):
+                seen += count
+                if seen >= target:
+                    return self.buckets[index] if index < len(self.buckets) else self._max
+            return self._max
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            buckets = {str(bound): count for bound, count in zip(self.buckets, self._counts)}
+            buckets["+Inf"] = self._counts[-1]
+            count, total, maximum = self._count, self._sum, self._max
+        return {
+            "count": count,
+            "sum": round(total, 3),
+            "mean": round(total / count, 3) if count else None,
+            "max": round(maximum, 3),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": buckets
+        }
+
+
+class MetricsRegistry:
+    """Process-wide collection of named counters and histograms."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str) -> Counter:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Counter(name)
+            return metric
+
+    def histogram(self, name: str, buckets: Sequence[float] = LATENCY_BUCKETS_MS) -> Histogram:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Histogram(name, buckets)
+            return metric
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return sorted(self._metrics)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {name: metric.snapshot() for name, metric in sorted(metrics.items())}
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,85 @@
+import json
+import time
+import logging
+from typing import AsyncIterator, Callable, Dict, Optional
+
+from fastapi.responses import StreamingResponse
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STREAM_MEDIA_TYPES = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson"
+}
+STREAM_FORMAT_PATTERN = "^(sse|ndjson)$"
+
+ttft_histogram = metrics.histogram("stream.ttft_ms")
+stream_duration = metrics.histogram("stream.duration_ms")
+
+
+def encode_event(event: Dict, fmt: str) -> str:
+    """One event as a Server-Sent Event or an NDJSON line."""
+    data = json.dumps(event, ensure_ascii=False, default=str)
+    if fmt == "sse":
+        return f"event: {event['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+async def answer_events(
+    sources: Dict,
+    tokens: AsyncIterator[str],
+    fmt: str,
+    started_at: Optional[float] = None,
+    on_complete: Optional[Callable[[str], None]] = None,
+    extra: Optional[Dict] = None
+) -> AsyncIterator[str]:
+    """
+    Encode a streamed answer: a "sources" event, one "token" event per chunk
+    of LLM output, then "done" with timings (or "error" if generation fails).
+
+    Time to first token is measured from started_at (the request start, so
+    retrieval is included) and recorded in the stream.ttft_ms histogram.
+    """
+    started_at = started_at or time.perf_counter()
+    yield encode_event({"type": "sources", **sources}, fmt)
+
+    parts = []
+    ttft_ms = None
+    try:
+        async for token in tokens:
+            if not token:
+                continue
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - started_at) * 1000
+                ttft_histogram.observe(ttft_ms)
+            parts.append(token)
+            yield encode_event({"type": "token", "text": token}, fmt)
+    except Exception as e:
+        # Headers are already sent, so the failure has to travel in-band
+        logger.error(f"Error streaming answer: {str(e)}")
+        yield encode_event({"type": "error", "detail": str(e)}, fmt)
+        return
+
+    total_ms = (time.perf_counter() - started_at) * 1000
+    stream_duration.observe(total_ms)
+    answer = "".join(parts)
+    if on_complete:
+        on_complete(answer)
+    yield encode_event({
+        "type": "done",
+        "response": answer,
+        "ttft_ms": round(ttft_ms, 2) if ttft_ms is not None else None,
+        "total_ms": round(total_ms, 2),
+        **(extra or {})
+    }, fmt)
+
+
+def streaming_response(events: AsyncIterator[str], fmt: str) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type=STREAM_MEDIA_TYPES[fmt],
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,19 +1,9 @@
 import re
-from typing import Dict, List, Union, Any, Tuple
+from typing import Dict, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
-def clean_text_dict(d: Union[bytes, Dict, List, Any]) -> Union[str, Dict, List, Any]:
-    """Clean and decode text from various formats."""
-    if isinstance(d, bytes):
-        return d.decode('utf-8', errors='ignore')
-    if isinstance(d, dict):
-        return {k: clean_text_dict(v) for k, v in d.items()}
-    if isinstance(d, list):
-        return [clean_text_dict(item) for item in d]
-    return d
-
 def clean_raw_text2(text: str) -> Tuple[str, Dict]:
     """Clean raw text and extract metadata."""
     page_metadata = {
@@ -7,13 +7,16 @@ import json
 from datetime import datetime
 import sys
 import requests
+import time
 
 # Add backend to Python path
 backend_path = Path(__file__).parent.parent.parent / 'backend'
 sys.path.append(str(backend_path))
 
 from app.services.vector_store import VectorStore
-from app.services.llm_service import LLMService
+from app.services.embedding_registry import embedding_registry
+from app.services.llm_service import LLMService, get_llm_service
+from app.services.llm_providers import create_llm_provider
 from ..benchmarks.msmarco import MSMarcoDataset
 from ..metrics.retrieval import RetrievalMetrics
 from ..metrics.ragas_metrics import RagasEvaluator
@@ -21,15 +24,28 @@ from ..metrics.ragas_metrics import RagasEvaluator
 logger = logging.getLogger(__name__)
 
 class RAGEvaluator:
-    def __init__(self, config_path: Optional[Path] = None, api_url: str = "http://localhost:8000/api/admin/documents/query"):
+    def __init__(
+        self,
+        config_path: Optional[Path] = None,
+        api_url: str = "http://localhost:8000/api/admin/documents/query",
+        llm_provider: Optional[str] = None
+    ):
         # Use default config path if none provided
         self.config_path = config_path or Path(__file__).parent.parent / "configs" / "default.yaml"
         self.config = self._load_config(self.config_path)
         
         # Initialize services with proper paths
         try:
-            self.vector_store = VectorStore(collection_name="msmarco")
-            self.llm_service = LLMService()
+            self.vector_store = VectorStore(
+                collection_name="msmarco",
+                backend=self.config.get("vector_store", {}).get("type")
+            )
+            # "offline" benchmarks the whole pipeline without network or API quota
+            llm_provider = llm_provider or self.config.get("model", {}).get("llm_provider")
+            if llm_provider:
+                self.llm_service = LLMService(provider=create_llm_provider(llm_provider))
+            else:
+                self.llm_service = get_llm_service()
             self.traditional_metrics = RetrievalMetrics()
             self.ragas_metrics = RagasEvaluator()
             self.dataset = MSMarcoDataset()
@@ -83,12 +99,16 @@ class RAGEvaluator:
         retrieved_docs = []
         generated_answers = []
         
-        for query in queries:
-            # Get retrieved documents
-            results = await self.vector_store.query(
-                query_text=query,
-                n_results=5
-            )
+        # Retrieve for all queries in one batch
+        retrieval_start = time.perf_counter()
+        batch_results = await self.vector_store.query_many(
+            query_texts=queries,
+            n_results=5
+        )
+        retrieval_seconds = time.perf_counter() - retrieval_start
+        
+        generation_start = time.perf_counter()
+        for query, results in zip(queries, batch_results):
             retrieved_docs.append(results['documents'])
             
             # Generate answer using LLM
@@ -97,6 +117,7 @@ class RAGEvaluator:
                 contexts=results['documents']
             )
             generated_answers.append(llm_response['response'])
+        generation_seconds = time.perf_counter() - generation_start
         
         # Compute traditional retrieval metrics
         retrieval_metrics = self.traditional_metrics.evaluate_retrieval(
@@ -119,7 +140,11 @@ class RAGEvaluator:
             "config": self.config,
             "evaluation_details": {
                 "num_samples": len(queries),
-                "timestamp": datetime.now().isoformat()
+                "timestamp": datetime.now().isoformat(),
+                "embedding_models": embedding_registry.stats(),
+                "llm": self.llm_service.stats(),
+                "retrieval_seconds": round(retrieval_seconds, 3),
+                "generation_seconds": round(generation_seconds, 3)
             }
         }
 
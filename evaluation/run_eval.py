@@ -17,6 +17,13 @@ def main():
         help='Path to custom config file',
         default=None
     )
+    parser.add_argument(
+        '--llm-provider',
+        type=str,
+        choices=['openai', 'offline'],
+        default=None,
+        help='Override the LLM provider from the config'
+    )
     parser.add_argument(
         '--log-level',
         type=str,
@@ -33,12 +40,13 @@ def main():
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
     
-    asyncio.run(run_evaluation(args.config))
+    asyncio.run(run_evaluation(args.config, args.llm_provider))
 
-async def run_evaluation(config_path: str = None):
+async def run_evaluation(config_path: str = None, llm_provider: str = None):
     try:
         evaluator = RAGEvaluator(
-            config_path=Path(config_path) if config_path else None
+            config_path=Path(config_path) if config_path else None,
+            llm_provider=llm_provider
         )
         results = await evaluator.evaluate()
         
@@ -0,0 +1,142 @@
+"""
+Per-page time and peak memory of PDF text extraction, before and after
+dropping the "dict" layout.
+
+    python -m evaluation.scripts.benchmark_pdf_extraction --pdf book.pdf
+    python -m evaluation.scripts.benchmark_pdf_extraction --pages 100   # generated sample
+
+Each engine runs in its own process, so the peak resident set size of one
+does not hide the other's. Peak traced memory is the most Python memory
+allocated at once while extracting a single page.
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+import fitz
+
+# Add backend to Python path
+backend_path = Path(__file__).parent.parent.parent / 'backend'
+sys.path.append(str(backend_path))
+
+from app.services.pdf_service import page_text
+
+SAMPLE_WORDS = (
+    "cell energy photosynthesis mitochondria nucleus membrane protein enzyme gene "
+    "tissue organ system plant animal light water carbon oxygen"
+).split()
+
+
+def _decode(value):
+    # The recursive walk the old extraction ran over both layouts
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='ignore')
+    if isinstance(value, dict):
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+
+def legacy_page_text(page) -> str:
+    """Extraction before the lean engine: both layouts requested and decoded, only blocks used."""
+    text_dict = _decode({"text": page.get_text("dict"), "blocks": page.get_text("blocks")})
+    return " ".join(str(block[4]) for block in text_dict["blocks"] if isinstance(block, tuple) and len(block) > 4)
+
+
+ENGINES = {
+    "dict+blocks": legacy_page_text,
+    "blocks": page_text
+}
+
+
+def make_sample_pdf(path: Path, pages: int) -> None:
+    """Textbook-like pages: a unit header, four paragraphs and a photo."""
+    doc = fitz.open()
+    # Noise doesn't compress, so the photo weighs about what a scanned figure does
+    photo = fitz.Pixmap(fitz.csRGB, 600, 400, random.Random(0).randbytes(600 * 400 * 3), False)
+    for p in range(pages):
+        page = doc.new_page()
+        page.insert_text((50, 30), f"UNIT {p // 30 + 1}: Biology and Life", fontsize=10)
+        y = 50
+        for paragraph in range(4):
+            words = [SAMPLE_WORDS[(p * 31 + paragraph * 7 + w * 13) % len(SAMPLE_WORDS)] for w in range(60)]
+            page.insert_textbox(fitz.Rect(50, y, 550, y + 110), " ".join(words).capitalize() + ".", fontsize=9)
+            y += 115
+        page.insert_image(fitz.Rect(100, y, 500, y + 250), pixmap=photo)
+    doc.save(str(path))
+
+
+def run_engine(name: str, pdf_path: str, max_pages: Optional[int] = None) -> Dict:
+    extract = ENGINES[name]
+    seconds, peaks, chars = [], [], 0
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    with fitz.open(pdf_path) as doc:
+        for page_num in range(min(len(doc), max_pages or len(doc))):
+            page = doc[page_num]
+            tracemalloc.reset_peak()
+            start = time.perf_counter()
+            text = extract(page)
+            seconds.append(time.perf_counter() - start)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            chars += len(text)
+    tracemalloc.stop()
+
+    ordered = sorted(seconds)
+    return {
+        "engine": name,
+        "pages": len(seconds),
+        "characters": chars,
+        "page_ms_mean": round(statistics.mean(seconds) * 1000, 3),
+        "page_ms_p95": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 3),
+        "total_seconds": round(sum(seconds), 3),
+        "page_peak_kb_max": round(max(peaks) / 1024, 1),
+        "page_peak_kb_mean": round(statistics.mean(peaks) / 1024, 1),
+        # Growth of the process's peak RSS during extraction, native MuPDF memory included
+        "rss_growth_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark PDF page text extraction')
+    parser.add_argument('--pdf', type=str, default=None, help='PDF to extract; a sample is generated if omitted')
+    parser.add_argument('--pages', type=int, default=100, help='Pages in the generated sample')
+    parser.add_argument('--max-pages', type=int, default=None, help='Only extract the first N pages')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = args.pdf
+        if not pdf_path:
+            pdf_path = str(Path(tmp_dir) / "sample.pdf")
+            make_sample_pdf(Path(pdf_path), args.pages)
+
+        results = []
+        context = multiprocessing.get_context("spawn")
+        for name in ENGINES:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                results.append(pool.submit(run_engine, name, pdf_path, args.max_pages).result())
+
+    before, after = results
+    if before["characters"] != after["characters"]:
+        print(f"Warning: engines extracted different text ({before['characters']} vs {after['characters']} characters)")
+    print(json.dumps({
+        "pdf": args.pdf or f"generated sample ({args.pages} pages)",
+        "results": results,
+        "speedup": round(before["page_ms_mean"] / after["page_ms_mean"], 2) if after["page_ms_mean"] else None,
+        "page_peak_reduction": round(1 - after["page_peak_kb_max"] / before["page_peak_kb_max"], 3)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import pytest
+from app.services.answer_cache import SemanticAnswerCache
+
+ANSWER = {"response": "Photosynthesis makes glucose.", "model": "test"}
+
+@pytest.mark.unit
+def test_similar_query_over_same_chunks_hits():
+    cache = SemanticAnswerCache(max_size=10, threshold=0.95, name="test_answer_cache_hit")
+    cache.put([1.0, 0.0, 0.0], ["a", "b"], ANSWER, "textbook")
+
+    hit = cache.get([0.99, 0.05, 0.0], ["b", "a"], "textbook")
+
+    assert hit["response"] == ANSWER["response"]
+    assert hit["cached"] is True
+    assert cache.stats()["hit_rate"] == 1.0
+
+@pytest.mark.unit
+def test_dissimilar_query_or_different_chunks_miss():
+    cache = SemanticAnswerCache(max_size=10, threshold=0.95, name="test_answer_cache_miss")
+    cache.put([1.0, 0.0, 0.0], ["a", "b"], ANSWER, "textbook")
+
+    assert cache.get([0.0, 1.0, 0.0], ["a", "b"], "textbook") is None
+    assert cache.get([1.0, 0.0, 0.0], ["a", "c"], "textbook") is None
+    assert cache.get([1.0, 0.0, 0.0], ["a", "b"], "other") is None
+    assert cache.stats()["misses"] == 3
+
+@pytest.mark.unit
+def test_invalidate_drops_answers_using_chunk():
+    cache = SemanticAnswerCache(max_size=10, name="test_answer_cache_invalidate")
+    cache.put([1.0, 0.0], ["a", "b"], ANSWER)
+    cache.put([0.0, 1.0], ["c"], ANSWER)
+
+    assert cache.invalidate(["b"]) == 1
+
+    assert cache.get([1.0, 0.0], ["a", "b"]) is None
+    assert cache.get([0.0, 1.0], ["c"]) is not None
+
+@pytest.mark.unit
+def test_evicts_least_recently_used():
+    cache = SemanticAnswerCache(max_size=2, name="test_answer_cache_evict")
+    cache.put([1.0, 0.0], ["a"], ANSWER)
+    cache.put([1.0, 0.0], ["b"], ANSWER)
+    cache.get([1.0, 0.0], ["a"])
+    cache.put([1.0, 0.0], ["c"], ANSWER)
+
+    assert cache.get([1.0, 0.0], ["b"]) is None
+    assert cache.get([1.0, 0.0], ["a"]) is not None
+    assert cache.stats()["evictions"] == 1
@@ -13,7 +13,7 @@ def test_health_check(test_client):
 def test_query_documents(test_client, mock_vector_store, mock_llm_service, mocker):
     # Mock the services
     mocker.patch('app.main.vector_store', mock_vector_store)
-    mocker.patch('app.main.LLMService', return_value=mock_llm_service)
+    mocker.patch('app.main.get_llm_service', return_value=mock_llm_service)
     
     query_data = {
         "query": "test query",
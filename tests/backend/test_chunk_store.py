@@ -0,0 +1,72 @@
+import json
+import pytest
+from app.services.chunk_store import ChunkStore
+
+def make_chunks(n, start=0):
+    return [{"text": f"Chunk {i} about cells", "metadata": {"page_number": i // 3 + 1}} for i in range(start, start + n)]
+
+@pytest.mark.unit
+def test_append_count_and_page(tmp_path):
+    store = ChunkStore(tmp_path)
+    assert store.append(make_chunks(10)) == 0
+    assert store.append(make_chunks(5, start=10)) == 10
+
+    assert store.count() == 15
+    assert [c["text"] for c in store.read(12, 24)] == ["Chunk 12 about cells", "Chunk 13 about cells", "Chunk 14 about cells"]
+    assert store.get(4)["metadata"] == {"page_number": 2}
+    assert store.get(15) is None
+    assert len(list(store)) == 15
+
+@pytest.mark.unit
+def test_status_goes_to_side_file(tmp_path):
+    store = ChunkStore(tmp_path)
+    store.append(make_chunks(3))
+    corpus = (tmp_path / ChunkStore.CHUNKS_FILE).read_bytes()
+
+    store.set_status({1: {"indexed": True, "embedding_id": "a"}})
+    store.set_status({1: {"indexed": True, "embedding_id": "b"}, 2: {"indexed": True, "embedding_id": "c"}})
+
+    assert (tmp_path / ChunkStore.CHUNKS_FILE).read_bytes() == corpus
+    chunks = ChunkStore(tmp_path).read()
+    assert "vector_store_status" not in chunks[0]
+    assert chunks[1]["vector_store_status"]["embedding_id"] == "b"
+    assert "vector_store_status" not in store.read(with_status=False)[2]
+
+@pytest.mark.unit
+def test_truncate_drops_chunks_and_their_status(tmp_path):
+    store = ChunkStore(tmp_path)
+    store.append(make_chunks(6))
+    store.set_status({1: {"embedding_id": "keep"}, 4: {"embedding_id": "drop"}})
+
+    store.truncate(3)
+    store.append(make_chunks(2, start=100))
+
+    assert store.count() == 5
+    assert store.get(3)["text"] == "Chunk 100 about cells"
+    assert "vector_store_status" not in store.get(4)
+    assert store.get(1)["vector_store_status"] == {"embedding_id": "keep"}
+
+@pytest.mark.unit
+def test_unindexed_tail_from_a_crash_is_ignored(tmp_path):
+    store = ChunkStore(tmp_path)
+    store.append(make_chunks(2))
+    # The line was written but its offset never was
+    with open(tmp_path / ChunkStore.CHUNKS_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"text": "orphan"}) + "\n")
+
+    assert store.get(1)["text"] == "Chunk 1 about cells"
+    store.append(make_chunks(1, start=2))
+    assert [c["text"] for c in store.read()] == [f"Chunk {i} about cells" for i in range(3)]
+
+@pytest.mark.unit
+def test_converts_legacy_all_chunks_file(tmp_path):
+    legacy = make_chunks(2)
+    legacy[0]["vector_store_status"] = {"indexed": True, "embedding_id": "old"}
+    (tmp_path / "all_chunks.json").write_text(json.dumps(legacy, indent=2))
+
+    assert ChunkStore.exists(tmp_path)
+    store = ChunkStore(tmp_path)
+
+    assert store.count() == 2
+    assert store.get(0)["vector_store_status"]["embedding_id"] == "old"
+    assert store.read(with_status=False)[0] == make_chunks(1)[0]
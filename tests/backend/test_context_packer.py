@@ -0,0 +1,48 @@
+import pytest
+from app.services.context_packer import pack_context
+
+FIRST = "Cells are the basic unit of life.\n\nThe nucleus controls the cell."
+# create_chunks carries the last paragraph of a chunk over into the next one
+SECOND = "The nucleus controls the cell.\n\nMitochondria release energy."
+
+@pytest.mark.unit
+def test_removes_overlap_between_adjacent_chunks():
+    packed = pack_context(
+        [FIRST, SECOND],
+        [{"tokens": 14}, {"tokens": 12}],
+        scores=[0.6, 0.4],
+        chunk_ids=["c1", "c2"],
+        token_budget=1000
+    )
+
+    assert packed["contexts"] == [FIRST, "Mitochondria release energy."]
+    assert packed["chunk_ids"] == ["c1", "c2"]
+    assert packed["tokens_original"] == 26
+    assert packed["duplicate_tokens_removed"] > 0
+    assert packed["tokens_saved"] == packed["tokens_original"] - packed["tokens_used"]
+
+@pytest.mark.unit
+def test_orders_by_score_and_respects_budget():
+    documents = ["low relevance", "best match", "middle"]
+    metadatas = [{"tokens": 50}, {"tokens": 60}, {"tokens": 30}]
+
+    packed = pack_context(documents, metadatas, scores=[0.1, 0.7, 0.2], chunk_ids=["a", "b", "c"], token_budget=100)
+
+    # "low relevance" no longer fits once the two better chunks are in
+    assert packed["chunk_ids"] == ["b", "c"]
+    assert packed["tokens_used"] == 90
+    assert packed["chunks_dropped"] == 1
+    assert packed["tokens_saved"] == 50
+
+@pytest.mark.unit
+def test_fully_duplicated_chunk_is_skipped():
+    packed = pack_context([FIRST, FIRST], [{"tokens": 14}, {"tokens": 14}], token_budget=1000)
+
+    assert packed["contexts"] == [FIRST]
+    assert packed["duplicate_tokens_removed"] == 14
+
+@pytest.mark.unit
+def test_counts_tokens_when_metadata_has_none():
+    packed = pack_context(["An exam question about photosynthesis"], [{}], token_budget=1000)
+
+    assert packed["tokens_used"] > 0
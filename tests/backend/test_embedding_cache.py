@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from app.services.embedding_cache import PersistentEmbeddingCache, content_key
+
+@pytest.mark.unit
+def test_content_key_depends_on_model_runtime_and_normalization():
+    key = content_key("model-a", True, "text")
+    assert key == content_key("model-a", True, "text", runtime="torch")
+    assert key != content_key("model-b", True, "text")
+    assert key != content_key("model-a", False, "text")
+    assert key != content_key("model-a", True, "text", runtime="int8")
+
+@pytest.mark.unit
+def test_round_trip_survives_reopen(test_data_dir):
+    cache = PersistentEmbeddingCache(test_data_dir, model_name="test-model", max_rows=100)
+    cache.put_many({"a": np.array([1.0, 0.0]), "b": np.array([0.0, 1.0])})
+
+    reopened = PersistentEmbeddingCache(test_data_dir, model_name="test-model", max_rows=100)
+    found = reopened.get_many(["a", "b", "missing"])
+
+    assert set(found) == {"a", "b"}
+    assert np.array_equal(found["b"], [0.0, 1.0])
+    assert reopened.stats()["misses"] == 1
+
+@pytest.mark.unit
+def test_existing_keys_are_not_rewritten(test_data_dir):
+    cache = PersistentEmbeddingCache(test_data_dir, model_name="test-model", max_rows=100)
+    cache.put_many({"a": np.array([1.0, 0.0])})
+    cache.put_many({"a": np.array([5.0, 5.0])})
+
+    assert cache.stats()["rows_on_disk"] == 1
+    assert np.array_equal(cache.get_many(["a"])["a"], [1.0, 0.0])
+
+@pytest.mark.unit
+def test_size_cap_triggers_compaction(test_data_dir):
+    cache = PersistentEmbeddingCache(test_data_dir, model_name="test-model", max_rows=10)
+    for i in range(12):
+        cache.put_many({f"key-{i}": np.array([float(i), 1.0])})
+
+    stats = cache.stats()
+    assert stats["rows_on_disk"] <= 10
+    # The most recent entries survive compaction
+    assert "key-11" in cache.get_many(["key-11"])
+
+    reopened = PersistentEmbeddingCache(test_data_dir, model_name="test-model", max_rows=10)
+    assert np.array_equal(reopened.get_many(["key-11"])["key-11"], [11.0, 1.0])
+
+@pytest.mark.unit
+def test_model_mismatch_is_rejected(test_data_dir):
+    cache = PersistentEmbeddingCache(test_data_dir, model_name="test-model")
+    cache.put_many({"a": np.array([1.0])})
+
+    with pytest.raises(ValueError):
+        PersistentEmbeddingCache(test_data_dir, model_name="other-model")
+
+@pytest.mark.unit
+def test_workers_sharing_a_directory_see_each_others_rows(test_data_dir):
+    # Two instances on one directory stand in for two worker processes
+    first = PersistentEmbeddingCache(test_data_dir, model_name="test-model", max_rows=100)
+    second = PersistentEmbeddingCache(test_data_dir, model_name="test-model", max_rows=100)
+    first.put_many({"a": np.array([1.0, 0.0])})
+    second.put_many({"b": np.array([0.0, 1.0])})
+
+    assert np.array_equal(second.get_many(["a"])["a"], [1.0, 0.0])
+    assert np.array_equal(first.get_many(["b"])["b"], [0.0, 1.0])
+
+    first.compact(max_rows=1)
+    found = second.get_many(["a", "b"])
+    assert len(found) == 1
+    assert second.stats()["rows_on_disk"] == 1
+
+@pytest.mark.unit
+def test_torn_index_line_is_dropped_before_appending(test_data_dir):
+    cache = PersistentEmbeddingCache(test_data_dir, model_name="test-model", max_rows=100)
+    cache.put_many({"a": np.array([1.0, 0.0])})
+    with open(cache.index_path, "a") as f:
+        f.write("b\t1")  # Crash mid-line; no vector for row 1 either
+
+    reopened = PersistentEmbeddingCache(test_data_dir, model_name="test-model", max_rows=100)
+    reopened.put_many({"c": np.array([0.0, 1.0])})
+
+    again = PersistentEmbeddingCache(test_data_dir, model_name="test-model", max_rows=100)
+    assert set(again.get_many(["a", "b", "c"])) == {"a", "c"}
+    assert np.array_equal(again.get_many(["c"])["c"], [0.0, 1.0])
+
+@pytest.mark.unit
+def test_cache_directory_is_created_on_first_write(test_data_dir):
+    cache_dir = test_data_dir / "not_yet_written"
+    cache = PersistentEmbeddingCache(cache_dir, model_name="test-model")
+    assert cache.get_many(["missing"]) == {}
+    assert not cache_dir.exists()
+
+    cache.put_many({"a": np.ones(4, dtype=np.float32)})
+    assert cache_dir.exists()
+    assert list(PersistentEmbeddingCache(cache_dir, model_name="test-model").get_many(["a"])) == ["a"]
@@ -0,0 +1,54 @@
+import pytest
+from unittest.mock import Mock
+from app.services.embedding_registry import EmbeddingModelRegistry
+
+@pytest.fixture
+def mock_sentence_transformer(mocker):
+    def make_model(*args, **kwargs):
+        model = Mock()
+        model.parameters.return_value = []
+        model.buffers.return_value = []
+        model.state_dict.return_value = {}
+        model.get_sentence_embedding_dimension.return_value = 1024
+        return model
+    return mocker.patch(
+        'app.services.embedding_registry.SentenceTransformer',
+        side_effect=make_model
+    )
+
+@pytest.mark.unit
+def test_model_loaded_once_per_key(mock_sentence_transformer):
+    registry = EmbeddingModelRegistry()
+
+    first = registry.get("test-model")
+    second = registry.get("test-model")
+
+    assert first is second
+    assert mock_sentence_transformer.call_count == 1
+
+@pytest.mark.unit
+def test_settings_are_part_of_key(mock_sentence_transformer):
+    registry = EmbeddingModelRegistry()
+
+    cpu_model = registry.get("test-model", device="cpu")
+    default_model = registry.get("test-model")
+
+    assert cpu_model is not default_model
+    assert mock_sentence_transformer.call_count == 2
+
+@pytest.mark.unit
+def test_stats_report_load_time_and_memory(mock_sentence_transformer):
+    registry = EmbeddingModelRegistry()
+    assert registry.stats() == []
+
+    registry.get("test-model")
+    stats = registry.stats()
+
+    assert len(stats) == 1
+    assert stats[0]["model_name"] == "test-model"
+    assert stats[0]["load_time_seconds"] >= 0
+    assert stats[0]["memory_bytes"] == 0
+    assert registry.is_loaded("test-model")
+
+    assert registry.unload("test-model")
+    assert not registry.is_loaded("test-model")
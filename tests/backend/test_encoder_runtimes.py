@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+from app.services import encoder_runtimes
+from app.services.embedding_registry import EmbeddingModelRegistry
+from app.services.encoder_runtimes import benchmark, build_runtime, consistency_check
+
+VOCAB = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + [chr(c) for c in range(97, 123)] + [
+    "the", "cell", "plant", "atom", "energy", "what", "is", "of", "and", "##s"
+]
+
+@pytest.fixture
+def tiny_model(tmp_path):
+    """A small randomly initialised BERT sentence encoder built locally (no downloads)."""
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+    from sentence_transformers import SentenceTransformer, models
+
+    model_dir = tmp_path / "tiny-bert"
+    model_dir.mkdir()
+    (model_dir / "vocab.txt").write_text("\n".join(VOCAB))
+    BertTokenizerFast(str(model_dir / "vocab.txt")).save_pretrained(str(model_dir))
+    config = BertConfig(
+        vocab_size=len(VOCAB), hidden_size=32, num_hidden_layers=2,
+        num_attention_heads=2, intermediate_size=64, max_position_embeddings=64
+    )
+    BertModel(config).save_pretrained(str(model_dir))
+
+    transformer = models.Transformer(str(model_dir), max_seq_length=32)
+    return SentenceTransformer(modules=[transformer, models.Pooling(32, pooling_mode="cls"), models.Normalize()])
+
+@pytest.mark.unit
+def test_torch_int8_runtime_stays_within_tolerance(tiny_model):
+    candidate = build_runtime(tiny_model, "torch-int8", "tiny-bert")
+
+    result = consistency_check(tiny_model, candidate, tolerance=0.05)
+
+    assert candidate is not tiny_model
+    assert result["passed"]
+    assert result["max_cosine_distance"] <= 0.05
+
+@pytest.mark.unit
+def test_onnx_runtime_matches_reference(tiny_model, tmp_path, monkeypatch):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    monkeypatch.setattr(encoder_runtimes, "EMBEDDING_ONNX_DIR", tmp_path / "onnx")
+
+    candidate = build_runtime(tiny_model, "onnx", "tiny-bert")
+
+    assert consistency_check(tiny_model, candidate, tolerance=1e-4)["passed"]
+    assert candidate.encode(["the plant cell"]).shape == (1, 32)
+
+@pytest.mark.unit
+def test_benchmark_reports_latency_and_throughput(tiny_model):
+    result = benchmark(tiny_model, batch_size=8, repeats=2)
+
+    assert result["query_latency_ms_p50"] >= 0
+    assert result["throughput_texts_per_second"] > 0
+
+@pytest.mark.unit
+def test_registry_serves_torch_when_runtime_drifts(mocker, tiny_model):
+    mocker.patch("app.services.embedding_registry.SentenceTransformer", return_value=tiny_model)
+    drifting = mocker.Mock()
+    drifting.encode.side_effect = lambda texts, **kwargs: np.random.default_rng(0).normal(size=(len(texts), 32))
+    mocker.patch("app.services.embedding_registry.build_runtime", return_value=drifting)
+    registry = EmbeddingModelRegistry(runtime="onnx")
+
+    model = registry.get("tiny-bert")
+
+    assert model is tiny_model
+    stats = registry.stats()[0]
+    assert stats["requested_runtime"] == "onnx"
+    assert stats["runtime"] == "torch"
+    assert not stats["consistency"]["passed"]
+
+@pytest.mark.unit
+def test_memory_counts_packed_int8_weights(tiny_model):
+    import torch
+    linear_weights = sum(
+        module.weight.numel() for module in tiny_model.modules() if isinstance(module, torch.nn.Linear)
+    )
+    fp32_bytes = EmbeddingModelRegistry._model_memory_bytes(tiny_model)
+
+    int8_bytes = EmbeddingModelRegistry._model_memory_bytes(build_runtime(tiny_model, "torch-int8", "tiny-bert"))
+
+    # Linear weights shrink from 4 bytes to 1 each; they don't disappear
+    assert int8_bytes >= fp32_bytes - 3 * linear_weights
+    assert int8_bytes < fp32_bytes
+
+@pytest.mark.unit
+def test_benchmark_builds_runtimes_from_one_reference(mocker, tiny_model):
+    loader = mocker.patch("app.services.embedding_registry.SentenceTransformer", return_value=tiny_model)
+    build = mocker.patch("app.services.embedding_registry.build_runtime", wraps=build_runtime)
+    registry = EmbeddingModelRegistry(runtime="torch")
+
+    results = registry.benchmark_runtimes("tiny-bert", runtimes=["torch", "torch-int8"])
+
+    assert loader.call_count == 1
+    assert all(call.args[0] is tiny_model for call in build.call_args_list)
+    assert results["torch-int8"]["memory_bytes"] < results["torch"]["memory_bytes"]
+    assert registry.stats() == []
+
+@pytest.mark.unit
+def test_select_runtime_saves_fastest_runtime_within_tolerance(mocker, tiny_model, tmp_path, monkeypatch):
+    monkeypatch.setattr(encoder_runtimes, "EMBEDDING_RUNTIME_CHOICE_FILE", tmp_path / "embedding_runtime.json")
+    mocker.patch("app.services.embedding_registry.SentenceTransformer", return_value=tiny_model)
+    def fake_benchmark(encoder):
+        latency = 10.0 if encoder is tiny_model else 5.0
+        return {"query_latency_ms_p50": latency, "throughput_texts_per_second": 1000 / latency, "batch_size": 32}
+    mocker.patch("app.services.embedding_registry.benchmark", side_effect=fake_benchmark)
+
+    selected = EmbeddingModelRegistry(runtime="auto").select_runtime("tiny-bert", runtimes=["torch", "torch-int8"])
+
+    assert selected["runtime"] == "torch-int8"
+    assert selected["results"]["torch-int8"]["consistency"]["passed"]
+    assert EmbeddingModelRegistry(runtime="auto").default_runtime("tiny-bert") == "torch-int8"
+    assert EmbeddingModelRegistry(runtime="auto").default_runtime("other-model") == "torch"
+    assert EmbeddingModelRegistry(runtime="torch").default_runtime("tiny-bert") == "torch"
+
+    # A faster runtime that drifts from the reference is never chosen
+    mocker.patch("app.services.embedding_registry.consistency_check", return_value={"passed": False})
+    assert EmbeddingModelRegistry().select_runtime("tiny-bert", runtimes=["torch", "torch-int8"])["runtime"] == "torch"
@@ -0,0 +1,61 @@
+import asyncio
+import threading
+import time
+import numpy as np
+import pytest
+from unittest.mock import Mock
+from app.services.encoder_service import EncoderService
+
+@pytest.fixture
+def slow_model(mocker):
+    state = {"active": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def encode(texts, **kwargs):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+    model = Mock()
+    model.encode.side_effect = encode
+    mocker.patch('app.services.encoder_service.get_embedding_model', return_value=model)
+    return state
+
+@pytest.mark.unit
+async def test_encode_returns_normalized_vectors(slow_model):
+    service = EncoderService(model_name="test-model", max_workers=1, max_concurrency=1)
+
+    embeddings = await service.encode(["a", "b"], normalize=True)
+
+    assert embeddings.shape == (2, 4)
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0)
+    service.shutdown()
+
+@pytest.mark.unit
+async def test_concurrency_limit_is_respected(slow_model):
+    service = EncoderService(model_name="test-model", max_workers=4, max_concurrency=2)
+
+    await asyncio.gather(*(service.encode([f"text {i}"]) for i in range(6)))
+
+    assert slow_model["peak"] <= 2
+    service.shutdown()
+
+@pytest.mark.unit
+async def test_event_loop_not_blocked(slow_model):
+    service = EncoderService(model_name="test-model", max_workers=1, max_concurrency=1)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        for _ in range(5):
+            await asyncio.sleep(0.005)
+            ticks += 1
+
+    await asyncio.gather(service.encode(["slow"]), ticker())
+
+    assert ticks == 5
+    service.shutdown()
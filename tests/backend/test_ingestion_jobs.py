@@ -0,0 +1,169 @@
+import json
+import asyncio
+import pytest
+from app.services.ingestion_jobs import IngestionJobQueue, index_chunks_folder
+from app.services.chunk_store import ChunkStore
+
+class StageRecorder:
+    """Stage handlers that record their calls and can be told to fail once."""
+
+    def __init__(self, fail_once=()):
+        self.calls = []
+        self.fail_once = set(fail_once)
+
+    def handler(self, name):
+        async def run(job, update):
+            self.calls.append(name)
+            update(progress={"done": 1, "total": 1})
+            if name in self.fail_once:
+                self.fail_once.discard(name)
+                raise RuntimeError(f"{name} crashed")
+            return {name: True}
+        return run
+
+    def queue(self, jobs_dir, stage_limits=None):
+        return IngestionJobQueue(
+            {"extract": self.handler("extract"), "index": self.handler("index")},
+            stage_limits=stage_limits,
+            jobs_dir=jobs_dir
+        )
+
+@pytest.mark.unit
+async def test_job_runs_stages_and_reports_timings(tmp_path):
+    recorder = StageRecorder()
+    queue = recorder.queue(tmp_path)
+
+    job = queue.submit("upload", ["extract", "index"], {"file_path": "book.pdf"}, dedupe_key="book")
+    finished = await queue.wait(job["id"])
+
+    assert recorder.calls == ["extract", "index"]
+    assert finished["status"] == "succeeded"
+    assert finished["result"] == {"extract": True, "index": True}
+    assert all(stage["status"] == "succeeded" for stage in finished["stages"])
+    assert all(stage["seconds"] is not None for stage in finished["stages"])
+    assert finished["stages"][0]["progress"] == {"done": 1, "total": 1}
+    assert queue.list() == [finished]
+
+@pytest.mark.unit
+async def test_resubmitting_same_work_returns_existing_job(tmp_path):
+    recorder = StageRecorder()
+    queue = recorder.queue(tmp_path)
+
+    first = queue.submit("upload", ["extract"], {}, dedupe_key="book")
+    await queue.wait(first["id"])
+    second = queue.submit("upload", ["extract"], {}, dedupe_key="book")
+
+    assert second["id"] == first["id"]
+    assert second["status"] == "succeeded"
+    assert recorder.calls == ["extract"]
+
+    forced = queue.submit("upload", ["extract"], {}, dedupe_key="book", force=True)
+    await queue.wait(forced["id"])
+
+    assert forced["id"] != first["id"]
+    assert recorder.calls == ["extract", "extract"]
+
+@pytest.mark.unit
+async def test_failed_job_is_retried_from_failed_stage(tmp_path):
+    recorder = StageRecorder(fail_once=["index"])
+    queue = recorder.queue(tmp_path)
+
+    job = queue.submit("upload", ["extract", "index"], {}, dedupe_key="book")
+    failed = await queue.wait(job["id"])
+
+    assert failed["status"] == "failed"
+    assert failed["error"] == "index: index crashed"
+
+    queue.submit("upload", ["extract", "index"], {}, dedupe_key="book")
+    retried = await queue.wait(job["id"])
+
+    assert retried["status"] == "succeeded"
+    assert recorder.calls == ["extract", "index", "index"]
+    assert retried["stages"][1]["attempts"] == 2
+
+@pytest.mark.unit
+async def test_resume_after_restart_skips_finished_stages(tmp_path):
+    async def extract(job, update):
+        return {"folder_name": "pdf_extraction_book"}
+
+    async def index_until_killed(job, update):
+        await asyncio.Event().wait()
+
+    crashed = IngestionJobQueue({"extract": extract, "index": index_until_killed}, jobs_dir=tmp_path)
+    job = crashed.submit("upload", ["extract", "index"], {}, dedupe_key="book")
+    await asyncio.sleep(0.01)
+    crashed._tasks[job["id"]].cancel()  # The worker dies mid-index
+    await asyncio.sleep(0)
+    assert crashed.get(job["id"])["status"] == "running"
+
+    recorder = StageRecorder()
+    queue = recorder.queue(tmp_path)
+    assert queue.resume() == [job["id"]]
+    finished = await queue.wait(job["id"])
+
+    assert recorder.calls == ["index"]
+    assert finished["status"] == "succeeded"
+    assert finished["result"] == {"folder_name": "pdf_extraction_book", "index": True}
+
+@pytest.mark.unit
+async def test_stage_concurrency_is_bounded(tmp_path):
+    running, peak = 0, 0
+
+    async def extract(job, update):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    queue = IngestionJobQueue({"extract": extract}, stage_limits={"extract": 2}, jobs_dir=tmp_path)
+    jobs = [queue.submit("upload", ["extract"], {}, dedupe_key=f"book-{i}") for i in range(5)]
+    await asyncio.gather(*(queue.wait(job["id"]) for job in jobs))
+
+    assert peak == 2
+    assert all(queue.get(job["id"])["status"] == "succeeded" for job in jobs)
+
+@pytest.mark.unit
+async def test_index_chunks_folder_marks_chunks_indexed(tmp_path, mocker):
+    folder = tmp_path / "pdf_extraction_biology_20240101_120000"
+    folder.mkdir()
+    (folder / "all_chunks.json").write_text(json.dumps([{"text": "cells", "metadata": {"page_number": 1}}]))
+    vector_store = mocker.Mock()
+    vector_store.add_documents = mocker.AsyncMock(return_value=["id-1"])
+
+    result = await index_chunks_folder(vector_store, folder, subject="Biology", grade="9")
+
+    chunks, metadata = vector_store.add_documents.call_args.args
+    assert metadata == {"subject": "Biology", "grade": "9", "source": "biology"}
+    assert chunks[0]["metadata"]["page_number"] == "1"
+    assert result["chunks_indexed"] == 1
+    assert ChunkStore(folder).get(0)["vector_store_status"]["embedding_id"] == "id-1"
+
+@pytest.mark.unit
+async def test_only_one_worker_runs_an_interrupted_job(tmp_path):
+    release = asyncio.Event()
+
+    async def extract(job, update):
+        await release.wait()
+
+    # Two queues on one directory stand in for two worker processes
+    first = IngestionJobQueue({"extract": extract}, jobs_dir=tmp_path)
+    job = first.submit("upload", ["extract"], {}, dedupe_key="book")
+    await asyncio.sleep(0.01)
+
+    recorder = StageRecorder()
+    second = recorder.queue(tmp_path)
+    assert second.resume() == []
+
+    release.set()
+    assert (await first.wait(job["id"]))["status"] == "succeeded"
+    assert recorder.calls == []
+
+@pytest.mark.unit
+def test_jobs_dir_is_created_on_first_write(tmp_path):
+    jobs_dir = tmp_path / "jobs"
+    queue = StageRecorder().queue(jobs_dir)
+
+    assert not jobs_dir.exists()
+    assert queue.list() == []
+    assert queue.get("missing") is None
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from app.services.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+from app.services.vector_backends import InProcessCollection
+from app.services.vector_store import VectorStore
+
+@pytest.mark.unit
+def test_tokenize_keeps_section_numbers_and_drops_stopwords():
+    assert tokenize("What is Section 3.2 of the H2O cycle?") == ["section", "3.2", "h2o", "cycle"]
+
+@pytest.mark.unit
+def test_bm25_ranks_rare_terms_higher_and_filters():
+    index = BM25Index()
+    index.add(
+        ["a", "b", "c"],
+        ["photosynthesis in plant cells", "plant cells and tissues", "atoms and molecules"],
+        [{"subject": "Biology"}, {"subject": "Biology"}, {"subject": "Chemistry"}]
+    )
+
+    results = index.search("photosynthesis plant", k=3)
+    assert [doc_id for doc_id, _ in results] == ["a", "b"]
+    assert index.search("atoms", where={"subject": "Biology"}) == []
+
+@pytest.mark.unit
+def test_bm25_incremental_replace_and_remove():
+    index = BM25Index()
+    index.add(["a"], ["mitosis"])
+    index.add(["a"], ["meiosis"])
+    assert index.search("mitosis") == []
+    assert index.search("meiosis")[0][0] == "a"
+
+    index.remove(["a"])
+    assert len(index) == 0
+    assert index.search("meiosis") == []
+
+@pytest.mark.unit
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["x", "y", "z"], ["y", "w"]], k=60)
+    assert fused[0][0] == "y"
+    assert {doc_id for doc_id, _ in fused} == {"x", "y", "z", "w"}
+
+@pytest.mark.unit
+async def test_hybrid_query_surfaces_keyword_match(mocker):
+    collection = InProcessCollection("hybrid_test")
+    collection.add(
+        ids=["dense_hit", "keyword_hit"],
+        embeddings=[[1.0, 0.0], [0.0, 1.0]],
+        documents=["general notes about living things", "the Krebs cycle releases energy"],
+        metadatas=[
+            {"subject": "Biology", "grade": "9", "page_number": 1},
+            {"subject": "Biology", "grade": "9", "page_number": 2}
+        ]
+    )
+    client = mocker.Mock()
+    client.get_or_create_collection.return_value = collection
+    mocker.patch("app.services.vector_store.get_vector_client", return_value=client)
+    vector_store = VectorStore(collection_name="hybrid_test", backend="inprocess")
+    vector_store.lexical_index.reset()
+    mocker.patch.object(vector_store, "embed_query", new=mocker.AsyncMock(return_value=np.array([1.0, 0.0], dtype=np.float32)))
+
+    dense = await vector_store.query("krebs cycle", n_results=1, content_types=["textbook"])
+    hybrid = await vector_store.query("krebs cycle", n_results=2, content_types=["textbook"], hybrid=True)
+
+    assert dense["chunk_ids"] == ["dense_hit"]
+    assert set(hybrid["chunk_ids"]) == {"dense_hit", "keyword_hit"}
+    assert any("Krebs" in item["document"] for item in hybrid["textbook_results"])
+    assert vector_store.lexical_index.ready
+
+@pytest.mark.unit
+def test_lexical_index_rebuilds_after_another_process_writes(mocker):
+    collection = InProcessCollection("hybrid_stale_test")
+    collection.add(ids=["first"], embeddings=[[1.0, 0.0]], documents=["general notes"], metadatas=[{"subject": "Biology"}])
+    client = mocker.Mock()
+    client.get_or_create_collection.return_value = collection
+    mocker.patch("app.services.vector_store.get_vector_client", return_value=client)
+    vector_store = VectorStore(collection_name="hybrid_stale_test", backend="inprocess")
+    vector_store.lexical_index.reset()
+    vector_store._build_lexical_index()
+    assert len(vector_store.lexical_index) == 1
+
+    # Written straight to the collection, as another worker's VectorStore would
+    collection.add(ids=["second"], embeddings=[[0.0, 1.0]], documents=["the Krebs cycle"], metadatas=[{"subject": "Biology"}])
+    assert vector_store._lexical_index_stale()
+
+    vector_store._build_lexical_index()
+    assert not vector_store._lexical_index_stale()
+    assert vector_store.lexical_index.search("krebs")[0][0] == "second"
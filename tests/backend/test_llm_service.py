@@ -1,6 +1,8 @@
+import asyncio
 import pytest
 from app.services.llm_service import LLMService
-from unittest.mock import Mock
+from app.services.llm_providers import LLMProvider, OfflineProvider
+from unittest.mock import AsyncMock, Mock
 
 @pytest.fixture
 def mock_openai(mocker):
@@ -55,3 +57,168 @@ async def test_missing_api_key(mocker):
         LLMService()
     
     assert "OPENAI_API_KEY not found" in str(exc_info.value)
+
+def make_service(mocker, chain, **kwargs):
+    mocker.patch.dict('os.environ', {'OPENAI_API_KEY': 'test-key'})
+    mocker.patch('app.services.llm_service.LLM_RETRY_BACKOFF_SECONDS', 0)
+    service = LLMService(**kwargs)
+    service._get_chain = Mock(return_value=chain)
+    return service
+
+@pytest.mark.unit
+def test_chains_are_reused_per_model_and_temperature(mocker):
+    mocker.patch.dict('os.environ', {'OPENAI_API_KEY': 'test-key'})
+    service = LLMService()
+
+    assert service._get_chain() is service.chain
+    assert service._get_chain(0.2) is service._get_chain(0.2)
+    assert service._get_chain(0.2) is not service._get_chain(0.3)
+
+@pytest.mark.unit
+async def test_generate_response_retries_transient_errors(mocker):
+    chain = Mock()
+    chain.ainvoke = AsyncMock(side_effect=[ConnectionError("reset"), "An answer"])
+    service = make_service(mocker, chain, max_retries=2)
+
+    response = await service.generate_response("question", ["context"])
+
+    assert response["response"] == "An answer"
+    assert chain.ainvoke.await_count == 2
+
+@pytest.mark.unit
+async def test_generate_response_times_out(mocker):
+    async def slow(inputs):
+        await asyncio.sleep(1)
+
+    chain = Mock()
+    chain.ainvoke = slow
+    service = make_service(mocker, chain, timeout_seconds=0.01, max_retries=0)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await service.generate_response("question", ["context"])
+
+@pytest.mark.unit
+async def test_concurrency_is_capped(mocker):
+    running = 0
+    peak = 0
+
+    async def call(inputs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return "answer"
+
+    chain = Mock()
+    chain.ainvoke = call
+    service = make_service(mocker, chain, max_concurrency=2)
+
+    await asyncio.gather(*(service.generate_response("q", ["c"]) for _ in range(6)))
+
+    assert peak == 2
+
+@pytest.mark.unit
+async def test_offline_provider_answers_from_context_without_api_key(mocker):
+    mocker.patch.dict('os.environ', {}, clear=True)
+    service = LLMService(provider=OfflineProvider(mode="extractive"))
+    contexts = [
+        "Photosynthesis takes place in the chloroplast. Plants need sunlight.",
+        "Mitochondria release energy."
+    ]
+
+    first = await service.generate_response("Where does photosynthesis take place?", contexts)
+    second = await service.generate_response("Where does photosynthesis take place?", contexts)
+
+    assert first["response"] == "Photosynthesis takes place in the chloroplast."
+    assert first == second
+    assert first["model"] == "offline-extractive"
+
+@pytest.mark.unit
+async def test_offline_provider_streams_canned_answer_at_token_rate():
+    provider = OfflineProvider(mode="canned", canned_answer="one two three", latency_ms=20, tokens_per_second=100)
+    service = LLMService(provider=provider)
+
+    start = asyncio.get_running_loop().time()
+    tokens = [token async for token in service.stream_response("question", ["context"])]
+    elapsed = asyncio.get_running_loop().time() - start
+
+    assert "".join(tokens) == "one two three"
+    assert len(tokens) == 3
+    # 20ms before the first token, then 10ms per token
+    assert elapsed >= 0.035
+
+@pytest.mark.unit
+def test_providers_must_implement_model_and_chain():
+    class NoChain(LLMProvider):
+        def model_for(self, temperature=None):
+            return "model"
+
+    with pytest.raises(TypeError):
+        LLMProvider()
+    with pytest.raises(TypeError):
+        NoChain()
+
+@pytest.mark.unit
+async def test_backoff_releases_the_concurrency_slot(mocker):
+    failures = {"flaky": 1}
+
+    async def call(inputs):
+        if failures.get(inputs["question"]):
+            failures[inputs["question"]] -= 1
+            raise ConnectionError("reset")
+        return inputs["question"]
+
+    chain = Mock()
+    chain.ainvoke = call
+    service = make_service(mocker, chain, max_concurrency=1, max_retries=1)
+    mocker.patch('app.services.llm_service.LLM_RETRY_BACKOFF_SECONDS', 0.1)
+    finished = []
+
+    async def ask(question):
+        finished.append((await service.generate_response(question, ["c"]))["response"])
+
+    await asyncio.gather(ask("flaky"), ask("steady"))
+
+    # "steady" ran while "flaky" was waiting to retry
+    assert finished == ["steady", "flaky"]
+
+def make_streaming_service(mocker, chunks, **kwargs):
+    """A service whose chain streams (delay, chunk) pairs."""
+    async def astream(inputs):
+        for delay, chunk in chunks:
+            await asyncio.sleep(delay)
+            yield chunk
+
+    chain = Mock()
+    chain.astream = astream
+    return make_service(mocker, chain, max_retries=0, **kwargs)
+
+@pytest.mark.unit
+async def test_stream_stalling_after_first_chunk_times_out_and_frees_slot(mocker):
+    service = make_streaming_service(
+        mocker, [(0, "partial"), (1, "never")], max_concurrency=1, stream_idle_timeout_seconds=0.02
+    )
+    tokens = []
+
+    with pytest.raises(asyncio.TimeoutError):
+        async for token in service.stream_response("question", ["context"]):
+            tokens.append(token)
+
+    assert tokens == ["partial"]
+    assert not service.semaphore.locked()
+
+@pytest.mark.unit
+async def test_stream_is_cut_off_at_the_overall_deadline(mocker):
+    # Every chunk is within the idle timeout, but together they are too slow
+    service = make_streaming_service(
+        mocker, [(0.01, "chunk")] * 50, stream_idle_timeout_seconds=1, stream_timeout_seconds=0.1
+    )
+    tokens = []
+
+    with pytest.raises(asyncio.TimeoutError):
+        async for token in service.stream_response("question", ["context"]):
+            tokens.append(token)
+
+    assert 0 < len(tokens) < 50
+    assert not service.semaphore.locked()
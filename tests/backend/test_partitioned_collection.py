@@ -0,0 +1,156 @@
+import pytest
+from app.services.partitioned_collection import PartitionedCollection, PartitionRoute, segment
+from app.services.vector_backends import InProcessClient
+
+def make_collection():
+    client = InProcessClient()
+    collection = PartitionedCollection(client, "textbook")
+    collection.add(
+        ids=["bio9_1", "bio10_1", "chem9_1", "exam_1"],
+        embeddings=[[1.0, 0.0, 0.0], [0.8, 0.6, 0.0], [0.0, 1.0, 0.0], [0.9, 0.1, 0.0]],
+        documents=["cells", "tissues", "atoms", "exam question"],
+        metadatas=[
+            {"subject": "Biology", "grade": "9", "page": 1},
+            {"subject": "Biology", "grade": "10", "page": 2},
+            {"subject": "Chemistry", "grade": "9", "page": 1},
+            {"subject": "Biology", "grade": "9", "type": "exam_question"}
+        ]
+    )
+    return client, collection
+
+@pytest.mark.unit
+def test_writes_are_routed_to_physical_partitions():
+    client, collection = make_collection()
+
+    assert sorted(client.list_collections()) == [
+        "textbook--Biology--10--text",
+        "textbook--Biology--9--exam",
+        "textbook--Biology--9--text",
+        "textbook--Chemistry--9--text",
+    ]
+    assert collection.count() == 4
+
+@pytest.mark.unit
+def test_route_narrows_partitions_and_drops_implied_filters():
+    route = PartitionRoute({"$and": [
+        {"subject": "Biology"},
+        {"grade": {"$in": ["9", "10"]}},
+        {"type": {"$ne": "exam_question"}},
+        {"page": {"$gte": 2}}
+    ]})
+
+    assert route.subjects == {"Biology"}
+    assert route.grades == {"9", "10"}
+    assert route.kinds == {"text"}
+    assert route.matches(("Biology", "10", "text"))
+    assert not route.matches(("Biology", "9", "exam"))
+    # Equality on subject is guaranteed by the partition; $in and page still filter
+    assert route.residual == {"$and": [{"grade": {"$in": ["9", "10"]}}, {"page": {"$gte": 2}}]}
+
+@pytest.mark.unit
+def test_or_clauses_are_not_routed():
+    where = {"$or": [{"subject": "Biology"}, {"grade": "9"}]}
+    route = PartitionRoute(where)
+
+    assert route.matches(("Chemistry", "12", "exam"))
+    assert route.residual == where
+
+@pytest.mark.unit
+def test_segment_is_name_safe():
+    assert segment("Biology") == "Biology"
+    assert segment("Social Studies").startswith("Social_")
+    assert segment(None) == "none"
+    long_segment = segment("A very long subject name that keeps going")
+    assert len(long_segment) <= 16 and "--" not in long_segment
+
+@pytest.mark.unit
+def test_distinct_values_never_share_a_partition():
+    assert segment("Grade 9") != segment("Grade-9")
+    assert segment("none") != segment(None)
+    assert segment(9) != segment("9")
+
+    client = InProcessClient()
+    collection = PartitionedCollection(client, "textbook")
+    collection.add(
+        ids=["spaced", "dashed"],
+        embeddings=[[1.0, 0.0], [1.0, 0.0]],
+        documents=["a", "b"],
+        metadatas=[{"subject": "Social Studies"}, {"subject": "Social-Studies"}]
+    )
+
+    results = collection.query(query_embeddings=[[1.0, 0.0]], n_results=5, where={"subject": "Social-Studies"})
+    assert results["ids"] == [["dashed"]]
+
+@pytest.mark.unit
+def test_query_scatters_and_merges_by_distance():
+    _, collection = make_collection()
+
+    results = collection.query(
+        query_embeddings=[[1.0, 0.0, 0.0]],
+        n_results=3,
+        where={"type": {"$ne": "exam_question"}},
+        include=["documents", "metadatas", "distances"]
+    )
+
+    assert results["ids"] == [["bio9_1", "bio10_1", "chem9_1"]]
+    assert results["distances"][0] == sorted(results["distances"][0])
+    assert results["documents"][0][0] == "cells"
+
+@pytest.mark.unit
+def test_query_only_touches_matching_partitions(mocker):
+    _, collection = make_collection()
+    chemistry = dict(collection.partitions())[("Chemistry", "9", "text")]
+    spy = mocker.spy(chemistry, "query")
+
+    results = collection.query(query_embeddings=[[1.0, 0.0, 0.0]], n_results=5, where={"subject": "Biology"})
+
+    spy.assert_not_called()
+    assert set(results["ids"][0]) == {"bio9_1", "bio10_1", "exam_1"}
+
+@pytest.mark.unit
+def test_get_pages_across_partitions():
+    _, collection = make_collection()
+
+    first = collection.get(limit=3, offset=0, include=["metadatas"])
+    rest = collection.get(limit=3, offset=3, include=["metadatas"])
+
+    assert len(first["ids"]) == 3
+    assert len(rest["ids"]) == 1
+    assert set(first["ids"] + rest["ids"]) == {"bio9_1", "bio10_1", "chem9_1", "exam_1"}
+
+@pytest.mark.unit
+def test_update_moves_record_when_partition_key_changes():
+    _, collection = make_collection()
+
+    collection.update(ids=["chem9_1"], metadatas=[{"subject": "Physics", "grade": "9", "page": 1}])
+
+    moved = collection.get(ids=["chem9_1"], include=["metadatas", "documents"])
+    assert moved["metadatas"][0]["subject"] == "Physics"
+    assert moved["documents"] == ["atoms"]
+    assert collection.get(where={"subject": "Chemistry"})["ids"] == []
+    assert collection.count() == 4
+
+@pytest.mark.unit
+def test_delete_by_where_and_drop():
+    client, collection = make_collection()
+
+    collection.delete(where={"type": "exam_question"})
+    assert collection.count() == 3
+
+    collection.drop()
+    assert client.list_collections() == []
+
+@pytest.mark.unit
+def test_upsert_moves_record_when_partition_key_changes():
+    _, collection = make_collection()
+
+    collection.upsert(
+        ids=["chem9_1", "new_1"],
+        embeddings=[[0.0, 1.0, 0.0], [0.0, 0.0, 1.0]],
+        documents=["atoms", "forces"],
+        metadatas=[{"subject": "Physics", "grade": "9", "page": 1}, {"subject": "Physics", "grade": "9", "page": 2}]
+    )
+
+    assert collection.get(where={"subject": "Chemistry"})["ids"] == []
+    assert sorted(collection.get(where={"subject": "Physics"})["ids"]) == ["chem9_1", "new_1"]
+    assert collection.count() == 5
@@ -1,5 +1,6 @@
 import pytest
-from app.services.pdf_service import PDFService
+from app.services.pdf_service import PDFService, page_text
+from app.services.chunk_store import ChunkStore
 from pathlib import Path
 import PyPDF2
 from unittest.mock import Mock, mock_open
@@ -73,3 +74,121 @@ async def test_invalid_pdf_file(mock_pdf_reader, mocker):
         )
     
     assert "Invalid PDF file" in str(exc_info.value)
+
+def make_pdf(path, pages):
+    import fitz
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((50, 72), f"Page {page_num + 1} explains how cells divide.")
+    doc.save(str(path))
+    return str(path)
+
+def fake_chunks(text):
+    return [{"text": text, "tokens": len(text.split())}]
+
+@pytest.mark.unit
+@pytest.mark.parametrize("workers", [1, 3])
+async def test_extract_pages_in_page_order(tmp_path, mocker, workers):
+    mocker.patch('app.services.pdf_service.create_chunks', side_effect=fake_chunks)
+    mocker.patch('app.services.pdf_service.PDF_PARALLEL_MIN_PAGES', 1)
+    pdf_path = make_pdf(tmp_path / "book.pdf", 7)
+
+    # fork so the worker processes see the patched chunker
+    pages = await PDFService(workers=workers).extract_pages(pdf_path, start_method="fork")
+
+    assert [page["page_num"] for page in pages] == list(range(7))
+    assert all(f"Page {i + 1} " in page["text"] for i, page in enumerate(pages))
+    assert all(page["seconds"] >= 0 for page in pages)
+    assert all(page["chunks"][0]["metadata"]["page_number"] == i + 1 for i, page in enumerate(pages))
+
+def exits_worker(file_path, start, stop):
+    import os
+    os._exit(1)  # A worker killed mid-range, e.g. by the OOM killer
+
+@pytest.mark.unit
+async def test_extraction_pool_outlives_documents_until_it_breaks(tmp_path, mocker):
+    from app.services import pdf_service
+    mocker.patch('app.services.pdf_service.create_chunks', side_effect=fake_chunks)
+    mocker.patch('app.services.pdf_service.PDF_PARALLEL_MIN_PAGES', 1)
+    pdf_path = make_pdf(tmp_path / "book.pdf", 4)
+    service = PDFService(workers=2)
+
+    try:
+        await service.extract_pages(pdf_path, start_method="fork")
+        pool = pdf_service.get_extraction_pool(2, "fork")
+        await service.extract_pages(pdf_path, start_method="fork")
+        assert pdf_service.get_extraction_pool(2, "fork") is pool
+
+        mocker.patch('app.services.pdf_service.extract_page_range', new=exits_worker)
+        with pytest.raises(pdf_service.BrokenProcessPool):
+            await service.extract_pages(pdf_path, start_method="fork")
+        assert pdf_service.get_extraction_pool(2, "fork") is not pool
+    finally:
+        pdf_service.shutdown_extraction_pools()
+
+@pytest.mark.unit
+async def test_process_pdf_reports_page_timings(tmp_path, mocker):
+    mocker.patch('app.services.pdf_service.create_chunks', side_effect=fake_chunks)
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    mocker.patch.object(PDFService, '_create_output_dir', return_value=output_dir)
+    pdf_path = make_pdf(tmp_path / "book.pdf", 3)
+
+    pages = await PDFService(workers=1).process_pdf(pdf_path, subject="Biology", grade="9")
+
+    import json
+    summary = json.loads((output_dir / "metadata_summary.json").read_text())
+    assert len(pages) == 3
+    assert summary["extraction_timings"]["workers"] == 1
+    assert [p["page_number"] for p in summary["extraction_timings"]["pages"]] == [1, 2, 3]
+    assert [chunk["metadata"]["page_number"] for chunk in ChunkStore(output_dir)] == [1, 2, 3]
+
+@pytest.mark.unit
+def test_page_text_skips_images(tmp_path):
+    import fitz
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((50, 72), "Cells divide by mitosis.")
+    photo = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 20, 20), False)
+    page.insert_image(fitz.Rect(50, 100, 150, 200), pixmap=photo)
+    page.insert_text((50, 250), "Meiosis makes gametes.")
+
+    assert page_text(page) == "Cells divide by mitosis.\n Meiosis makes gametes.\n"
+
+@pytest.mark.unit
+async def test_process_pdf_resumes_from_last_completed_page(tmp_path, mocker):
+    from app.services import pdf_service
+    mocker.patch('app.services.pdf_service.create_chunks', side_effect=fake_chunks)
+    mocker.patch('app.services.pdf_service.EXTRACTION_ROOT', tmp_path)
+    pdf_path = make_pdf(tmp_path / "book.pdf", 6)
+    service = PDFService(workers=1)
+    extract_range = pdf_service.extract_page_range
+
+    def dies_on_page_five(file_path, start, stop):
+        if start <= 4 < stop:
+            raise MemoryError("killed")
+        return extract_range(file_path, start, stop)
+
+    mocker.patch('app.services.pdf_service.extract_page_range', side_effect=dies_on_page_five)
+    with pytest.raises(MemoryError):
+        await service.process_pdf(pdf_path, subject="Biology", grade="9")
+
+    [output_dir] = tmp_path.glob("pdf_extraction_book_*")
+    assert ChunkStore(output_dir).count() == 4
+
+    ranges = mocker.patch('app.services.pdf_service.extract_page_range', side_effect=extract_range)
+    pages = await service.process_pdf(pdf_path, subject="Biology", grade="9")
+
+    extracted = [page for call in ranges.call_args_list for page in range(*call.args[1:])]
+    assert extracted == [4, 5]
+    assert [page.metadata.page_number for page in pages] == [1, 2, 3, 4, 5, 6]
+    assert [chunk["metadata"]["page_number"] for chunk in ChunkStore(output_dir)] == [1, 2, 3, 4, 5, 6]
+
+    # Finished: nothing is extracted again, and no new folder appears
+    ranges.reset_mock()
+    again = await service.process_pdf(pdf_path, subject="Biology", grade="9")
+
+    assert ranges.call_count == 0
+    assert [page.text for page in again] == [page.text for page in pages]
+    assert list(tmp_path.glob("pdf_extraction_book_*")) == [output_dir]
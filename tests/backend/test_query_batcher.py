@@ -0,0 +1,58 @@
+import asyncio
+import numpy as np
+import pytest
+from unittest.mock import Mock
+from app.services.query_batcher import QueryBatcher
+
+@pytest.fixture
+def mock_encoder():
+    encoder = Mock()
+    encoder.model_name = "test-model"
+    calls = []
+
+    async def encode(texts, **kwargs):
+        calls.append(list(texts))
+        return np.array([[float(len(text)), 0.0] for text in texts], dtype=np.float32)
+
+    encoder.encode.side_effect = encode
+    encoder.calls = calls
+    return encoder
+
+@pytest.mark.unit
+async def test_concurrent_queries_share_one_batch(mock_encoder):
+    batcher = QueryBatcher(mock_encoder, max_batch_size=8, max_wait_ms=20)
+
+    vectors = await asyncio.gather(*(batcher.encode("q" * i) for i in range(1, 5)))
+
+    assert len(mock_encoder.calls) == 1
+    assert mock_encoder.calls[0] == ["q", "qq", "qqq", "qqqq"]
+    # Each caller gets its own vector back
+    assert [v[0] for v in vectors] == [1.0, 2.0, 3.0, 4.0]
+
+@pytest.mark.unit
+async def test_batch_size_cap_flushes_early(mock_encoder):
+    batcher = QueryBatcher(mock_encoder, max_batch_size=2, max_wait_ms=1000)
+
+    await asyncio.wait_for(
+        asyncio.gather(*(batcher.encode(f"query {i}") for i in range(4))),
+        timeout=0.5
+    )
+
+    assert [len(call) for call in mock_encoder.calls] == [2, 2]
+    stats = batcher.stats()
+    assert stats["batch_size"]["count"] >= 2
+    assert stats["queue_wait_ms"]["count"] >= 4
+
+@pytest.mark.unit
+async def test_encode_errors_reach_every_caller(mock_encoder):
+    async def fail(texts, **kwargs):
+        raise RuntimeError("model unavailable")
+
+    mock_encoder.encode.side_effect = fail
+    batcher = QueryBatcher(mock_encoder, max_batch_size=8, max_wait_ms=5)
+
+    results = await asyncio.gather(
+        batcher.encode("a"), batcher.encode("b"), return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
@@ -0,0 +1,107 @@
+import asyncio
+import itertools
+import numpy as np
+import pytest
+from app.services.query_cache import QueryEmbeddingCache, normalize_query
+
+_names = itertools.count()
+
+def make_cache(**kwargs):
+    return QueryEmbeddingCache(name=f"test_query_cache_{next(_names)}", **kwargs)
+
+@pytest.mark.unit
+def test_normalize_query():
+    assert normalize_query("  What is   Photosynthesis? ") == "what is photosynthesis"
+
+@pytest.mark.unit
+async def test_repeated_query_hits_cache():
+    cache = make_cache(max_size=10)
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        return np.array([1.0, 2.0])
+
+    first = await cache.get_or_compute("model", "What is photosynthesis?", compute)
+    second = await cache.get_or_compute("model", "what is photosynthesis", compute)
+
+    assert calls == 1
+    assert np.array_equal(first, second)
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+@pytest.mark.unit
+async def test_model_name_is_part_of_key():
+    cache = make_cache(max_size=10)
+    cache.put("model-a", "query", np.array([1.0]))
+
+    assert cache.get("model-a", "query") is not None
+    assert cache.get("model-b", "query") is None
+
+@pytest.mark.unit
+def test_lru_eviction():
+    cache = make_cache(max_size=2)
+    cache.put("m", "a", np.array([1.0]))
+    cache.put("m", "b", np.array([2.0]))
+    cache.get("m", "a")  # "b" is now least recently used
+    cache.put("m", "c", np.array([3.0]))
+
+    assert cache.get("m", "b") is None
+    assert cache.get("m", "a") is not None
+    assert cache.stats()["evictions"] == 1
+
+@pytest.mark.unit
+def test_ttl_expiry(mocker):
+    clock = mocker.patch('app.services.query_cache.time.monotonic', return_value=100.0)
+    cache = make_cache(max_size=10, ttl_seconds=5)
+    cache.put("m", "a", np.array([1.0]))
+
+    clock.return_value = 106.0
+
+    assert cache.get("m", "a") is None
+    assert cache.stats()["expirations"] == 1
+
+@pytest.mark.unit
+async def test_concurrent_misses_compute_once():
+    cache = make_cache(max_size=10)
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return np.array([1.0])
+
+    results = await asyncio.gather(*(cache.get_or_compute("m", "same", compute) for _ in range(5)))
+
+    assert calls == 1
+    assert all(np.array_equal(r, results[0]) for r in results)
+
+@pytest.mark.unit
+async def test_batch_lookup_shares_keys_metrics_and_inflight_work():
+    cache = make_cache(max_size=10)
+    cache.put("m", "cached", np.array([0.0]))
+    batches = []
+
+    async def compute_one():
+        await asyncio.sleep(0.01)
+        return np.array([9.0])
+
+    async def compute_many(texts):
+        batches.append(texts)
+        return np.array([[float(len(text))] for text in texts])
+
+    single = asyncio.ensure_future(cache.get_or_compute("m", "slow", compute_one))
+    await asyncio.sleep(0)
+    vectors = await cache.get_or_compute_many("m", ["Cached?", "new", "NEW", "slow"], compute_many)
+
+    # Only "new" is computed; "slow" joins the single-query call already in flight
+    assert batches == [["new"]]
+    assert [float(v[0]) for v in vectors] == [0.0, 3.0, 3.0, 9.0]
+    assert np.array_equal(await single, [9.0])
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 2
+    assert np.array_equal(await cache.get_or_compute("m", "new", compute_one), [3.0])
@@ -0,0 +1,100 @@
+import time
+import numpy as np
+import pytest
+from app.services.reranker import CrossEncoderReranker
+from app.services.vector_store import VectorStore
+
+class KeywordModel:
+    """Scores a passage by how many query words it contains."""
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.calls.append(len(pairs))
+        time.sleep(self.delay)
+        return np.array([sum(w in p for w in q.split()) for q, p in pairs], dtype=np.float32)
+
+@pytest.fixture
+def reranker():
+    reranker = CrossEncoderReranker(model_name="test-reranker")
+    reranker._model = KeywordModel()
+    return reranker
+
+@pytest.mark.unit
+async def test_scores_in_one_batch_and_caches_pairs(reranker):
+    scores = await reranker.score("plant cells", ["plant cells", "atoms", "plant"])
+    assert scores == [2.0, 0.0, 1.0]
+
+    await reranker.score("Plant cells?", ["plant cells", "tissues"])
+    # Only the unseen passage goes to the model the second time
+    assert reranker._model.calls == [3, 1]
+
+@pytest.mark.unit
+async def test_budget_exceeded_returns_none(reranker):
+    reranker._model = KeywordModel(delay=0.2)
+    assert await reranker.score("plant", ["plant"], budget_ms=10) is None
+    assert reranker.timeouts.value >= 1
+
+@pytest.mark.unit
+async def test_queued_batch_past_its_deadline_is_dropped(reranker):
+    import asyncio
+    reranker._model = KeywordModel(delay=0.1)
+    busy = asyncio.ensure_future(reranker.score("plant", ["plant"], budget_ms=None))
+    await asyncio.sleep(0.01)
+
+    assert await reranker.score("cells", ["cells", "atoms"], budget_ms=10) is None
+    await busy
+    await asyncio.get_running_loop().run_in_executor(reranker._executor, lambda: None)
+
+    # The second batch never reached the model
+    assert reranker._model.calls == [1]
+
+@pytest.mark.unit
+def test_preload_loads_model_on_reranker_thread(mocker):
+    mocker.patch("sentence_transformers.CrossEncoder", return_value=KeywordModel())
+    reranker = CrossEncoderReranker(model_name="test-reranker")
+
+    reranker.preload()
+    reranker._executor.submit(lambda: None).result()
+
+    assert reranker.stats()["loaded"]
+
+@pytest.mark.unit
+async def test_query_rerank_reorders_candidates(mocker, reranker):
+    mocker.patch("app.services.vector_store.get_reranker", return_value=reranker)
+    mocker.patch("app.services.vector_store.get_vector_client")
+    vector_store = VectorStore(collection_name="rerank_test")
+    mocker.patch.object(vector_store, "embed_query", new=mocker.AsyncMock(return_value=np.zeros(2, dtype=np.float32)))
+    vector_store.collection.query.return_value = {
+        "ids": [["a", "b", "c"]],
+        "documents": [["about atoms", "the krebs cycle", "cycle of krebs steps"]],
+        "metadatas": [[{}, {}, {}]],
+        "distances": [[0.1, 0.2, 0.3]]
+    }
+
+    results = await vector_store.query("krebs cycle", n_results=2, rerank=True)
+
+    assert vector_store.collection.query.call_args.kwargs["n_results"] >= 3
+    assert results["reranked"]
+    assert set(results["chunk_ids"]) == {"b", "c"}
+    assert results["textbook_results"][0]["rerank_score"] == 2.0
+
+@pytest.mark.unit
+async def test_query_rerank_falls_back_to_dense_order(mocker, reranker):
+    mocker.patch.object(reranker, "score", new=mocker.AsyncMock(return_value=None))
+    mocker.patch("app.services.vector_store.get_reranker", return_value=reranker)
+    mocker.patch("app.services.vector_store.get_vector_client")
+    vector_store = VectorStore(collection_name="rerank_test")
+    mocker.patch.object(vector_store, "embed_query", new=mocker.AsyncMock(return_value=np.zeros(2, dtype=np.float32)))
+    vector_store.collection.query.return_value = {
+        "ids": [["a", "b", "c"]],
+        "documents": [["x", "y", "z"]],
+        "metadatas": [[{}, {}, {}]],
+        "distances": [[0.1, 0.2, 0.3]]
+    }
+
+    results = await vector_store.query("anything", n_results=2, rerank=True)
+
+    assert results["chunk_ids"] == ["a", "b"]
+    assert not results["reranked"]
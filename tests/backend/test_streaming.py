@@ -0,0 +1,48 @@
+import json
+import pytest
+from app.utils.streaming import answer_events, encode_event
+
+async def fake_tokens(*tokens, fail=False):
+    for token in tokens:
+        yield token
+    if fail:
+        raise RuntimeError("model went away")
+
+async def collect(events):
+    return [event async for event in events]
+
+@pytest.mark.unit
+def test_encode_event_formats():
+    event = {"type": "token", "text": "Hi"}
+
+    assert encode_event(event, "ndjson") == '{"type": "token", "text": "Hi"}\n'
+    assert encode_event(event, "sse") == 'event: token\ndata: {"type": "token", "text": "Hi"}\n\n'
+
+@pytest.mark.unit
+async def test_answer_events_sends_sources_then_tokens_then_done():
+    completed = []
+
+    lines = await collect(answer_events(
+        {"sources": ["cells"]},
+        fake_tokens("Photo", "", "synthesis"),
+        "ndjson",
+        on_complete=completed.append
+    ))
+    events = [json.loads(line) for line in lines]
+
+    assert [e["type"] for e in events] == ["sources", "token", "token", "done"]
+    assert events[0]["sources"] == ["cells"]
+    assert events[-1]["response"] == "Photosynthesis"
+    assert events[-1]["ttft_ms"] is not None
+    assert completed == ["Photosynthesis"]
+
+@pytest.mark.unit
+async def test_answer_events_reports_errors_in_band():
+    completed = []
+
+    lines = await collect(answer_events({}, fake_tokens("Part", fail=True), "ndjson", on_complete=completed.append))
+    events = [json.loads(line) for line in lines]
+
+    assert [e["type"] for e in events] == ["sources", "token", "error"]
+    assert "model went away" in events[-1]["detail"]
+    assert completed == []
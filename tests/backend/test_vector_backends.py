@@ -0,0 +1,206 @@
+import numpy as np
+import pytest
+from app.services import vector_backends
+from app.services.vector_backends import InProcessCollection, matches_where
+from app.services.vector_quantization import quantization_report
+
+def make_collection(path=None):
+    collection = InProcessCollection("test", path=path)
+    collection.add(
+        ids=["bio_1", "bio_2", "chem_1", "exam_1"],
+        embeddings=[[1.0, 0.0, 0.0], [0.8, 0.6, 0.0], [0.0, 1.0, 0.0], [0.9, 0.1, 0.0]],
+        documents=["cells", "tissues", "atoms", "exam question"],
+        metadatas=[
+            {"subject": "Biology", "grade": "9"},
+            {"subject": "Biology", "grade": "10"},
+            {"subject": "Chemistry", "grade": "9"},
+            {"subject": "Biology", "grade": "9", "type": "exam_question"}
+        ]
+    )
+    return collection
+
+@pytest.mark.unit
+def test_matches_where_operators():
+    metadata = {"subject": "Biology", "grade": "9"}
+    assert matches_where(metadata, {"subject": "Biology"})
+    assert matches_where(metadata, {"type": {"$ne": "exam_question"}})
+    assert matches_where(metadata, {"$and": [{"subject": "Biology"}, {"grade": {"$in": ["9", "10"]}}]})
+    assert not matches_where(metadata, {"subject": "Biology", "grade": "10"})
+
+@pytest.mark.unit
+def test_exact_query_orders_by_cosine_distance():
+    collection = make_collection()
+
+    results = collection.query(query_embeddings=[[1.0, 0.0, 0.0]], n_results=2)
+
+    assert results["ids"] == [["bio_1", "exam_1"]]
+    assert results["distances"][0][0] == pytest.approx(0.0, abs=1e-6)
+    assert results["documents"][0][0] == "cells"
+
+@pytest.mark.unit
+def test_query_applies_where_filter():
+    collection = make_collection()
+
+    results = collection.query(
+        query_embeddings=[[1.0, 0.0, 0.0]],
+        n_results=5,
+        where={"subject": "Biology", "type": {"$ne": "exam_question"}}
+    )
+
+    assert results["ids"] == [["bio_1", "bio_2"]]
+
+@pytest.mark.unit
+def test_get_update_and_delete():
+    collection = make_collection()
+
+    collection.update(ids=["bio_1"], metadatas=[{"type": "textbook"}])
+    assert collection.get(ids=["bio_1"])["metadatas"][0] == {"subject": "Biology", "grade": "9", "type": "textbook"}
+
+    collection.delete(ids=["bio_1"])
+    assert collection.count() == 3
+    assert collection.get(ids=["bio_1"])["ids"] == []
+    # The row swapped into the hole is still searchable
+    results = collection.query(query_embeddings=[[0.0, 0.0, 0.0001]], n_results=3)
+    assert sorted(results["ids"][0]) == ["bio_2", "chem_1", "exam_1"]
+
+@pytest.mark.unit
+def test_persistence_replays_log_and_snapshot(test_data_dir):
+    collection = make_collection(test_data_dir)
+    collection.delete(ids=["chem_1"])
+
+    reopened = InProcessCollection("test", path=test_data_dir)
+    assert reopened.count() == 3
+
+    reopened.persist()
+    again = InProcessCollection("test", path=test_data_dir)
+    assert sorted(again.get()["ids"]) == ["bio_1", "bio_2", "exam_1"]
+
+@pytest.mark.unit
+def test_collections_sharing_a_directory_see_each_others_writes(test_data_dir):
+    # Two handles on one directory stand in for two worker processes
+    first = make_collection(test_data_dir)
+    second = InProcessCollection("test", path=test_data_dir)
+
+    second.upsert(ids=["phys_1"], embeddings=[[0.0, 0.0, 1.0]], documents=["forces"])
+    assert first.count() == 5
+    assert first.query(query_embeddings=[[0.0, 0.0, 1.0]], n_results=1)["ids"] == [["phys_1"]]
+
+    # Persisting from one handle must keep what the other logged, and vice versa
+    first.persist()
+    second.delete(ids=["chem_1"])
+    second.persist()
+    first.update(ids=["bio_1"], metadatas=[{"type": "textbook"}])
+    first.persist()
+
+    reopened = InProcessCollection("test", path=test_data_dir)
+    assert sorted(reopened.get()["ids"]) == ["bio_1", "bio_2", "exam_1", "phys_1"]
+    assert reopened.get(ids=["bio_1"])["metadatas"][0]["type"] == "textbook"
+    assert second.get(ids=["bio_1"])["metadatas"][0]["type"] == "textbook"
+
+@pytest.mark.unit
+def test_torn_log_line_is_replaced_by_the_next_append(test_data_dir):
+    make_collection(test_data_dir)
+    with open(test_data_dir / "oplog.jsonl", "a") as f:
+        f.write('{"op": "delete", "ids": ["bio')
+
+    collection = InProcessCollection("test", path=test_data_dir)
+    assert collection.count() == 4
+    collection.delete(ids=["chem_1"])
+
+    assert sorted(InProcessCollection("test", path=test_data_dir).get()["ids"]) == ["bio_1", "bio_2", "exam_1"]
+
+@pytest.mark.unit
+def test_ann_search_matches_exact(monkeypatch):
+    pytest.importorskip("hnswlib")
+    monkeypatch.setattr(vector_backends, "VECTOR_ANN_THRESHOLD", 50)
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, 16)).astype(np.float32)
+
+    collection = InProcessCollection("ann")
+    collection.add(ids=[f"id_{i}" for i in range(200)], embeddings=vectors)
+
+    results = collection.query(query_embeddings=[vectors[17]], n_results=1)
+
+    assert collection._ann is not None
+    assert results["ids"] == [["id_17"]]
+
+def random_vectors(n, dim=32, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+@pytest.mark.unit
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_quantized_storage_matches_float32_top_hit(dtype):
+    vectors = random_vectors(300)
+    ids = [f"id_{i}" for i in range(300)]
+    baseline = InProcessCollection("baseline")
+    quantized = InProcessCollection("quantized", storage_dtype=dtype, rescore_factor=0)
+    baseline.add(ids=ids, embeddings=vectors)
+    quantized.add(ids=ids, embeddings=vectors)
+
+    assert quantized.vector_memory_bytes() < baseline.vector_memory_bytes()
+    for i in (3, 42, 250):
+        assert quantized.query(query_embeddings=[vectors[i]], n_results=1)["ids"] == [[ids[i]]]
+
+@pytest.mark.unit
+def test_int8_rescoring_returns_exact_distances_and_persists(test_data_dir):
+    vectors = random_vectors(100)
+    ids = [f"id_{i}" for i in range(100)]
+    collection = InProcessCollection("rescored", path=test_data_dir, storage_dtype="int8", rescore_factor=4)
+    collection.add(ids=ids, embeddings=vectors)
+
+    results = collection.query(query_embeddings=[vectors[7]], n_results=3)
+    assert results["ids"][0][0] == "id_7"
+    assert results["distances"][0][0] == pytest.approx(0.0, abs=1e-6)
+
+    collection.persist()
+    collection.delete(ids=["id_0"])
+    reopened = InProcessCollection("rescored", path=test_data_dir, storage_dtype="int8", rescore_factor=4)
+    assert reopened.count() == 99
+    assert reopened._originals.nbytes_in_memory() == 0  # Originals served from the memory-mapped snapshot
+    again = reopened.query(query_embeddings=[vectors[7]], n_results=1)
+    assert again["ids"] == [["id_7"]]
+    assert again["distances"][0][0] == pytest.approx(0.0, abs=1e-6)
+    stored = reopened.get(ids=["id_7"], include=["embeddings"])["embeddings"][0]
+    assert np.allclose(stored, vectors[7] / np.linalg.norm(vectors[7]), atol=1e-6)
+
+@pytest.mark.unit
+def test_metadata_index_agrees_with_a_scan(mocker):
+    collection = make_collection()
+    collection.update(ids=["bio_2"], metadatas=[{"grade": "9"}])
+    collection.upsert(ids=["chem_1"], embeddings=[[0.0, 1.0, 0.0]], metadatas=[{"subject": "Physics", "grade": "9"}])
+    collection.delete(ids=["exam_1"])
+    scan = mocker.spy(vector_backends, "matches_where")
+
+    assert collection.get(where={"subject": "Biology"})["ids"] == ["bio_1", "bio_2"]
+    assert collection.get(where={"$and": [{"grade": "9"}, {"subject": {"$in": ["Physics", "Chemistry"]}}]})["ids"] == ["chem_1"]
+    assert collection.get(where={"subject": "Chemistry"})["ids"] == []
+    scan.assert_not_called()
+
+    # Other operators are checked only on the rows the indexed conditions leave
+    assert collection.get(where={"$and": [{"subject": "Biology"}, {"type": {"$ne": "exam_question"}}]})["ids"] == ["bio_1", "bio_2"]
+    assert {call.args[0]["subject"] for call in scan.call_args_list} == {"Biology"}
+    assert collection.get(where={"$or": [{"subject": "Physics"}, {"grade": "10"}]})["ids"] == ["chem_1"]
+
+@pytest.mark.unit
+def test_rescoring_needs_a_path_for_its_originals():
+    vectors = random_vectors(50)
+    in_memory = InProcessCollection("unpersisted", storage_dtype="int8", rescore_factor=4)
+    in_memory.add(ids=[f"id_{i}" for i in range(50)], embeddings=vectors)
+
+    assert in_memory.rescore_factor == 0
+    assert in_memory._originals is None
+    assert in_memory.vector_memory_bytes() == in_memory._vectors.codes.nbytes + in_memory._vectors.scales.nbytes
+
+@pytest.mark.unit
+def test_quantization_report_compares_against_float32():
+    source = InProcessCollection("source")
+    vectors = random_vectors(200)
+    source.add(ids=[f"id_{i}" for i in range(200)], embeddings=vectors)
+
+    report = quantization_report(source, dtypes=["int8"], k=5, sample_size=20, rescore_factor=4)
+
+    assert report["vectors"] == 200
+    assert report["int8"]["memory_bytes"] < report["float32"]["memory_bytes"]
+    assert 0.0 <= report["int8"]["recall@5"] <= 1.0
+    assert report["int8+rescore"]["recall@5"] >= report["int8"]["recall@5"]
+    assert "latency_ms_p50" in report["float32"]
@@ -1,14 +1,16 @@
 import pytest
-from app.services.vector_store import VectorStore
+import numpy as np
+from app.services.vector_store import VectorStore, make_chunk_id
 import chromadb
+from chromadb.api import ClientAPI
 from unittest.mock import Mock
 
 @pytest.fixture
 def mock_chroma_client(mocker):
-    mock_client = Mock(spec=chromadb.HttpClient)
+    mock_client = Mock(spec=ClientAPI)
     mock_collection = Mock()
     mock_client.get_or_create_collection.return_value = mock_collection
-    mocker.patch('chromadb.HttpClient', return_value=mock_client)
+    mocker.patch('app.services.vector_store.get_vector_client', return_value=mock_client)
     return mock_client
 
 @pytest.mark.unit
@@ -67,3 +69,137 @@ async def test_query(mock_chroma_client):
     call_args = collection.query.call_args[1]
     assert "query_embeddings" in call_args
     assert "where" in call_args
+
+@pytest.mark.unit
+async def test_add_documents_writes_in_batches(mock_chroma_client, mocker):
+    vector_store = VectorStore()
+    mocker.patch.object(vector_store, "embed_documents", new=_fake_embeddings)
+
+    test_chunks = [{
+        "text": f"chunk {i}",
+        "metadata": {
+            "page_number": str(i),
+            "chapter_number": "1",
+            "chapter_title": "Test Chapter"
+        }
+    } for i in range(5)]
+    progress = []
+
+    ids = await vector_store.add_documents(
+        test_chunks,
+        {"subject": "Biology", "grade": "9"},
+        batch_size=2,
+        progress_callback=progress.append
+    )
+
+    assert len(ids) == 5
+    collection = mock_chroma_client.get_or_create_collection.return_value
+    assert [len(call[1]["ids"]) for call in collection.add.call_args_list] == [2, 2, 1]
+    assert progress[-1]["indexed"] == 5
+    assert progress[-1]["total"] == 5
+
+async def _fake_embeddings(texts):
+    return np.ones((len(texts), 4), dtype=np.float32)
+
+@pytest.mark.unit
+def test_chunk_ids_are_deterministic_per_source():
+    first = make_chunk_id("Biology", "9", "book-a", "Cells are the unit of life.")
+    again = make_chunk_id("Biology", "9", "book-a", "Cells are the unit of life.")
+    other_book = make_chunk_id("Biology", "9", "book-b", "Cells are the unit of life.")
+
+    assert first == again
+    assert first != other_book
+
+@pytest.mark.unit
+async def test_reindex_only_writes_changed_chunks(mock_chroma_client, mocker):
+    vector_store = VectorStore()
+    mocker.patch.object(vector_store, "embed_documents", new=_fake_embeddings)
+    metadata = {"subject": "Biology", "grade": "9", "source": "book-a"}
+
+    def chunk(text, page):
+        return {
+            "text": text,
+            "metadata": {"page_number": page, "chapter_number": "1", "chapter_title": "Cells"}
+        }
+
+    old_chunks = [chunk("unchanged text", "1"), chunk("moved text", "2"), chunk("removed text", "3")]
+    existing = list(vector_store._chunk_records(old_chunks, metadata))
+    collection = mock_chroma_client.get_or_create_collection.return_value
+    collection.get.return_value = {
+        "ids": [r[0] for r in existing],
+        "metadatas": [r[2] for r in existing]
+    }
+
+    new_chunks = [chunk("unchanged text", "1"), chunk("moved text", "5"), chunk("brand new text", "6")]
+    result = await vector_store.reindex_documents(new_chunks, metadata)
+
+    assert result["added"] == 1
+    assert result["updated"] == 1
+    assert result["deleted"] == 1
+    assert result["unchanged"] == 1
+    collection.delete.assert_called_once_with(ids=[existing[2][0]])
+    assert collection.update.call_args[1]["ids"] == [existing[1][0]]
+    assert collection.upsert.call_args[1]["documents"] == ["brand new text"]
+    assert not collection.add.called
+
+@pytest.mark.unit
+async def test_query_many_encodes_and_searches_once(mock_chroma_client, mocker):
+    vector_store = VectorStore()
+    encode = mocker.patch.object(
+        vector_store.encoder, "encode",
+        new=mocker.AsyncMock(return_value=np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32))
+    )
+    collection = mock_chroma_client.get_or_create_collection.return_value
+    collection.query.return_value = {
+        "ids": [["a1", "a2"], ["b1", "b2"], ["a1", "a2"]],
+        "documents": [["doc a1", "doc a2"], ["doc b1", "doc b2"], ["doc a1", "doc a2"]],
+        "metadatas": [[{"type": "textbook"}, {"type": "exam_question"}], [{"type": "textbook"}, {}], [{}, {}]],
+        "distances": [[0.1, 0.2], [0.3, 0.4], [0.1, 0.2]]
+    }
+
+    queries = ["batch query about cells", "batch query about atoms", "Batch query about cells?"]
+    results = await vector_store.query_many(queries, n_results=2)
+
+    # Duplicate (after normalization) queries share one encode slot
+    assert encode.await_count == 1
+    assert len(encode.await_args.args[0]) == 2
+    assert collection.query.call_count == 1
+    assert len(collection.query.call_args.kwargs["query_embeddings"]) == 3
+
+    assert len(results) == 3
+    assert results[0]["chunk_ids"] == ["a1", "a2"]
+    assert len(results[0]["exam_results"]) == 1
+    assert results[1]["documents"] == ["doc b1", "doc b2"]
+
+@pytest.mark.unit
+async def test_export_and_restore_round_trip_without_reembedding(mocker, test_data_dir):
+    from app.services.vector_backends import InProcessCollection
+
+    source = InProcessCollection("export_source")
+    vectors = np.random.default_rng(0).normal(size=(5, 8)).astype(np.float32)
+    source.add(
+        ids=[f"id_{i}" for i in range(5)],
+        embeddings=vectors,
+        documents=[f"doc {i}" for i in range(5)],
+        metadatas=[{"page_number": i} for i in range(5)]
+    )
+    target = InProcessCollection("export_target")
+    client = mocker.Mock()
+    client.get_or_create_collection.side_effect = [source, target]
+    mocker.patch("app.services.vector_store.get_vector_client", return_value=client)
+    exporter = VectorStore(collection_name="export_source")
+    restorer = VectorStore(collection_name="export_target")
+    embed = mocker.patch.object(restorer, "embed_documents")
+
+    backup = test_data_dir / "backup"
+    manifest = exporter.export_collection(backup, page_size=2)
+    restored = await restorer.restore_collection(backup, batch_size=3)
+
+    assert manifest["count"] == 5 and manifest["dimension"] == 8
+    assert (backup / "embeddings.f32").stat().st_size == 5 * 8 * 4
+    assert restored == 5
+    assert not embed.called
+    copy = target.get(ids=["id_3"], include=["documents", "metadatas", "embeddings"])
+    assert copy["documents"] == ["doc 3"]
+    assert copy["metadatas"] == [{"page_number": 3}]
+    assert np.allclose(copy["embeddings"][0], source.get(ids=["id_3"], include=["embeddings"])["embeddings"][0])
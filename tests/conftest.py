@@ -8,6 +8,12 @@ from pathlib import Path
 backend_path = Path(__file__).parent.parent / 'backend'
 sys.path.append(str(backend_path))
 
+# Run the app against the in-memory vector backend so tests need no Chroma server
+os.environ.setdefault("VECTOR_BACKEND", "inprocess")
+os.environ.setdefault("VECTOR_STORE_PATH", "")
+# Don't load and benchmark encoders when the test client starts the app
+os.environ.setdefault("EMBEDDING_STARTUP_BENCHMARK", "false")
+
 from app.main import app
 from app.services.vector_store import VectorStore
 from app.services.llm_service import LLMService